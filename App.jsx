@@ -132,6 +132,61 @@ function App() {
     }
   };
 
+  // Listing URLs of saved properties (and of their reposts) -> saved property id
+  const savedListingIds = (properties) => {
+    const ids = {};
+    properties.forEach(p => {
+      if (p.listing_url) ids[p.listing_url] = p.id;
+      (p.reposts || []).forEach(r => {
+        if (r.listing_url) ids[r.listing_url] = p.id;
+      });
+    });
+    return ids;
+  };
+
+  // Photo URLs of a saved property's listing and its reposts
+  const listingImages = (property) => [
+    ...((property.listing_amenities && property.listing_amenities.listing_images) || []),
+    ...(property.reposts || []).flatMap(r => r.listing_images || []),
+  ];
+
+  // Ask the backend to keep (or release) a saved property's photos; best effort
+  const updateImagePins = (action, propertyId, urls) => {
+    if (!urls.length) return;
+    fetch(`${API_URL}/api/images/${action}`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ property_id: propertyId, urls }),
+    }).catch(err => console.warn(`Image ${action} failed:`, err));
+  };
+
+  // Id of the saved property this listing reposts, or null (also when the check fails)
+  const findRepostOf = async (property, id) => {
+    if (!property.listing_url) return null;
+    try {
+      const response = await fetch(`${API_URL}/api/reposts`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+          listing_url: property.listing_url,
+          listing_amenities: property.listing_amenities || {},
+          property_id: id,
+          saved: savedListingIds(savedProperties),
+        }),
+      });
+      if (!response.ok) return null;
+      const data = await response.json();
+      return data.repost_of ?? null;
+    } catch (err) {
+      console.warn('Repost check failed:', err);
+      return null;
+    }
+  };
+
   const handleSaveProperty = async (property) => {
     try {
       // Remove debug data before saving (contains invalid Firebase keys like $limit)
@@ -150,7 +205,29 @@ function App() {
         saved_at: new Date().toISOString()
       };
 
-      const updatedProperties = [...savedProperties, propertyToSave];
+      // A repost of a listing that's already saved is added to that entry instead
+      const repostOf = await findRepostOf(propertyToSave, propertyToSave.id);
+      const existing = savedProperties.find(p => p.id === repostOf);
+      const isRepost = Boolean(existing) && existing.listing_url !== propertyToSave.listing_url;
+      let updatedProperties;
+      if (isRepost) {
+        const amenities = propertyToSave.listing_amenities || {};
+        const known = (existing.reposts || []).some(r => r.listing_url === propertyToSave.listing_url);
+        const merged = known ? existing : {
+          ...existing,
+          reposts: [...(existing.reposts || []), {
+            listing_url: propertyToSave.listing_url,
+            listing_title: amenities.listing_title || null,
+            listing_price: amenities.listing_price || null,
+            listing_images: amenities.listing_images || [],
+            seen_at: new Date().toISOString()
+          }]
+        };
+        updatedProperties = savedProperties.map(p => (p.id === existing.id ? merged : p));
+      } else {
+        updatedProperties = [...savedProperties, propertyToSave];
+      }
+      updateImagePins('pin', isRepost ? existing.id : propertyToSave.id, listingImages(propertyToSave));
       
       // Save to state
       setSavedProperties(updatedProperties);
@@ -163,7 +240,7 @@ function App() {
       await updateLastActive();
       setSyncStatus('synced');
       
-      alert('Property saved successfully!');
+      alert(isRepost ? 'This listing is a repost of a saved property; added it to that entry.' : 'Property saved successfully!');
     } catch (err) {
       console.error('Failed to save property:', err);
       setSyncStatus('error');
@@ -173,6 +250,7 @@ function App() {
 
   const handleDeleteProperty = async (propertyId) => {
     try {
+      const removed = savedProperties.find(p => p.id === propertyId);
       const updatedProperties = savedProperties.filter(p => p.id !== propertyId);
       
       // Update state
@@ -181,6 +259,11 @@ function App() {
       // Save to localStorage
       localStorage.setItem('sf-rental-properties', JSON.stringify(updatedProperties));
       
+      // Let the backend forget the listings attached to it (best effort)
+      fetch(`${API_URL}/api/reposts/${propertyId}`, { method: 'DELETE' })
+        .catch(err => console.warn('Repost detach failed:', err));
+      if (removed) updateImagePins('unpin', propertyId, listingImages(removed));
+
       // Delete from Firebase
       await deletePropertyFromFirebase(propertyId);
       await updateLastActive();
@@ -4,6 +4,11 @@ import 'leaflet/dist/leaflet.css';
 import React from 'react';
 import './PropertyCard.css';
 
+const API_URL = import.meta.env.VITE_API_URL || '';
+
+// Listing photos go through the backend image proxy (cached, right-sized thumbnails)
+const proxiedImage = (url, width) => `${API_URL}/api/images?url=${encodeURIComponent(url)}&w=${width}`;
+
 // Fix Leaflet default marker icon
 delete L.Icon.Default.prototype._getIconUrl;
 L.Icon.Default.mergeOptions({
@@ -48,6 +53,22 @@ function PropertyCard({ property, onSave, onDelete, showSaveButton = false }) {
     );
   };
 
+  // Helper to render listing photos
+  const ListingPhotos = () => {
+    const images = property.listing_amenities?.listing_images;
+    if (!images || images.length === 0) return null;
+
+    return (
+      <div className="listing-photos">
+        {images.map((url) => (
+          <a key={url} href={proxiedImage(url, 1200)} target="_blank" rel="noopener noreferrer">
+            <img className="listing-photo" src={proxiedImage(url, 300)} alt="Listing" loading="lazy" />
+          </a>
+        ))}
+      </div>
+    );
+  };
+
   // Helper to render amenities from Craigslist listing
   const AmenitiesSection = () => {
     const amenities = property.listing_amenities;
@@ -278,6 +299,23 @@ function PropertyCard({ property, onSave, onDelete, showSaveButton = false }) {
     );
   };
 
+  // Records linked only to the street block, not to this parcel (see linkage.history)
+  const isBlockLevel = (records) => records.length > 0 && records[0].match === 'block';
+
+  const BlockLevelNote = () => (
+    <p className="block-level-note">
+      Block-level records: none matched this building, so these are from its street block and may belong to a neighbor.
+    </p>
+  );
+
+  // "N on record", or with only block-level records "N on this block" rather than "None"
+  const recordCountLabel = (count, kind) => {
+    if (count > 0) return `${count} on record`;
+    const blockCount = property.block_record_counts?.[kind];
+    if (count == null && blockCount > 0) return `${blockCount} on this block (block-level)`;
+    return 'None on record';
+  };
+
   // Helper to render eviction history
   const EvictionHistorySection = () => {
     const evictions = property.eviction_history;
@@ -290,6 +328,7 @@ function PropertyCard({ property, onSave, onDelete, showSaveButton = false }) {
           Eviction History
           <span className="count-badge">{evictions.length}</span>
         </h3>
+        {isBlockLevel(evictions) && <BlockLevelNote />}
         <div className="eviction-list">
           {evictions.map((eviction, index) => (
             <div key={index} className="eviction-item">
@@ -321,6 +360,7 @@ function PropertyCard({ property, onSave, onDelete, showSaveButton = false }) {
           Housing Complaints
           <span className="count-badge">{complaints.length}</span>
         </h3>
+        {isBlockLevel(complaints) && <BlockLevelNote />}
         <div className="complaints-list">
           {complaints.map((complaint, index) => (
             <div key={index} className="complaint-item">
@@ -353,6 +393,7 @@ function PropertyCard({ property, onSave, onDelete, showSaveButton = false }) {
           Buyout Agreements
           <span className="count-badge">{buyouts.length}</span>
         </h3>
+        {isBlockLevel(buyouts) && <BlockLevelNote />}
         <div className="buyout-list">
           {buyouts.map((buyout, index) => (
             <div key={index} className="buyout-item">
@@ -411,6 +452,9 @@ function PropertyCard({ property, onSave, onDelete, showSaveButton = false }) {
         <RentControlBadge />
       )}
 
+      {/* Listing Photos */}
+      <ListingPhotos />
+
       {/* Listing Amenities from Craigslist */}
       <AmenitiesSection />
 
@@ -470,17 +514,17 @@ function PropertyCard({ property, onSave, onDelete, showSaveButton = false }) {
             />
             <InfoRow 
               label="Eviction Filings" 
-              value={property.eviction_count > 0 ? `${property.eviction_count} on record` : 'None on record'}
+              value={recordCountLabel(property.eviction_count, 'evictions')}
               warning={property.eviction_count > 0}
             />
             <InfoRow 
               label="Housing Complaints" 
-              value={property.complaint_count > 0 ? `${property.complaint_count} on record` : 'None on record'}
+              value={recordCountLabel(property.complaint_count, 'complaints')}
               warning={property.complaint_count > 0}
             />
             <InfoRow 
               label="Buyout Agreements" 
-              value={property.buyout_count > 0 ? `${property.buyout_count} on record` : 'None on record'}
+              value={recordCountLabel(property.buyout_count, 'buyouts')}
               warning={property.buyout_count > 0}
             />
           </div>
@@ -4,24 +4,37 @@ import './SavedProperties.css';
 import { MapContainer, TileLayer, Marker, Popup } from 'react-leaflet';
 import 'leaflet/dist/leaflet.css';
 
+const API_URL = import.meta.env.VITE_API_URL || '';
+
 function SavedProperties({ properties, onDelete }) {
   const [viewMode, setViewMode] = React.useState('table'); // 'table' or 'cards'
   const [selectedProperty, setSelectedProperty] = React.useState(null);
   const [listingStatus, setListingStatus] = React.useState({});
 
-  // Check if listings are still live
+  // Check if listings are still live (one backend request for all of them)
   React.useEffect(() => {
-    properties.forEach(async (property) => {
-      if (property.listing_url) {
-        try {
-          const response = await fetch(property.listing_url, { method: 'HEAD', mode: 'no-cors' });
-          // no-cors doesn't give us status, so we assume it's live if no error
-          setListingStatus(prev => ({ ...prev, [property.id]: 'live' }));
-        } catch (error) {
-          setListingStatus(prev => ({ ...prev, [property.id]: 'unknown' }));
-        }
-      }
-    });
+    const listings = properties
+      .filter(property => property.listing_url)
+      .map(property => ({ id: property.id, url: property.listing_url }));
+    if (listings.length === 0) return;
+
+    let cancelled = false;
+    fetch(`${API_URL}/api/properties/listing-status`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ listings }),
+    })
+      .then(response => response.json())
+      .then(data => {
+        if (cancelled || !data.statuses) return;
+        const statuses = {};
+        Object.entries(data.statuses).forEach(([id, result]) => {
+          statuses[id] = result.status;
+        });
+        setListingStatus(statuses);
+      })
+      .catch(error => console.error('Failed to check listing status:', error));
+    return () => { cancelled = true; };
   }, [properties]);
 
   if (properties.length === 0) {
@@ -179,6 +192,10 @@ function SavedProperties({ properties, onDelete }) {
                     <td style={{ padding: '12px' }}>
                       {property.eviction_count > 0 ? (
                         <span style={{ color: '#d32f2f', fontWeight: 'bold' }}>{property.eviction_count}</span>
+                      ) : property.eviction_count == null && property.block_record_counts?.evictions > 0 ? (
+                        <span style={{ color: '#666' }} title="Block-level: none matched this building">
+                          {property.block_record_counts.evictions} on block
+                        </span>
                       ) : (
                         <span style={{ color: '#666' }}>0</span>
                       )}
@@ -198,6 +215,12 @@ function SavedProperties({ properties, onDelete }) {
                           {listingStatus[property.id] === 'live' && (
                             <span style={{ color: '#28a745', fontSize: '0.85em' }}>● Live</span>
                           )}
+                          {listingStatus[property.id] === 'removed' && (
+                            <span style={{ color: '#dc3545', fontSize: '0.85em' }}>● Removed</span>
+                          )}
+                          {listingStatus[property.id] === 'expired' && (
+                            <span style={{ color: '#999', fontSize: '0.85em' }}>● Expired</span>
+                          )}
                         </div>
                       ) : (
                         <span style={{ color: '#999' }}>—</span>
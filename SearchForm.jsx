@@ -1,6 +1,11 @@
 import React, { useState, useRef } from 'react';
 import './SearchForm.css';
 
+const API_URL = import.meta.env.VITE_API_URL || '';
+// Wait this long after the input settles before starting a prefetch
+const PREFETCH_DELAY_MS = 300;
+const CRAIGSLIST_LISTING_RE = /craigslist\.org\/.+\/\d{6,}\.html/i;
+const PARCEL_RE = /^\d{4}[A-Z]?\/\d{3}[A-Z]?$/i;
 
 function SearchForm({ onSearch, loading }) {
   const [url, setUrl] = useState('');
@@ -17,6 +22,35 @@ function SearchForm({ onSearch, loading }) {
   const [urlType, setUrlType] = useState(null); // 'craigslist', 'zillow', or null
   const [selectedBlockLot, setSelectedBlockLot] = useState(null); // Store block/lot from Rent Board
   const inputRef = useRef(null);
+  const clientId = useRef(Math.random().toString(36).slice(2));
+  const prefetchTimer = useRef(null);
+  const prefetchActive = useRef(false);
+
+  // Warm the backend caches for the search the user is about to run.
+  // Fields must match what handleSubmit sends to /api/search.
+  const postPrefetch = (body) => {
+    fetch(`${API_URL}/api/prefetch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ client_id: clientId.current, ...body }),
+    }).catch(() => {});
+  };
+
+  const startPrefetch = (search) => {
+    clearTimeout(prefetchTimer.current);
+    prefetchTimer.current = setTimeout(() => {
+      prefetchActive.current = true;
+      postPrefetch({ ...search, debug: true });
+    }, PREFETCH_DELAY_MS);
+  };
+
+  const cancelPrefetch = () => {
+    clearTimeout(prefetchTimer.current);
+    if (prefetchActive.current) {
+      prefetchActive.current = false;
+      postPrefetch({ cancel: true });
+    }
+  };
 
   // Detect URL type for user feedback
   const detectUrlType = (inputUrl) => {
@@ -93,6 +127,11 @@ function SearchForm({ onSearch, loading }) {
     const val = e.target.value;
     setUrl(val);
     setUrlType(detectUrlType(val));
+    if (CRAIGSLIST_LISTING_RE.test(val.trim())) {
+      startPrefetch({ url: val, address, parcel });
+    } else {
+      cancelPrefetch();
+    }
   };
 
   const handleAddressChange = (e) => {
@@ -102,6 +141,7 @@ function SearchForm({ onSearch, loading }) {
     setSelectedBlockLot(null); // Clear block/lot when user types
     fetchSuggestions(val);
     setAddressValid(false);
+    cancelPrefetch();
   };
 
   const handleSuggestionClick = (suggestion) => {
@@ -111,6 +151,7 @@ function SearchForm({ onSearch, loading }) {
     setSuggestions([]);
     setActiveSuggestion(-1);
     setAddressValid(true);
+    startPrefetch({ url, address: suggestion.address, parcel: url ? parcel : '' });
     setTimeout(() => inputRef.current && inputRef.current.blur(), 100);
   };
 
@@ -139,12 +180,18 @@ function SearchForm({ onSearch, loading }) {
       setSuggestions([]);
       setActiveSuggestion(-1);
       setAddressValid(true);
+      startPrefetch({ url, address: selected.address, parcel: url ? parcel : '' });
       e.preventDefault();
     }
   };
 
   const handleParcelChange = (e) => {
     setParcel(e.target.value);
+    if (PARCEL_RE.test(e.target.value.trim())) {
+      startPrefetch({ url, address: '', parcel: e.target.value });
+    } else {
+      cancelPrefetch();
+    }
     // If user enters parcel, clear address and suggestions
     if (e.target.value) {
       setAddress('');
@@ -0,0 +1,200 @@
+"""
+Admission control for the API: per-client rate limits and load shedding.
+
+Every request (except EXEMPT_PATHS) first takes a token from its client's
+bucket, then a slot under the global in-flight limit. When all slots are
+busy, requests wait in a short in-process queue. A request is shed up front
+(503 + Retry-After) when the queue is full or the estimated wait, from queue
+depth and recent service times, is over ADMISSION_MAX_WAIT. Clients over
+their rate get 429 + Retry-After. Admitted requests then run with bounded
+concurrency, so their latency stays close to the unloaded latency.
+
+GET /api/images is admitted apart: a page of listing photos is dozens of
+requests at once, so it has its own, larger per-client bucket and its own
+in-flight slots (cold fetches wait on Craigslist and would otherwise hold
+the slots searches need). It isn't queued or shed, only rate limited.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# Per-client token bucket: sustained requests/second and burst size
+ADMISSION_RATE = float(os.environ.get('ADMISSION_RATE', '2'))
+ADMISSION_BURST = float(os.environ.get('ADMISSION_BURST', '20'))
+# Requests running at once per worker, and how many may wait for a slot
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', '8'))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '6'))
+# Shed when the estimated queue wait exceeds this many seconds
+ADMISSION_MAX_WAIT = float(os.environ.get('ADMISSION_MAX_WAIT', '5'))
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') != '0'
+# Listing photos: their own per-client bucket and in-flight slots
+ADMISSION_IMAGE_RATE = float(os.environ.get('ADMISSION_IMAGE_RATE', '20'))
+ADMISSION_IMAGE_BURST = float(os.environ.get('ADMISSION_IMAGE_BURST', '200'))
+ADMISSION_IMAGE_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_IMAGE_MAX_IN_FLIGHT', '8'))
+
+EXEMPT_PATHS = ('/health', '/ready')
+IMAGE_PATH = '/api/images'
+# Ticket for a request holding an image slot rather than an API slot
+IMAGE_TICKET = 'image'
+
+MAX_BUCKETS = 10000
+# Weight of the newest sample in the service-time moving average
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Rejected(Exception):
+    """Request not admitted; carries the HTTP status and Retry-After seconds"""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Take a token; returns 0, or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(ADMISSION_MAX_IN_FLIGHT)
+_image_slots = threading.BoundedSemaphore(ADMISSION_IMAGE_MAX_IN_FLIGHT)
+_state_lock = threading.Lock()
+_in_flight = 0
+_waiting = 0
+_service_time = 1.0
+_latencies = deque(maxlen=500)
+_counters = {'admitted': 0, 'rate_limited': 0, 'shed_queue_full': 0, 'shed_wait': 0, 'queue_timeout': 0,
+             'images_admitted': 0, 'images_rate_limited': 0, 'images_timeout': 0}
+
+
+def _take_token(client, rate=ADMISSION_RATE, burst=ADMISSION_BURST):
+    with _buckets_lock:
+        bucket = _buckets.get(client)
+        if bucket is None:
+            if len(_buckets) >= MAX_BUCKETS:
+                # Drop clients that have refilled to full; they carry no state
+                now = time.monotonic()
+                for key in [k for k, b in _buckets.items()
+                            if b.tokens + (now - b.updated) * b.rate >= b.burst]:
+                    del _buckets[key]
+            bucket = _buckets[client] = TokenBucket(rate, burst)
+        return bucket.take()
+
+
+def estimated_wait():
+    """Seconds a request arriving now would wait for an in-flight slot"""
+    if _in_flight < ADMISSION_MAX_IN_FLIGHT:
+        return 0.0
+    return (_waiting + 1) * _service_time / ADMISSION_MAX_IN_FLIGHT
+
+
+def exempt(path):
+    return not ADMISSION_ENABLED or path in EXEMPT_PATHS
+
+
+def is_image(method, path):
+    return method == 'GET' and path == IMAGE_PATH
+
+
+def admit_image(client):
+    """Admit a listing photo request from `client` or raise Rejected; returns IMAGE_TICKET"""
+    wait = _take_token(f"{client} images", ADMISSION_IMAGE_RATE, ADMISSION_IMAGE_BURST)
+    if wait:
+        _counters['images_rate_limited'] += 1
+        raise Rejected(429, 'rate_limited', wait)
+    if not _image_slots.acquire(timeout=ADMISSION_MAX_WAIT):
+        _counters['images_timeout'] += 1
+        raise Rejected(503, 'overloaded', ADMISSION_MAX_WAIT)
+    _counters['images_admitted'] += 1
+    return IMAGE_TICKET
+
+
+def admit(client):
+    """
+    Admit a request from `client` or raise Rejected. Returns a ticket to
+    pass to release() when the request finishes.
+    """
+    global _in_flight, _waiting
+    wait = _take_token(client)
+    if wait:
+        _counters['rate_limited'] += 1
+        raise Rejected(429, 'rate_limited', wait)
+
+    with _state_lock:
+        expected = estimated_wait()
+        if expected and _waiting >= ADMISSION_MAX_QUEUE:
+            _counters['shed_queue_full'] += 1
+            raise Rejected(503, 'overloaded', expected)
+        if expected > ADMISSION_MAX_WAIT:
+            _counters['shed_wait'] += 1
+            raise Rejected(503, 'overloaded', expected)
+        _waiting += 1
+
+    queued_at = time.monotonic()
+    acquired = _slots.acquire(timeout=ADMISSION_MAX_WAIT)
+    with _state_lock:
+        _waiting -= 1
+        if not acquired:
+            _counters['queue_timeout'] += 1
+            raise Rejected(503, 'overloaded', estimated_wait() or _service_time)
+        _in_flight += 1
+        _counters['admitted'] += 1
+    return queued_at, time.monotonic()
+
+
+def release(ticket):
+    """Free the slot taken by admit() and record the request's timings"""
+    global _in_flight, _service_time
+    if ticket == IMAGE_TICKET:
+        _image_slots.release()
+        return
+    queued_at, started_at = ticket
+    now = time.monotonic()
+    _slots.release()
+    with _state_lock:
+        _in_flight -= 1
+        _latencies.append(now - queued_at)
+        # The wait estimate uses service time, which excludes time spent queued
+        _service_time += SERVICE_TIME_ALPHA * (now - started_at - _service_time)
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 4)
+
+
+def stats():
+    """Queue depth, in-flight count, shed counters and admitted-request latency"""
+    with _state_lock:
+        ordered = sorted(_latencies)
+        return dict(
+            _counters,
+            enabled=ADMISSION_ENABLED,
+            in_flight=_in_flight,
+            waiting=_waiting,
+            max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+            service_time=round(_service_time, 4),
+            estimated_wait=round(estimated_wait(), 4),
+            latency={'p50': _percentile(ordered, 0.5), 'p95': _percentile(ordered, 0.95),
+                     'p99': _percentile(ordered, 0.99)},
+            clients=len(_buckets),
+        )
@@ -1,26 +1,37 @@
+TAXROLL_COLUMNS = [
+    'closed_roll_year', 'parcel_number', 'property_location', 'property_class_code',
+    'property_class_code_definition', 'use_code', 'use_definition', 'supervisor_district',
+    'zoning_code', 'year_property_built', 'number_of_units', 'number_of_rooms',
+    'number_of_bathrooms', 'number_of_bedrooms', 'property_area',
+    'assessed_fixtures_value', 'assessed_land_value', 'assessed_improvement_value'
+]
+
 def get_historical_taxroll(parcel=None, address=None):
     """Get info from Assessor Historical Secured Property Tax Rolls dataset by parcel/lot"""
     try:
         url = "https://data.sfgov.org/resource/wv5m-vpq2.json"
         params = {}
-        if parcel:
-            block, lot = parcel.split('/') if '/' in parcel else (parcel, None)
-            block = block.zfill(4)
-            lot = lot.zfill(3) if lot else ''
-            parcel_number = f"{block}{lot}"
-            params['parcel_number'] = parcel_number
+        if not parcel:
+            return []
+        block, lot = parcel.split('/') if '/' in parcel else (parcel, None)
+        block = block.zfill(4)
+        lot = lot.zfill(3) if lot else ''
+        parcel_number = f"{block}{lot}"
+        params['parcel_number'] = parcel_number
+        # Most recent roll year first
+        params['$order'] = 'closed_roll_year DESC'
         params['$limit'] = 5
-        response = requests.get(url, params=params, timeout=10)
+        response = soql_get(url, params, select=TAXROLL_COLUMNS)
         try:
             data = response.json() if response.status_code == 200 else []
         except Exception as e:
-            print(f"Historical Tax Roll JSON decode error: {e}")
+            log.warning("Historical Tax Roll JSON decode error: %s", e)
             data = []
         if isinstance(data, list) and len(data) > 0:
             return data
         return []
     except Exception as e:
-        print(f"Historical Tax Roll error: {e}")
+        log.warning("Historical Tax Roll error: %s", e)
     return []
 def get_landuse_info(parcel=None, address=None):
     """Get info from Land Use dataset (for YRBUILT, building_sqft)"""
@@ -50,185 +61,176 @@ def get_landuse_info(parcel=None, address=None):
         else:
             return None
             
-        response = requests.get(url, params=params, timeout=10)
+        response = upstream.get(url, params=params)
         data = response.json() if response.status_code == 200 else []
         if isinstance(data, list) and len(data) > 0:
             return data[0]
     except Exception as e:
-        print(f"Land Use info error: {e}")
+        log.warning("Land Use info error: %s", e)
     return None
-from flask import Flask, request, jsonify
+import time
+_IMPORT_STARTED = time.monotonic()
+
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from flask_cors import CORS
-import requests
+import logging
+import logs
+import upstream
+import indexes
+import linkage
+import listings
+import listing_parser
+import prefetch
+import snapshots
+import sharedcache
+import export
+import geoindex
+import taxhistory
+import comparables
+import owners
+import reposts
+import imageproxy
+import admission
+import profiling
+import jobs
+from records import ParcelRecord, TaxRollRecord, RentBoardUnit, format_value
+from listing_parser import empty_amenities
+import hashlib
+import hmac
+import os
 import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from bs4 import BeautifulSoup
 
 app = Flask(__name__)
 CORS(app, origins=["https://jswegleitner.github.io", "http://localhost:5173"])
+log = logs.get_logger('app')
+
+# Health checks hit these every few seconds; their request lines are DEBUG
+QUIET_PATHS = ('/health', '/ready')
+
+@app.before_request
+def _start_request_log():
+    logs.start_request(request.headers.get('X-Request-Id'))
+
+@app.after_request
+def _request_id_header(response):
+    g.response_status = response.status_code
+    response.headers['X-Request-Id'] = logs.request_id() or ''
+    return response
+
+@app.teardown_request
+def _end_request_log(exc):
+    level = logging.DEBUG if request.path in QUIET_PATHS else logging.INFO
+    if log.isEnabledFor(level):
+        seconds, sources = logs.request_timings()
+        log.log(level, "request", extra={
+            'method': request.method,
+            'path': request.path,
+            'status': 500 if exc else g.get('response_status'),
+            'seconds': seconds,
+            'sources': sources,
+        })
+    logs.end_request()
+
 # CRAIGSLIST PARSING FUNCTIONS
 # ============================================================
 
+CRAIGSLIST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+}
+
+# Parsed listings are cached so a prefetched listing isn't parsed twice
+LISTING_CACHE_TTL = int(os.environ.get('LISTING_CACHE_TTL', '900'))
+LISTING_CACHE_MAX_ENTRIES = 256
+_listing_cache = OrderedDict()
+_listing_cache_lock = threading.Lock()
+
 def parse_craigslist_listing(url):
     """
     Scrape Craigslist listing for amenities like parking, laundry, pets, etc.
     Returns a dictionary of parsed amenities.
     """
-    amenities = {
-        'parking': None,
-        'laundry': None,
-        'pets_allowed': None,
-        'furnished': None,
-        'smoking': None,
-        'wheelchair_accessible': None,
-        'air_conditioning': None,
-        'ev_charging': None,
-        'listing_title': None,
-        'listing_price': None,
-        'listing_sqft': None,
-        'listing_bedrooms': None,
-        'listing_bathrooms': None,
-        'listing_available_date': None,
-        'listing_images': []
-    }
-    
     if not url or 'craigslist' not in url.lower():
-        return amenities
+        return empty_amenities()
     
+    with _listing_cache_lock:
+        entry = _listing_cache.get(url)
+        if entry and entry[0] > time.monotonic():
+            _listing_cache.move_to_end(url)
+            return dict(entry[1])
+    amenities = upstream.single_flight(('listing', url), lambda: _fetch_craigslist_listing(url))
+    return dict(amenities)
+
+def _download_listing(url):
+    """Fetch and parse a listing; None if Craigslist didn't return it"""
+    response = upstream.get(url, headers=CRAIGSLIST_HEADERS)
+    if response.status_code != 200:
+        log.warning("Craigslist fetch failed", extra={'status': response.status_code, 'url': url})
+        return None
+    return listing_parser.parse_listing_html(response.text)
+
+def _fetch_craigslist_listing(url):
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
-        }
-        response = requests.get(url, headers=headers, timeout=15)
-        
-        if response.status_code != 200:
-            print(f"Craigslist fetch failed: {response.status_code}")
-            return amenities
-        
-        soup = BeautifulSoup(response.text, 'lxml')
-        
-        # Get listing title
-        title_elem = soup.find('span', id='titletextonly')
-        if title_elem:
-            amenities['listing_title'] = title_elem.get_text(strip=True)
-        
-        # Get price
-        price_elem = soup.find('span', class_='price')
-        if price_elem:
-            amenities['listing_price'] = price_elem.get_text(strip=True)
-        
-        # Get housing info (bedrooms, sqft)
-        housing_elem = soup.find('span', class_='housing')
-        if housing_elem:
-            housing_text = housing_elem.get_text(strip=True)
-            # Parse bedrooms (e.g., "2br")
-            br_match = re.search(r'(\d+)\s*br', housing_text, re.I)
-            if br_match:
-                amenities['listing_bedrooms'] = br_match.group(1)
-            # Parse bathrooms (e.g., "1ba")
-            ba_match = re.search(r'(\d+(?:\.\d+)?)\s*ba', housing_text, re.I)
-            if ba_match:
-                amenities['listing_bathrooms'] = ba_match.group(1)
-            # Parse sqft
-            sqft_match = re.search(r'(\d+)\s*ft', housing_text, re.I)
-            if sqft_match:
-                amenities['listing_sqft'] = sqft_match.group(1)
-        
-        # Get attribute groups (parking, laundry, etc.) - handle newer Craigslist markup
-        attr_groups = soup.select('.attrgroup, .mapAndAttrs, .attr')
-        attr_texts = []
-        for group in attr_groups:
-            # Collect text from spans and links inside each group
-            for node in group.find_all(['span', 'a', 'div']):
-                text = node.get_text(strip=True)
-                if text:
-                    attr_texts.append(text)
-        # Fallback to generic attrgroup spans if nothing found
-        if not attr_texts:
-            for span in soup.find_all('span'):
-                text = span.get_text(strip=True)
-                if text:
-                    attr_texts.append(text)
-
-        for raw_text in attr_texts:
-            text = raw_text.lower()
-            
-            # Parking detection
-            if 'carport' in text:
-                amenities['parking'] = 'Carport'
-            elif 'attached garage' in text:
-                amenities['parking'] = 'Attached Garage'
-            elif 'detached garage' in text:
-                amenities['parking'] = 'Detached Garage'
-            elif 'off-street parking' in text:
-                amenities['parking'] = 'Off-street Parking'
-            elif 'street parking' in text:
-                amenities['parking'] = 'Street Parking'
-            elif 'valet parking' in text:
-                amenities['parking'] = 'Valet Parking'
-            elif 'no parking' in text:
-                amenities['parking'] = 'No Parking'
-            
-            # Laundry detection
-            if 'w/d in unit' in text or 'washer/dryer in unit' in text or 'wd in unit' in text:
-                amenities['laundry'] = 'In-unit W/D'
-            elif 'w/d hookups' in text or 'washer/dryer hookups' in text:
-                amenities['laundry'] = 'W/D Hookups'
-            elif 'laundry in bldg' in text or 'laundry on site' in text:
-                amenities['laundry'] = 'Shared Laundry'
-            elif 'no laundry' in text:
-                amenities['laundry'] = 'No Laundry'
-            
-            # Pets
-            if 'cats are ok' in text and 'dogs are ok' in text:
-                amenities['pets_allowed'] = 'Cats & Dogs OK'
-            elif 'cats are ok' in text:
-                amenities['pets_allowed'] = 'Cats OK'
-            elif 'dogs are ok' in text:
-                amenities['pets_allowed'] = 'Dogs OK'
-            elif 'no pets' in text:
-                amenities['pets_allowed'] = 'No Pets'
-            
-            # Furnished
-            if 'furnished' in text and 'unfurnished' not in text:
-                amenities['furnished'] = 'Yes'
-            elif 'unfurnished' in text:
-                amenities['furnished'] = 'No'
-            
-            # Smoking
-            if 'no smoking' in text:
-                amenities['smoking'] = 'No Smoking'
-            
-            # Wheelchair accessible
-            if 'wheelchair accessible' in text:
-                amenities['wheelchair_accessible'] = 'Yes'
-            
-            # Air conditioning
-            if 'air conditioning' in text or 'a/c' in text:
-                amenities['air_conditioning'] = 'Yes'
-            
-            # EV charging
-            if 'ev charging' in text:
-                amenities['ev_charging'] = 'Yes'
-        
-        # Get available date
-        avail_elem = soup.find('span', class_='property_date')
-        if avail_elem:
-            amenities['listing_available_date'] = avail_elem.get('data-date', avail_elem.get_text(strip=True))
-        
-        # Get images
-        thumbs = soup.find_all('a', class_='thumb')
-        for thumb in thumbs[:5]:  # Limit to 5 images
-            href = thumb.get('href')
-            if href:
-                amenities['listing_images'].append(href)
-        
+        # Another node may already have parsed this listing
+        key = 'listing:' + hashlib.sha1(url.encode('utf-8')).hexdigest()
+        amenities, _ = sharedcache.json_cached(key, LISTING_CACHE_TTL, lambda: _download_listing(url),
+                                               store_if=lambda a: a is not None)
+        if amenities is None:
+            return empty_amenities()
+        amenities['repost_of'] = flag_reposts(url, amenities)
+        with _listing_cache_lock:
+            _listing_cache[url] = (time.monotonic() + LISTING_CACHE_TTL, amenities)
+            _listing_cache.move_to_end(url)
+            while len(_listing_cache) > LISTING_CACHE_MAX_ENTRIES:
+                _listing_cache.popitem(last=False)
+        return amenities
     except Exception as e:
-        print(f"Craigslist parsing error: {e}")
+        log.warning("Craigslist parsing error: %s", e)
     
-    return amenities
+    return empty_amenities()
+
+def flag_reposts(url, amenities):
+    """Record a listing's fingerprint; returns earlier postings of the same unit ([] on error)"""
+    try:
+        return reposts.record(url, amenities)
+    except Exception as e:
+        log.warning("Repost check error: %s", e)
+        return []
+
+# ============================================================
+# SOQL QUERY HELPERS
+# ============================================================
+
+def soql_get(url, params, select=None):
+    """
+    GET a SoQL query projected to the `select` columns. If the dataset rejects
+    the projection (e.g. a renamed column), retry once without $select.
+    """
+    if select:
+        response = upstream.get(url, params=dict(params, **{'$select': ','.join(select)}))
+        if response.status_code != 400:
+            return response
+        log.info("Projection rejected, retrying without $select", extra={'url': url})
+    return upstream.get(url, params=params)
+
+def soql_count(url, where=None, filters=None):
+    """Exact number of rows matching a $where clause and/or simple filters, or None"""
+    params = dict(filters or {}, **{'$select': 'count(*) AS total'})
+    if where:
+        params['$where'] = where
+    try:
+        response = upstream.get(url, params=params)
+        if response.status_code == 200:
+            data = response.json()
+            if data:
+                return int(data[0].get('total', 0))
+    except Exception as e:
+        log.warning("Count query error: %s", e, extra={'url': url})
+    return None
 
 # ============================================================
 # SF RENT BOARD DATA FUNCTIONS
@@ -268,7 +270,7 @@ def get_rent_board_info(address=None, parcel=None):
         else:
             return None
         
-        response = requests.get(url, params=params, timeout=10)
+        response = upstream.get(url, params=params)
         
         if response.status_code == 200:
             data = response.json()
@@ -282,33 +284,42 @@ def get_rent_board_info(address=None, parcel=None):
         return {'is_rent_controlled': False, 'rent_board_data': None}
         
     except Exception as e:
-        print(f"Rent Board info error: {e}")
+        log.warning("Rent Board info error: %s", e)
         return None
 
+RENT_BOARD_UNIT_COLUMNS = [
+    'block_address', 'unit_count', 'submission_year', 'bedroom_count', 'bathroom_count',
+    'square_footage', 'monthly_rent', 'occupancy_type', 'year_property_built',
+    'analysis_neighborhood', 'supervisor_district', 'base_rent_includes_water_sewer',
+    'base_rent_includes_natural_gas', 'base_rent_includes_electricity',
+    'base_rent_includes_refuse_recycling', 'base_rent_includes_other_utilities'
+]
+
 def get_rent_board_housing_inventory(address=None, parcel=None):
     """
     Query SF Rent Board Housing Inventory for unit-level details.
     Dataset: Rent Board Housing Inventory
     API: https://data.sfgov.org/resource/gdc7-dmcn.json
-    Returns: Unit details including rent, bedrooms, bathrooms, square footage, utilities
+    Returns: Unit details including rent, bedrooms, bathrooms, square footage, utilities,
+    with 'units' as the latest row of each unit, newest first
     """
     try:
         url = "https://data.sfgov.org/resource/gdc7-dmcn.json"
-        params = {'$limit': 100, '$order': 'submission_year DESC'}  # Increased limit to get more units
+        params = {}
 
         if parcel:
             # Parcel can be either "BLOCK/LOT" or just "BLOCK" from Rent Board
             block = parcel.split('/')[0] if '/' in parcel else parcel
             block = block.zfill(4)
             params['block_num'] = block
-            print(f"Querying Rent Board Inventory for block: {block}")
+            log.debug("Querying Rent Board Inventory", extra={'block': block})
         elif address:
             # Address could be block format like "2900 Block of JACKSON ST"
             # or specific address - try to extract and match
             if 'Block of' in address or 'BLOCK OF' in address.upper():
                 # Already in block format, use directly
                 params['block_address'] = address
-                print(f"Querying Rent Board Inventory for block address: {address}")
+                log.debug("Querying Rent Board Inventory", extra={'block_address': address})
             else:
                 # Convert to block format
                 norm_addr = normalize_address(address.split(',')[0])
@@ -320,214 +331,278 @@ def get_rent_board_housing_inventory(address=None, parcel=None):
                     block_num = (int(street_num) // 100) * 100
                     block_query = f"{block_num} Block {street_name}"
                     params['$where'] = f"UPPER(block_address) LIKE UPPER('%{block_query}%')"
-                    print(f"Querying Rent Board Inventory for block: {block_query}")
+                    log.debug("Querying Rent Board Inventory", extra={'block': block_query})
         else:
             return None
 
-        response = requests.get(url, params=params, timeout=10)
-        print(f"Rent Board Inventory API response status: {response.status_code}")
-        print(f"Rent Board Inventory API URL: {response.url}")
+        # Most recent rows first, only the columns the UI shows
+        rows_params = dict(params, **{'$limit': 100, '$order': 'submission_year DESC'})
+        response = soql_get(url, rows_params, select=RENT_BOARD_UNIT_COLUMNS)
+        log.debug("Rent Board Inventory response", extra={'status': response.status_code, 'url': response.url})
 
         if response.status_code == 200:
             data = response.json()
-            print(f"Rent Board Inventory found {len(data)} records")
+            log.debug("Rent Board Inventory records", extra={'records': len(data)})
             if data and len(data) > 0:
-                # Get most recent year's data for each unique unit
-                # Group by bedroom/bathroom/sqft to identify unique units
+                # Rows arrive newest first, so the first row seen for each
+                # bedroom/bathroom/sqft combination is that unit's latest submission.
+                # They go into the response as they are; only the newest is read
+                # typed (RentBoardUnit), in the merge
                 unique_units = {}
-                for unit in data:
-                    key = f"{unit.get('bedroom_count')}_{unit.get('bathroom_count')}_{unit.get('square_footage')}"
-                    if key not in unique_units:
-                        unique_units[key] = unit
-                    else:
-                        # Keep most recent submission
-                        if int(unit.get('submission_year', 0)) > int(unique_units[key].get('submission_year', 0)):
-                            unique_units[key] = unit
+                for row in data:
+                    unique_units.setdefault(RentBoardUnit.row_key(row), row)
+
+                # Exact distinct-unit and record totals, aggregated upstream
+                group_params = dict(params, **{
+                    '$select': 'bedroom_count,bathroom_count,square_footage,count(*) AS records',
+                    '$group': 'bedroom_count,bathroom_count,square_footage',
+                    '$limit': 5000
+                })
+                units_found, total_records = len(unique_units), len(data)
+                group_response = upstream.get(url, params=group_params)
+                if group_response.status_code == 200:
+                    groups = group_response.json()
+                    units_found = len(groups)
+                    total_records = sum(int(g.get('records', 0)) for g in groups)
 
                 return {
-                    'units_found': len(unique_units),
+                    'units_found': units_found,
+                    'total_records': total_records,
                     'units': list(unique_units.values()),
                     'total_units': data[0].get('unit_count') if data else None,
-                    'block_address': data[0].get('block_address') if data else None
+                    'block_address': data[0].get('block_address') if data else None,
+                    'block_stats': indexes.lookup('rent_inventory_stats', block) if parcel else None
                 }
 
         return None
 
     except Exception as e:
-        print(f"Rent Board Housing Inventory error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Rent Board Housing Inventory error: %s", e)
         return None
 
-def get_eviction_history(address=None, parcel=None):
+EVICTION_REASON_FIELDS = [
+    ('non_payment', 'Non-Payment of Rent'),
+    ('breach', 'Breach of Lease'),
+    ('nuisance', 'Nuisance'),
+    ('illegal_use', 'Illegal Use'),
+    ('failure_to_sign_renewal', 'Failure to Sign Renewal'),
+    ('access_denial', 'Access Denial'),
+    ('unapproved_subtenant', 'Unapproved Subtenant'),
+    ('owner_move_in', 'Owner Move-In'),
+    ('demolition', 'Demolition'),
+    ('capital_improvement', 'Capital Improvement'),
+    ('substantial_rehab', 'Substantial Rehab'),
+    ('ellis_act_withdrawal', 'Ellis Act Withdrawal'),
+    ('condo_conversion', 'Condo Conversion'),
+    ('roommate_same_unit', 'Roommate Same Unit'),
+    ('other_cause', 'Other Cause'),
+    ('late_payments', 'Late Payments'),
+    ('lead_remediation', 'Lead Remediation'),
+    ('development', 'Development Agreement'),
+    ('good_samaritan_ends', 'Good Samaritan Ends')
+]
+
+EVICTIONS_URL = "https://data.sfgov.org/resource/5cei-gny5.json"
+COMPLAINTS_URL = "https://data.sfgov.org/resource/7d5q-jf8x.json"
+BUYOUTS_URL = "https://data.sfgov.org/resource/wmam-7g8d.json"
+
+EVICTION_COLUMNS = ['file_date', 'neighborhood', 'supervisor_district'] + [field for field, _ in EVICTION_REASON_FIELDS]
+COMPLAINT_COLUMNS = ['date_filed', 'category', 'type', 'status', 'resolution']
+BUYOUT_COLUMNS = ['filing_date', 'buyout_amount', 'neighborhood']
+
+# "<number> <street>" at the start of an address, up to the first comma
+STREET_ADDRESS_RE = re.compile(r'(\d+)\s+(.+?)(?:,|$)')
+STREET_SUFFIX_RE = re.compile(r'\s+(ST|AVE|BLVD|DR|RD|CT|PL|LN|WAY|TER)$')
+
+def eviction_where(address):
+    """SoQL $where matching eviction notices at an address, or None"""
+    street_match = STREET_ADDRESS_RE.match(address or '')
+    if not street_match:
+        return None
+    street_addr = f"{street_match.group(1)} {street_match.group(2).strip()}"
+    return f"UPPER(address) LIKE UPPER('%{street_addr}%')"
+
+def complaint_where(address):
+    """SoQL $where matching housing complaints at an address, or None"""
+    street_match = STREET_ADDRESS_RE.match(address or '')
+    if not street_match:
+        return None
+    street_num = street_match.group(1)
+    street_name = street_match.group(2).strip().upper()
+    # Remove common suffixes for better matching
+    street_name = STREET_SUFFIX_RE.sub('', street_name)
+    return f"block_address LIKE '%{street_num}%' AND UPPER(block_address) LIKE UPPER('%{street_name}%')"
+
+def buyout_where(address):
+    """SoQL $where matching buyout agreements at an address, or None"""
+    # Same address matching as eviction notices
+    return eviction_where(address)
+
+RECORD_QUERIES = {
+    'evictions': (EVICTIONS_URL, eviction_where),
+    'complaints': (COMPLAINTS_URL, complaint_where),
+    'buyouts': (BUYOUTS_URL, buyout_where),
+}
+
+def get_record_total(kind, address=None, blklot=None):
+    """
+    Exact number of eviction/complaint/buyout records for a property: from the
+    local linkage table when built (parcel-level links only), otherwise a
+    count(*) query upstream.
+    """
+    linked = get_linked_records(address=address, blklot=blklot)
+    if linked is not None:
+        return linked['counts'][kind]
+    url, where_for = RECORD_QUERIES[kind]
+    where = where_for(address)
+    return soql_count(url, where) if where else 0
+
+def get_linked_records(address=None, blklot=None):
+    """Records linked offline to this parcel (and, apart, its street block), or None if there's no linkage table"""
+    normalized = normalize_address(address.split(',')[0]) if address else None
+    try:
+        return linkage.lookup(blklot=blklot, normalized_address=normalized)
+    except Exception as e:
+        log.warning("Record linkage lookup error: %s", e)
+        return None
+
+def get_owner_portfolio(blklot=None, owner=None):
+    """Portfolio rollup for the parcel's owner (by parcel, then by owner name), or None"""
+    try:
+        portfolio = owners.lookup_parcel(blklot) if blklot else None
+        if portfolio is None and owner and owner != 'Not available':
+            entry = owners.lookup(owners.owner_id(owner))
+            portfolio = owners.portfolio_summary(entry) if entry else None
+        return portfolio
+    except Exception as e:
+        log.warning("Owner portfolio lookup error: %s", e)
+        return None
+
+def eviction_summary(record):
+    """Reduce an eviction notice row to the fields shown in search results"""
+    # Read straight from the row: an intermediate record would only add allocations
+    # Eviction reasons are boolean fields
+    reasons = [label for field, label in EVICTION_REASON_FIELDS
+               if record.get(field) == 'true' or record.get(field) is True]
+    return {
+        'file_date': record['file_date'][:10] if record.get('file_date') else 'Unknown',
+        'eviction_reason': reasons or ['Reason not specified'],
+        'neighborhood': record.get('neighborhood', 'Unknown'),
+        'supervisor_district': record.get('supervisor_district', 'Unknown')
+    }
+
+def get_eviction_history(address=None, parcel=None, blklot=None):
     """
     Get eviction notices/filings for a property.
     Dataset: Eviction Notices
     API: https://data.sfgov.org/resource/5cei-gny5.json
     """
     try:
-        url = "https://data.sfgov.org/resource/5cei-gny5.json"
+        linked = get_linked_records(address=address, blklot=blklot)
+        if linked is not None:
+            return linkage.history(linked, 'evictions', 10)
+
+        where = eviction_where(address)
+        if not where:
+            return []
         params = {
-            '$limit': 20,
+            '$where': where,
+            '$limit': 10,
             '$order': 'file_date DESC'
         }
         
-        if address:
-            # Extract street number and name
-            street_match = re.match(r'(\d+)\s+(.+?)(?:,|$)', address)
-            if street_match:
-                street_addr = f"{street_match.group(1)} {street_match.group(2).strip()}"
-                params['$where'] = f"UPPER(address) LIKE UPPER('%{street_addr}%')"
-            else:
-                return []
-        else:
-            return []
-        
-        response = requests.get(url, params=params, timeout=10)
+        response = soql_get(EVICTIONS_URL, params, select=EVICTION_COLUMNS)
         
         if response.status_code == 200:
             data = response.json()
-            evictions = []
-            for record in data[:10]:  # Limit to 10 most recent
-                eviction = {
-                    'file_date': record.get('file_date', 'Unknown')[:10] if record.get('file_date') else 'Unknown',
-                    'eviction_reason': [],
-                    'neighborhood': record.get('neighborhood', 'Unknown'),
-                    'supervisor_district': record.get('supervisor_district', 'Unknown')
-                }
-                
-                # Collect all eviction reasons (they are boolean fields)
-                reason_fields = [
-                    ('non_payment', 'Non-Payment of Rent'),
-                    ('breach', 'Breach of Lease'),
-                    ('nuisance', 'Nuisance'),
-                    ('illegal_use', 'Illegal Use'),
-                    ('failure_to_sign_renewal', 'Failure to Sign Renewal'),
-                    ('access_denial', 'Access Denial'),
-                    ('unapproved_subtenant', 'Unapproved Subtenant'),
-                    ('owner_move_in', 'Owner Move-In'),
-                    ('demolition', 'Demolition'),
-                    ('capital_improvement', 'Capital Improvement'),
-                    ('substantial_rehab', 'Substantial Rehab'),
-                    ('ellis_act_withdrawal', 'Ellis Act Withdrawal'),
-                    ('condo_conversion', 'Condo Conversion'),
-                    ('roommate_same_unit', 'Roommate Same Unit'),
-                    ('other_cause', 'Other Cause'),
-                    ('late_payments', 'Late Payments'),
-                    ('lead_remediation', 'Lead Remediation'),
-                    ('development', 'Development Agreement'),
-                    ('good_samaritan_ends', 'Good Samaritan Ends')
-                ]
-                
-                for field, label in reason_fields:
-                    if record.get(field) == 'true' or record.get(field) is True:
-                        eviction['eviction_reason'].append(label)
-                
-                if not eviction['eviction_reason']:
-                    eviction['eviction_reason'] = ['Reason not specified']
-                
-                evictions.append(eviction)
-            
-            return evictions
+            return [eviction_summary(record) for record in data[:10]]  # Limit to 10 most recent
         
         return []
         
     except Exception as e:
-        print(f"Eviction history error: {e}")
+        log.warning("Eviction history error: %s", e)
         return []
 
-def get_housing_complaints(address=None, parcel=None):
+def complaint_summary(record):
+    """Reduce a housing complaint row to the fields shown in search results"""
+    return {
+        'date_filed': record['date_filed'][:10] if record.get('date_filed') else 'Unknown',
+        'category': record.get('category', 'Unknown'),
+        'type': record.get('type', 'Unknown'),
+        'status': record.get('status', 'Unknown'),
+        'resolution': record.get('resolution', 'Pending')
+    }
+
+def get_housing_complaints(address=None, parcel=None, blklot=None):
     """
     Get housing complaints/violations for a property.
     Dataset: Housing Complaints
     API: https://data.sfgov.org/resource/7d5q-jf8x.json
     """
     try:
-        url = "https://data.sfgov.org/resource/7d5q-jf8x.json"
+        linked = get_linked_records(address=address, blklot=blklot)
+        if linked is not None:
+            return linkage.history(linked, 'complaints', 10)
+
+        where = complaint_where(address)
+        if not where:
+            return []
         params = {
-            '$limit': 20,
+            '$where': where,
+            '$limit': 10,
             '$order': 'date_filed DESC'
         }
         
-        if address:
-            # Extract street number and name
-            street_match = re.match(r'(\d+)\s+(.+?)(?:,|$)', address)
-            if street_match:
-                street_num = street_match.group(1)
-                street_name = street_match.group(2).strip().upper()
-                # Remove common suffixes for better matching
-                street_name = re.sub(r'\s+(ST|AVE|BLVD|DR|RD|CT|PL|LN|WAY|TER)$', '', street_name)
-                params['$where'] = f"block_address LIKE '%{street_num}%' AND UPPER(block_address) LIKE UPPER('%{street_name}%')"
-            else:
-                return []
-        else:
-            return []
-        
-        response = requests.get(url, params=params, timeout=10)
+        response = soql_get(COMPLAINTS_URL, params, select=COMPLAINT_COLUMNS)
         
         if response.status_code == 200:
             data = response.json()
-            complaints = []
-            for record in data[:10]:  # Limit to 10 most recent
-                complaint = {
-                    'date_filed': record.get('date_filed', 'Unknown')[:10] if record.get('date_filed') else 'Unknown',
-                    'category': record.get('category', 'Unknown'),
-                    'type': record.get('type', 'Unknown'),
-                    'status': record.get('status', 'Unknown'),
-                    'resolution': record.get('resolution', 'Pending')
-                }
-                complaints.append(complaint)
-            
-            return complaints
+            return [complaint_summary(record) for record in data[:10]]  # Limit to 10 most recent
         
         return []
         
     except Exception as e:
-        print(f"Housing complaints error: {e}")
+        log.warning("Housing complaints error: %s", e)
         return []
 
-def get_buyout_agreements(address=None, parcel=None):
+def buyout_summary(record):
+    """Reduce a buyout agreement row to the fields shown in search results"""
+    return {
+        'filing_date': record.get('filing_date', 'Unknown')[:10] if record.get('filing_date') else 'Unknown',
+        'buyout_amount': record.get('buyout_amount', 'Not disclosed'),
+        'neighborhood': record.get('neighborhood', 'Unknown')
+    }
+
+def get_buyout_agreements(address=None, parcel=None, blklot=None):
     """
     Get buyout agreement filings for a property.
     Dataset: Buyout Agreements
     API: https://data.sfgov.org/resource/wmam-7g8d.json
     """
     try:
-        url = "https://data.sfgov.org/resource/wmam-7g8d.json"
+        linked = get_linked_records(address=address, blklot=blklot)
+        if linked is not None:
+            return linkage.history(linked, 'buyouts', 5)
+
+        where = buyout_where(address)
+        if not where:
+            return []
         params = {
-            '$limit': 10,
+            '$where': where,
+            '$limit': 5,
             '$order': 'filing_date DESC'
         }
         
-        if address:
-            street_match = re.match(r'(\d+)\s+(.+?)(?:,|$)', address)
-            if street_match:
-                street_addr = f"{street_match.group(1)} {street_match.group(2).strip()}"
-                params['$where'] = f"UPPER(address) LIKE UPPER('%{street_addr}%')"
-            else:
-                return []
-        else:
-            return []
-        
-        response = requests.get(url, params=params, timeout=10)
+        response = soql_get(BUYOUTS_URL, params, select=BUYOUT_COLUMNS)
         
         if response.status_code == 200:
             data = response.json()
-            buyouts = []
-            for record in data[:5]:
-                buyout = {
-                    'filing_date': record.get('filing_date', 'Unknown')[:10] if record.get('filing_date') else 'Unknown',
-                    'buyout_amount': record.get('buyout_amount', 'Not disclosed'),
-                    'neighborhood': record.get('neighborhood', 'Unknown')
-                }
-                buyouts.append(buyout)
-            
-            return buyouts
+            return [buyout_summary(record) for record in data[:5]]
         
         return []
         
     except Exception as e:
-        print(f"Buyout agreements error: {e}")
+        log.warning("Buyout agreements error: %s", e)
         return []
 CORS(app)
 
@@ -543,34 +618,69 @@ def load_properties():
         try:
             with open(PROPERTIES_FILE, 'r') as f:
                 data = json.load(f)
-                return data.get('properties', []), data.get('counter', 1)
+            properties = data.get('properties', [])
+            # Move full documents saved before snapshots into the snapshot store
+            legacy = [i for i, p in enumerate(properties) if snapshots.SNAPSHOT_KEY not in p and p.get('blklot')]
+            for i in legacy:
+                properties[i] = snapshots.dehydrate(properties[i])
+            if legacy:
+                write_properties(properties, data.get('counter', 1))
+            return properties, data.get('counter', 1)
         except Exception as e:
-            print(f"Error loading properties: {e}")
+            log.warning("Error loading properties: %s", e)
     return [], 1
 
+def write_properties(properties, counter):
+    tmp_path = f"{PROPERTIES_FILE}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'properties': properties,
+            'counter': counter
+        }, f, indent=2)
+    os.replace(tmp_path, PROPERTIES_FILE)
+
 def save_properties_to_file():
     """Save properties to JSON file"""
     try:
-        with open(PROPERTIES_FILE, 'w') as f:
-            json.dump({
-                'properties': saved_properties,
-                'counter': property_counter
-            }, f, indent=2)
+        write_properties(saved_properties, property_counter)
     except Exception as e:
-        print(f"Error saving properties: {e}")
+        log.warning("Error saving properties: %s", e)
+
+# Saved properties are loaded by the background warm-up (or on first use)
+saved_properties, property_counter = [], 1
+_properties_loaded = threading.Event()
+_properties_lock = threading.Lock()
+
+def ensure_properties_loaded():
+    """Load saved properties from disk once per process"""
+    global saved_properties, property_counter
+    if _properties_loaded.is_set():
+        return
+    with _properties_lock:
+        if not _properties_loaded.is_set():
+            saved_properties, property_counter = load_properties()
+            _properties_loaded.set()
 
-# Load saved properties on startup
-saved_properties, property_counter = load_properties()
+def parcel_from_coordinates(amenities):
+    """Parcel ('BLOCK/LOT') under a listing's map pin, via the local geo index; '' if unknown"""
+    lat, lon = (amenities or {}).get('listing_latitude'), (amenities or {}).get('listing_longitude')
+    if lat is None or lon is None:
+        return ''
+    match = geoindex.locate(lat, lon)
+    if not match:
+        return ''
+    log.info("Listing located by coordinates", extra=match)
+    return f"{match['blklot'][:4]}/{match['blklot'][4:]}"
+
+# This is a basic implementation - you may want to enhance it
+ADDRESS_URL_PATTERNS = [
+    re.compile(r'(\d+[^,\n]+(?:street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|way|lane|ln|court|ct|place|pl)[^,\n]*,?\s*(?:san\s+francisco|sf)?)'),
+]
 
 def extract_address_from_url(url):
     """Attempt to extract address from listing URL"""
-    # This is a basic implementation - you may want to enhance it
-    address_patterns = [
-        r'(\d+[^,\n]+(?:street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|way|lane|ln|court|ct|place|pl)[^,\n]*,?\s*(?:san\s+francisco|sf)?)',
-    ]
-    
-    for pattern in address_patterns:
-        match = re.search(pattern, url.lower())
+    for pattern in ADDRESS_URL_PATTERNS:
+        match = pattern.search(url.lower())
         if match:
             return match.group(1).strip()
     
@@ -590,7 +700,7 @@ def geocode_address(address):
             "$limit": 1
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        response = upstream.get(url, params=params)
         
         if response.status_code == 200 and response.json():
             data = response.json()[0]
@@ -600,10 +710,37 @@ def geocode_address(address):
                 'formatted_address': data.get('address', address)
             }
     except Exception as e:
-        print(f"Geocoding error: {e}")
+        log.warning("Geocoding error: %s", e)
     
     return None
 
+# Common street type variations and their standardized forms
+STREET_TYPES = {
+    'STREET': 'ST', 'ST': 'ST',
+    'AVENUE': 'AVE', 'AVE': 'AVE', 'AV': 'AVE',
+    'ROAD': 'RD', 'RD': 'RD',
+    'BOULEVARD': 'BLVD', 'BLVD': 'BLVD',
+    'DRIVE': 'DR', 'DR': 'DR',
+    'WAY': 'WAY',
+    'LANE': 'LN', 'LN': 'LN',
+    'COURT': 'CT', 'CT': 'CT',
+    'PLACE': 'PL', 'PL': 'PL',
+    'TERRACE': 'TER', 'TER': 'TER',
+    'CIRCLE': 'CIR', 'CIR': 'CIR',
+    'ALLEY': 'ALY', 'ALY': 'ALY',
+    'PLAZA': 'PLZ', 'PLZ': 'PLZ',
+    'SQUARE': 'SQ', 'SQ': 'SQ',
+    'PARKWAY': 'PKWY', 'PKWY': 'PKWY',
+    'HIGHWAY': 'HWY', 'HWY': 'HWY',
+    'CENTER': 'CTR', 'CTR': 'CTR',
+    'CRESCENT': 'CRES', 'CRES': 'CRES',
+    'LOOP': 'LOOP',
+    'TRAIL': 'TRL', 'TRL': 'TRL',
+    'PIER': 'PIER',
+    'HILL': 'HL', 'HL': 'HL',
+    'VIEW': 'VW', 'VW': 'VW'
+}
+
 def normalize_address(address):
     """Normalize and standardize address for better DataSF matching"""
     if not address:
@@ -612,33 +749,6 @@ def normalize_address(address):
     # Remove trailing punctuation
     address = address.rstrip('.,;')
     
-    # Common street type variations and their standardized forms
-    street_types = {
-        'STREET': 'ST', 'ST': 'ST',
-        'AVENUE': 'AVE', 'AVE': 'AVE', 'AV': 'AVE',
-        'ROAD': 'RD', 'RD': 'RD',
-        'BOULEVARD': 'BLVD', 'BLVD': 'BLVD',
-        'DRIVE': 'DR', 'DR': 'DR',
-        'WAY': 'WAY',
-        'LANE': 'LN', 'LN': 'LN',
-        'COURT': 'CT', 'CT': 'CT',
-        'PLACE': 'PL', 'PL': 'PL',
-        'TERRACE': 'TER', 'TER': 'TER',
-        'CIRCLE': 'CIR', 'CIR': 'CIR',
-        'ALLEY': 'ALY', 'ALY': 'ALY',
-        'PLAZA': 'PLZ', 'PLZ': 'PLZ',
-        'SQUARE': 'SQ', 'SQ': 'SQ',
-        'PARKWAY': 'PKWY', 'PKWY': 'PKWY',
-        'HIGHWAY': 'HWY', 'HWY': 'HWY',
-        'CENTER': 'CTR', 'CTR': 'CTR',
-        'CRESCENT': 'CRES', 'CRES': 'CRES',
-        'LOOP': 'LOOP',
-        'TRAIL': 'TRL', 'TRL': 'TRL',
-        'PIER': 'PIER',
-        'HILL': 'HL', 'HL': 'HL',
-        'VIEW': 'VW', 'VW': 'VW'
-    }
-    
     # Split address into parts
     parts = address.upper().split()
     
@@ -646,11 +756,14 @@ def normalize_address(address):
     if len(parts) >= 2:
         # Check last word for street type
         last_word = parts[-1].rstrip('.,;')
-        if last_word in street_types:
-            parts[-1] = street_types[last_word]
+        if last_word in STREET_TYPES:
+            parts[-1] = STREET_TYPES[last_word]
     
     return ' '.join(parts)
 
+# Street type (2 letters) followed by a 4-digit unit number at the end
+UNIT_NUMBER_RE = re.compile(r'\b([A-Z]{2})(\d{4})$')
+
 def extract_unit_number(property_location):
     """Extract unit number from property_location field.
     Format: '0000 2989 JACKSON             ST0001'
@@ -659,15 +772,27 @@ def extract_unit_number(property_location):
     if not property_location or not isinstance(property_location, str):
         return None
     
-    # Match pattern: street type (2 letters) followed by digits
-    match = re.search(r'\b([A-Z]{2})(\d{4})$', property_location.strip())
+    match = UNIT_NUMBER_RE.search(property_location.strip())
     if match:
         unit_num = match.group(2).lstrip('0')  # Remove leading zeros
         return unit_num if unit_num else None
     return None
 
-def get_parcel_info(address=None, parcel=None, debug=False):
-    """Get parcel information from SF Assessor data by address or parcel/lot"""
+def _parcel_rows(url, params, strict):
+    """Assessor rows for a query; a failed request reads as no rows unless strict"""
+    response = upstream.get(url, params=params)
+    if response.status_code == 200:
+        return response.json()
+    if strict:
+        raise RuntimeError(f"Parcel lookup failed: HTTP {response.status_code}")
+    return []
+
+def get_parcel_info(address=None, parcel=None, debug=False, strict=False):
+    """
+    Get parcel information from SF Assessor data by address or parcel/lot.
+    None when nothing matches; with strict, a failed lookup (timeout, non-200)
+    raises instead of also returning None, so callers can tell them apart.
+    """
     try:
         url = "https://data.sfgov.org/resource/acdm-wktn.json"
         if parcel:
@@ -677,15 +802,28 @@ def get_parcel_info(address=None, parcel=None, debug=False):
             lot = lot.zfill(3) if lot else ''
             blklot = f"{block}{lot}"
             where = f"blklot = '{blklot}'"
+            # Local memory-mapped parcel index answers without an upstream call
+            if not debug:
+                local = indexes.lookup('parcel_attrs', blklot)
+                if local:
+                    return local
         elif address:
             # Try multiple strategies for address matching
             norm_addr = normalize_address(address.split(',')[0])
+
+            # Strategy 0: exact hit in the local address -> blklot index
+            if not debug:
+                blklots = indexes.lookup('address_blklot', norm_addr)
+                if blklots:
+                    local = indexes.lookup('parcel_attrs', blklots[0])
+                    if local:
+                        return local
+                    return get_parcel_info(parcel=blklots[0], strict=strict)
             
             # Strategy 1: Exact match
             where = f"UPPER(address) = UPPER('{norm_addr}')"
             params = {"$where": where, "$limit": 5}
-            response = requests.get(url, params=params, timeout=10)
-            data = response.json() if response.status_code == 200 else []
+            data = _parcel_rows(url, params, strict)
             
             # Strategy 2: If no exact match, try LIKE with street number
             if not data or len(data) == 0:
@@ -698,8 +836,7 @@ def get_parcel_info(address=None, parcel=None, debug=False):
                     # Try with LIKE for more flexible matching
                     where = f"UPPER(address) LIKE UPPER('{street_number} {street_name}%')"
                     params = {"$where": where, "$limit": 5}
-                    response = requests.get(url, params=params, timeout=10)
-                    data = response.json() if response.status_code == 200 else []
+                    data = _parcel_rows(url, params, strict)
                     
                     # Strategy 3: If still no match, try just street number and first word of street
                     if not data or len(data) == 0:
@@ -707,8 +844,7 @@ def get_parcel_info(address=None, parcel=None, debug=False):
                         if first_word:
                             where = f"UPPER(address) LIKE UPPER('{street_number} {first_word}%')"
                             params = {"$where": where, "$limit": 5}
-                            response = requests.get(url, params=params, timeout=10)
-                            data = response.json() if response.status_code == 200 else []
+                            data = _parcel_rows(url, params, strict)
             
             if debug:
                 return data, params
@@ -720,15 +856,16 @@ def get_parcel_info(address=None, parcel=None, debug=False):
             return None
             
         params = {"$where": where, "$limit": 1}
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json() if response.status_code == 200 else []
+        data = _parcel_rows(url, params, strict)
         if debug:
             return data, params
         # DataSF returns a list; return the first item if present
         if isinstance(data, list) and len(data) > 0:
             return data[0]
     except Exception as e:
-        print(f"Parcel info error: {e}")
+        if strict:
+            raise
+        log.warning("Parcel info error: %s", e)
     return None
 
 def get_building_permits(address):
@@ -737,7 +874,7 @@ def get_building_permits(address):
         url = "https://data.sfgov.org/resource/i98e-djp9.json"
         
         # Extract street number and name
-        street_match = re.match(r'(\d+)\s+(.+?)(?:,|$)', address)
+        street_match = STREET_ADDRESS_RE.match(address)
         if not street_match:
             return []
         
@@ -750,20 +887,66 @@ def get_building_permits(address):
             "$limit": 5
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        response = soql_get(url, params, select=['description', 'status', 'filed_date', 'permit_type'])
         
         if response.status_code == 200:
             return response.json()
     except Exception as e:
-        print(f"Building permits error: {e}")
+        log.warning("Building permits error: %s", e)
     
     return []
 
+# (output key, Land Use field) pairs copied into search results
+LANDUSE_OUTPUT_FIELDS = (
+    ('landuse_mapblklot', 'mapblklot'),
+    ('landuse_restype', 'restype'),
+    ('landuse_resunits', 'resunits'),
+    ('landuse_res', 'res'),
+    ('landuse_totalcomm', 'totalcomm'),
+    ('landuse_cie', 'cie'),
+    ('landuse_med', 'med'),
+    ('landuse_mips', 'mips'),
+    ('landuse_retail', 'retail'),
+    ('landuse_pdr', 'pdr'),
+    ('landuse_visitor', 'visitor'),
+    ('landuse_from_st', 'from_st'),
+    ('landuse_to_st', 'to_st'),
+    ('landuse_street', 'street'),
+    ('landuse_st_type', 'st_type'),
+    ('landuse_the_geom', 'the_geom'),
+)
+
+# (output key, TaxRollRecord field) pairs copied into search results
+ASSESSOR_OUTPUT_FIELDS = (
+    ('assessor_closed_roll_year', 'closed_roll_year'),
+    ('assessor_property_class_code', 'property_class_code'),
+    ('assessor_property_class_code_definition', 'property_class_code_definition'),
+    ('assessor_use_code', 'use_code'),
+    ('assessor_use_definition', 'use_definition'),
+    ('assessor_supervisor_district', 'supervisor_district'),
+    ('assessor_zoning_code', 'zoning_code'),
+    ('assessor_year_property_built', 'year_property_built'),
+    ('assessor_number_of_units', 'number_of_units'),
+    ('assessor_number_of_rooms', 'number_of_rooms'),
+    ('assessor_number_of_bathrooms', 'number_of_bathrooms'),
+    ('assessor_number_of_bedrooms', 'number_of_bedrooms'),
+    ('assessor_property_area', 'property_area'),
+    ('assessor_location', 'property_location'),
+    ('assessor_parcel_number', 'parcel_number'),
+)
+
+def rent_control_from_year_built(year_built_val):
+    """Rent control heuristic: SF buildings built before 1979 are generally covered"""
+    if year_built_val and str(year_built_val).isdigit():
+        if int(year_built_val) < 1979:
+            return 'Likely Yes (Built before 1979)'
+        return 'Likely No (Built after 1979)'
+    return 'Unknown'
+
 def get_property_details(address=None, parcel=None, debug=False):
-    # Query Historical Tax Roll dataset (TEMP: comment out for debugging)
-    historical_taxroll = get_historical_taxroll(parcel=parcel, address=address)
     """Aggregate all property information"""
     debug_info = {}
+    profiling.mark('parcel')
     # Pre-check for available data
     if parcel:
         parcel_info = get_parcel_info(parcel=parcel)
@@ -788,30 +971,29 @@ def get_property_details(address=None, parcel=None, debug=False):
             parcel_info = parcel_info_raw[0]
         else:
             parcel_info = None
+    profiling.mark('taxroll_permits_landuse')
+    # Query Historical Tax Roll dataset by the resolved parcel
+    historical_taxroll = get_historical_taxroll(parcel=parcel_info.get('blklot') or parcel, address=address)
     # Get building permits
     permits = get_building_permits(address or parcel_info.get('address', ''))
     # Query Land Use dataset for aggregation
     landuse_info = get_landuse_info(parcel=parcel, address=address)
+    profiling.mark('merge')
+    parcel_rec = ParcelRecord.from_row(parcel_info)
     # Aggregate most recent historical tax roll record if available
-    assessor_data = None
+    assessor = None
     if historical_taxroll and isinstance(historical_taxroll, list):
-        # Sort by closed_roll_year descending (most recent first)
-        try:
-            assessor_data = sorted(historical_taxroll, key=lambda x: int(x.get('closed_roll_year', 0)), reverse=True)[0]
-        except Exception:
-            assessor_data = historical_taxroll[0]
+        # Rows are ordered by closed_roll_year DESC upstream
+        assessor = TaxRollRecord.from_row(historical_taxroll[0])
+    landuse = landuse_info or {}
     # Owner: prefer parcel_info, then assessor_data, then landuse_info
-    owner = parcel_info.get('owner') or (assessor_data.get('owner') if assessor_data else None) or (landuse_info.get('owner') if landuse_info else None) or 'Not available'
+    owner = parcel_rec.owner or (assessor.owner if assessor else None) or landuse.get('owner') or 'Not available'
     if isinstance(owner, list):
         owner = ', '.join(owner)
     # Assessed value: prefer fixtures, fallback to land value (Assessor, then assessor_data)
-    assessed_value = parcel_info.get('closed_roll_assessed_fixtures_value')
-    if not assessed_value:
-        assessed_value = parcel_info.get('closed_roll_assessed_land_value')
-    if not assessed_value and assessor_data:
-        assessed_value = assessor_data.get('assessed_fixtures_value')
-        if not assessed_value:
-            assessed_value = assessor_data.get('assessed_land_value')
+    assessed_value = parcel_rec.closed_roll_assessed_fixtures_value or parcel_rec.closed_roll_assessed_land_value
+    if not assessed_value and assessor:
+        assessed_value = assessor.assessed_fixtures_value or assessor.assessed_land_value
     if assessed_value:
         try:
             assessed_value = f"${int(float(assessed_value)):,}"
@@ -820,82 +1002,48 @@ def get_property_details(address=None, parcel=None, debug=False):
     else:
         assessed_value = 'Not available'
     # Year built: prefer parcel_info, then assessor_data, then Land Use
-    year_built = parcel_info.get('year_property_built') or (assessor_data.get('year_property_built') if assessor_data else None) or (landuse_info.get('yrbuilt') if landuse_info else None) or 'Not available'
+    year_built = format_value(parcel_rec.year_property_built or (assessor.year_property_built if assessor else None) or landuse.get('yrbuilt') or 'Not available')
     # Property type: prefer parcel_info, then assessor_data, then Land Use
-    property_type = parcel_info.get('property_class_description') or (assessor_data.get('property_class_code_definition') if assessor_data else None) or (landuse_info.get('landuse') if landuse_info else None) or 'Not available'
+    property_type = parcel_rec.property_class_description or (assessor.property_class_code_definition if assessor else None) or landuse.get('landuse') or 'Not available'
     # Units: prefer parcel_info, then assessor_data, then Land Use
-    num_units = parcel_info.get('number_of_units') or (assessor_data.get('number_of_units') if assessor_data else None) or (landuse_info.get('resunits') if landuse_info else None) or 'Not available'
+    num_units = format_value(parcel_rec.number_of_units or (assessor.number_of_units if assessor else None) or landuse.get('resunits') or 'Not available')
     # Building size: prefer parcel_info, then assessor_data, then Land Use
-    building_sqft = parcel_info.get('building_sqft') or (assessor_data.get('property_area') if assessor_data else None) or (landuse_info.get('bldgsqft') if landuse_info else None) or 'Not available'
-    # Add more assessor fields as needed
-    assessor_fields = {}
-    if assessor_data:
-        assessor_fields = {
-            'assessor_closed_roll_year': assessor_data.get('closed_roll_year'),
-            'assessor_property_class_code': assessor_data.get('property_class_code'),
-            'assessor_property_class_code_definition': assessor_data.get('property_class_code_definition'),
-            'assessor_use_code': assessor_data.get('use_code'),
-            'assessor_use_definition': assessor_data.get('use_definition'),
-            'assessor_supervisor_district': assessor_data.get('supervisor_district'),
-            'assessor_zoning_code': assessor_data.get('zoning_code'),
-            'assessor_year_property_built': assessor_data.get('year_property_built'),
-            'assessor_number_of_units': assessor_data.get('number_of_units'),
-            'assessor_number_of_rooms': assessor_data.get('number_of_rooms'),
-            'assessor_number_of_bathrooms': assessor_data.get('number_of_bathrooms'),
-            'assessor_number_of_bedrooms': assessor_data.get('number_of_bedrooms'),
-            'assessor_property_area': assessor_data.get('property_area'),
-            'assessor_location': assessor_data.get('property_location'),
-            'assessor_parcel_number': assessor_data.get('parcel_number'),
-        }
-    # Aggregate all Land Use fields if available
-    landuse_fields = {}
-    if landuse_info:
-        landuse_fields = {
-            'landuse_mapblklot': landuse_info.get('mapblklot'),
-            'landuse_restype': landuse_info.get('restype'),
-            'landuse_resunits': landuse_info.get('resunits'),
-            'landuse_res': landuse_info.get('res'),
-            'landuse_totalcomm': landuse_info.get('totalcomm'),
-            'landuse_cie': landuse_info.get('cie'),
-            'landuse_med': landuse_info.get('med'),
-            'landuse_mips': landuse_info.get('mips'),
-            'landuse_retail': landuse_info.get('retail'),
-            'landuse_pdr': landuse_info.get('pdr'),
-            'landuse_visitor': landuse_info.get('visitor'),
-            'landuse_from_st': landuse_info.get('from_st'),
-            'landuse_to_st': landuse_info.get('to_st'),
-            'landuse_street': landuse_info.get('street'),
-            'landuse_st_type': landuse_info.get('st_type'),
-            'landuse_the_geom': landuse_info.get('the_geom'),
-        }
+    building_sqft = parcel_rec.building_sqft or (assessor.property_area if assessor else None) or landuse.get('bldgsqft') or 'Not available'
     property_data = {
         'address': address or (
-            f"{parcel_info.get('from_address_num', '')} {parcel_info.get('street_name', '')} {parcel_info.get('street_type', '')}".strip() 
-            if parcel_info.get('from_address_num') 
-            else parcel_info.get('address', '')
+            f"{parcel_rec.from_address_num or ''} {parcel_rec.street_name or ''} {parcel_rec.street_type or ''}".strip()
+            if parcel_rec.from_address_num
+            else parcel_rec.address or ''
         ),
         'owner': owner,
         'property_type': property_type,
         'year_built': year_built,
         'assessed_value': assessed_value,
-        'lot_size': parcel_info.get('lot_area', landuse_info.get('lotsqft') if landuse_info else 'Not available'),
-        'zoning': parcel_info.get('zoning_district', landuse_info.get('zoning') if landuse_info else 'Not available'),
+        'lot_size': parcel_rec.lot_area if parcel_rec.lot_area is not None else (landuse.get('lotsqft') if landuse_info else 'Not available'),
+        'zoning': parcel_rec.zoning_district if parcel_rec.zoning_district is not None else (landuse.get('zoning') if landuse_info else 'Not available'),
         'rent_controlled': 'Unknown',
         'num_units': num_units,
-        'number_of_bedrooms': (assessor_data.get('number_of_bedrooms') if assessor_data else None) or parcel_info.get('number_of_bedrooms') or 'Not available',
-        'number_of_bathrooms': (assessor_data.get('number_of_bathrooms') if assessor_data else None) or parcel_info.get('number_of_bathrooms') or 'Not available',
-        'number_of_rooms': (assessor_data.get('number_of_rooms') if assessor_data else None) or parcel_info.get('number_of_rooms') or 'Not available',
+        'number_of_bedrooms': (assessor.number_of_bedrooms if assessor else None) or parcel_rec.number_of_bedrooms or 'Not available',
+        'number_of_bathrooms': (assessor.number_of_bathrooms if assessor else None) or parcel_rec.number_of_bathrooms or 'Not available',
+        'number_of_rooms': (assessor.number_of_rooms if assessor else None) or parcel_rec.number_of_rooms or 'Not available',
         'last_sale_date': 'Not available',
         'last_sale_price': 'Not available',
         'building_sqft': building_sqft,
+        'blklot': parcel_rec.blklot,
         'permits': []
     }
-    property_data.update(landuse_fields)
-    property_data.update(assessor_fields)
+    # Aggregate all Land Use fields if available
+    if landuse_info:
+        for output_name, field in LANDUSE_OUTPUT_FIELDS:
+            property_data[output_name] = landuse_info.get(field)
+    # Add more assessor fields as needed
+    if assessor:
+        for output_name, field in ASSESSOR_OUTPUT_FIELDS:
+            property_data[output_name] = format_value(getattr(assessor, field))
     
     # Extract unit number from assessor_location if available
-    if assessor_data and assessor_data.get('property_location'):
-        unit_num = extract_unit_number(assessor_data.get('property_location'))
+    if assessor and assessor.property_location:
+        unit_num = extract_unit_number(assessor.property_location)
         property_data['unit_number'] = f"Unit {unit_num}" if unit_num else None
     else:
         property_data['unit_number'] = None
@@ -929,6 +1077,7 @@ def get_property_details(address=None, parcel=None, debug=False):
     # ============================================================
     # Query SF Rent Board for official rent control status
     # ============================================================
+    profiling.mark('rent_board')
     rent_board_info = get_rent_board_info(address=address, parcel=parcel)
     
     # ============================================================
@@ -936,6 +1085,7 @@ def get_property_details(address=None, parcel=None, debug=False):
     # ============================================================
     rent_board_inventory = get_rent_board_housing_inventory(address=address, parcel=parcel)
     
+    profiling.mark('merge_rent_board')
     # Cross-reference and merge inventory data
     if rent_board_inventory and rent_board_inventory.get('units'):
         property_data['rent_board_inventory'] = rent_board_inventory
@@ -944,35 +1094,30 @@ def get_property_details(address=None, parcel=None, debug=False):
         # Aggregate unit-level data
         if units:
             # Get most recent submission
-            most_recent = units[0]
+            most_recent = RentBoardUnit.from_row(units[0])
             
             # Extract useful data that we don't already have
-            property_data['rent_board_bedroom_count'] = most_recent.get('bedroom_count')
-            property_data['rent_board_bathroom_count'] = most_recent.get('bathroom_count')
-            property_data['rent_board_square_footage'] = most_recent.get('square_footage')
-            property_data['rent_board_monthly_rent'] = most_recent.get('monthly_rent')
-            property_data['rent_board_occupancy_type'] = most_recent.get('occupancy_type')
-            property_data['rent_board_utilities'] = {
-                'water_sewer': most_recent.get('base_rent_includes_water_sewer') == 'Y',
-                'natural_gas': most_recent.get('base_rent_includes_natural_gas') == 'Y',
-                'electricity': most_recent.get('base_rent_includes_electricity') == 'Y',
-                'refuse_recycling': most_recent.get('base_rent_includes_refuse_recycling') == 'Y'
-            }
-            property_data['rent_board_year_built'] = most_recent.get('year_property_built')
-            property_data['rent_board_neighborhood'] = most_recent.get('analysis_neighborhood')
-            property_data['rent_board_supervisor_district'] = most_recent.get('supervisor_district')
+            property_data['rent_board_bedroom_count'] = most_recent.bedroom_count
+            property_data['rent_board_bathroom_count'] = most_recent.bathroom_count
+            property_data['rent_board_square_footage'] = most_recent.square_footage
+            property_data['rent_board_monthly_rent'] = most_recent.monthly_rent
+            property_data['rent_board_occupancy_type'] = most_recent.occupancy_type
+            property_data['rent_board_utilities'] = most_recent.utilities()
+            property_data['rent_board_year_built'] = format_value(most_recent.year_property_built)
+            property_data['rent_board_neighborhood'] = most_recent.analysis_neighborhood
+            property_data['rent_board_supervisor_district'] = most_recent.supervisor_district
             
             # Cross-reference with existing data
             # If we don't have bedrooms/bathrooms, use rent board data
-            if property_data.get('number_of_bedrooms') == 'Not available' and most_recent.get('bedroom_count'):
-                property_data['number_of_bedrooms'] = most_recent.get('bedroom_count')
+            if property_data.get('number_of_bedrooms') == 'Not available' and most_recent.bedroom_count:
+                property_data['number_of_bedrooms'] = most_recent.bedroom_count
             
-            if property_data.get('number_of_bathrooms') == 'Not available' and most_recent.get('bathroom_count'):
-                property_data['number_of_bathrooms'] = most_recent.get('bathroom_count')
+            if property_data.get('number_of_bathrooms') == 'Not available' and most_recent.bathroom_count:
+                property_data['number_of_bathrooms'] = most_recent.bathroom_count
             
             # If we don't have year built, use rent board data
-            if (not year_built or year_built == 'Not available') and most_recent.get('year_property_built'):
-                property_data['year_built'] = most_recent.get('year_property_built')
+            if (not year_built or year_built == 'Not available') and most_recent.year_property_built:
+                property_data['year_built'] = format_value(most_recent.year_property_built)
     
     # Determine rent control status with priority:
     # 1. Official Rent Board data (most authoritative)
@@ -988,45 +1133,54 @@ def get_property_details(address=None, parcel=None, debug=False):
             property_data['rent_controlled'] = 'Yes (Verified by Rent Board)'
         else:
             # Not in rent board registry - use year built heuristic
-            year_built_val = parcel_info.get('year_property_built')
-            if year_built_val and str(year_built_val).isdigit():
-                if int(year_built_val) < 1979:
-                    property_data['rent_controlled'] = 'Likely Yes (Built before 1979)'
-                else:
-                    property_data['rent_controlled'] = 'Likely No (Built after 1979)'
-            else:
-                property_data['rent_controlled'] = 'Unknown'
+            property_data['rent_controlled'] = rent_control_from_year_built(parcel_info.get('year_property_built'))
     else:
         # Rent board query failed - fallback to year built
-        year_built_val = parcel_info.get('year_property_built')
-        if year_built_val and str(year_built_val).isdigit():
-            if int(year_built_val) < 1979:
-                property_data['rent_controlled'] = 'Likely Yes (Built before 1979)'
-            else:
-                property_data['rent_controlled'] = 'Likely No (Built after 1979)'
-        else:
-            property_data['rent_controlled'] = 'Unknown'
+        property_data['rent_controlled'] = rent_control_from_year_built(parcel_info.get('year_property_built'))
+
+    # Prop 13 land reassessment jumps in the local tax roll history
+    history = taxhistory.get_store()
+    if history is not None and parcel_info.get('blklot'):
+        property_data['likely_last_sale_year'] = history.sale_year(parcel_info['blklot'])
+
+    # Everything else the owner holds, from the offline owner portfolio index
+    portfolio = get_owner_portfolio(blklot=parcel_info.get('blklot'), owner=owner)
+    if portfolio:
+        property_data['owner_portfolio'] = portfolio
     
     # ============================================================
     # NEW: Query eviction history
     # ============================================================
-    eviction_history = get_eviction_history(address=address, parcel=parcel)
+    profiling.mark('evictions_complaints_buyouts')
+    eviction_history = get_eviction_history(address=address or property_data['address'], parcel=parcel, blklot=parcel_info.get('blklot'))
     property_data['eviction_history'] = eviction_history
-    property_data['eviction_count'] = len(eviction_history)
+    eviction_total = get_record_total('evictions', address=address or property_data['address'], blklot=parcel_info.get('blklot'))
+    property_data['eviction_count'] = eviction_total if eviction_total is not None else len(eviction_history)
     
     # ============================================================
     # NEW: Query housing complaints
     # ============================================================
-    housing_complaints = get_housing_complaints(address=address, parcel=parcel)
+    housing_complaints = get_housing_complaints(address=address or property_data['address'], parcel=parcel, blklot=parcel_info.get('blklot'))
     property_data['housing_complaints'] = housing_complaints
-    property_data['complaint_count'] = len(housing_complaints)
+    complaint_total = get_record_total('complaints', address=address or property_data['address'], blklot=parcel_info.get('blklot'))
+    property_data['complaint_count'] = complaint_total if complaint_total is not None else len(housing_complaints)
     
     # ============================================================
     # NEW: Query buyout agreements
     # ============================================================
-    buyout_agreements = get_buyout_agreements(address=address, parcel=parcel)
+    buyout_agreements = get_buyout_agreements(address=address or property_data['address'], parcel=parcel, blklot=parcel_info.get('blklot'))
     property_data['buyout_agreements'] = buyout_agreements
-    property_data['buyout_count'] = len(buyout_agreements)
+    buyout_total = get_record_total('buyouts', address=address or property_data['address'], blklot=parcel_info.get('blklot'))
+    property_data['buyout_count'] = buyout_total if buyout_total is not None else len(buyout_agreements)
+    # Block-level records can't be pinned to this building, so they're counted apart
+    # from it; with only those, the histories show them and its own count is unknown, not 0
+    linked = get_linked_records(address=address or property_data['address'], blklot=parcel_info.get('blklot'))
+    if linked is not None:
+        property_data['block_record_counts'] = linked['block_counts']
+        for kind, field in (('evictions', 'eviction_count'), ('complaints', 'complaint_count'),
+                            ('buyouts', 'buyout_count')):
+            if not linked['counts'][kind] and linked['block_counts'][kind]:
+                property_data[field] = None
     
     if debug:
         debug_info['landuse_raw'] = landuse_info if landuse_info is not None else 'No Land Use data returned'
@@ -1035,8 +1189,9 @@ def get_property_details(address=None, parcel=None, debug=False):
         debug_info['eviction_raw'] = eviction_history if eviction_history else 'No eviction data returned'
         debug_info['complaints_raw'] = housing_complaints if housing_complaints else 'No complaint data returned'
         debug_info['_spacer'] = '\n\n=== RENT BOARD HOUSING INVENTORY ===\n'
-        debug_info['rent_board_inventory_raw'] = rent_board_inventory if rent_board_inventory else 'No Rent Board Housing Inventory data returned'
+        debug_info['rent_board_inventory_raw'] = property_data.get('rent_board_inventory') or 'No Rent Board Housing Inventory data returned'
         property_data['debug'] = debug_info
+    profiling.end_marks()
     return property_data
 
 @app.route('/api/search', methods=['POST'])
@@ -1063,6 +1218,9 @@ def search_property():
                 extracted_address = extract_address_from_url(url)
                 if extracted_address:
                     address = extracted_address
+                else:
+                    # No address in the URL; try the listing's map coordinates
+                    parcel = parcel_from_coordinates(listing_amenities)
 
         if not address and not parcel:
             if listing_amenities:
@@ -1073,7 +1231,7 @@ def search_property():
             return jsonify({'error': 'Please provide an address or parcel/lot'}), 400
 
         # Log what we're searching with
-        print(f"Searching with - Address: {address}, Parcel: {parcel}")
+        log.info("Search", extra={'address': address, 'parcel': parcel})
 
         # Get property details - parcel takes priority if provided
         property_details = get_property_details(address=address, parcel=parcel, debug=debug)
@@ -1086,6 +1244,8 @@ def search_property():
                 }), 200
             return jsonify({'warning': property_details['error'], 'data': {}}), 200
         
+        record_search(property_details.get('blklot'))
+
         # Merge listing amenities into property details
         if listing_amenities:
             property_details['listing_amenities'] = listing_amenities
@@ -1097,9 +1257,116 @@ def search_property():
         
         return jsonify(property_details), 200
     except Exception as e:
-        print(f"/api/search error: {e}")
+        log.exception("/api/search error: %s", e)
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
+def client_key():
+    """Identify the caller for per-client limits (the address Render's proxy saw)"""
+    # The proxy appends the peer address; earlier hops are client-supplied
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    return forwarded.split(',')[-1].strip() or request.remote_addr or 'unknown'
+
+def _prefetch_search(job, url, address, parcel, debug):
+    """Run the cacheable parts of /api/search for the same inputs"""
+    amenities = {}
+    if url and 'craigslist' in url.lower():
+        job.checkpoint('listing')
+        amenities = parse_craigslist_listing(url)
+    if url and not address and not parcel:
+        address = extract_address_from_url(url) or ''
+        if not address:
+            parcel = parcel_from_coordinates(amenities)
+    if not address and not parcel:
+        return
+    job.checkpoint('parcel')
+    get_parcel_info(address=address, parcel=parcel, debug=debug)
+    job.checkpoint('datasets')
+    get_property_details(address=address, parcel=parcel, debug=debug)
+
+@app.route('/api/prefetch', methods=['POST'])
+def prefetch_search():
+    """
+    Start warming caches for a search the client is about to run. Takes the
+    same url/address/parcel/debug fields as /api/search plus a client_id;
+    {"client_id": ..., "cancel": true} cancels the client's prefetches.
+    """
+    try:
+        data = request.json or {}
+        # The cap is per caller; client_id (one per tab) only scopes supersede and cancel
+        client, session = client_key(), str(data.get('client_id', ''))
+        if data.get('cancel'):
+            return jsonify({'cancelled': prefetch.cancel(client, session)}), 200
+
+        url = data.get('url', '')
+        address = data.get('address', '')
+        parcel = data.get('parcel', '')
+        debug = bool(data.get('debug'))
+        if not url and not address and not parcel:
+            return jsonify({'error': 'Please provide a listing URL, address or parcel/lot'}), 400
+
+        job = prefetch.submit(
+            client,
+            session,
+            (url, address, parcel, debug),
+            lambda job: _prefetch_search(job, url, address, parcel, debug)
+        )
+        if job is None:
+            return jsonify({'error': 'Too many prefetches in flight'}), 429
+        return jsonify({'status': 'accepted', 'id': job.id}), 202
+    except Exception as e:
+        log.exception("/api/prefetch error: %s", e)
+        return jsonify({'error': 'Failed to start prefetch', 'details': str(e)}), 500
+
+# Job endpoints require this token in X-Admin-Token; unset disables them
+JOBS_ADMIN_TOKEN = os.environ.get('JOBS_ADMIN_TOKEN', '')
+
+def jobs_authorized():
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(JOBS_ADMIN_TOKEN) and hmac.compare_digest(token, JOBS_ADMIN_TOKEN)
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queue a background job ({"kind": ..., "params": {...}}); returns immediately"""
+    if not jobs_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        data = request.json or {}
+        job_id = jobs.enqueue(data.get('kind', ''), data.get('params') or {})
+        return jsonify(jobs.get_job(job_id)), 202
+    except ValueError as e:
+        return jsonify({'error': 'Invalid job', 'details': str(e)}), 400
+    except Exception as e:
+        log.exception("/api/jobs error: %s", e)
+        return jsonify({'error': 'Failed to queue job', 'details': str(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Recent jobs, optionally filtered by ?status="""
+    if not jobs_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    limit = min(int(request.args.get('limit', 50)), 500)
+    return jsonify({'jobs': jobs.list_jobs(request.args.get('status'), limit), 'counts': jobs.stats()}), 200
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress and result of one job"""
+    if not jobs_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job, or stop a running one at its next progress report"""
+    if not jobs_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    job = jobs.cancel_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
 @app.route('/api/parse-listing', methods=['POST'])
 def parse_listing():
     """Parse a Craigslist listing URL for amenities"""
@@ -1116,36 +1383,326 @@ def parse_listing():
         amenities = parse_craigslist_listing(url)
         return jsonify(amenities), 200
     except Exception as e:
-        print(f"/api/parse-listing error: {e}")
+        log.exception("/api/parse-listing error: %s", e)
         return jsonify({'error': 'Failed to parse listing', 'details': str(e)}), 500
 
+def fetch_taxroll_history(blklot):
+    """Full roll history for one parcel from DataSF, for when the local store isn't built"""
+    url = "https://data.sfgov.org/resource/wv5m-vpq2.json"
+    params = {'parcel_number': blklot, '$order': 'closed_roll_year ASC', '$limit': 200}
+    response = soql_get(url, params, select=['closed_roll_year'] + list(taxhistory.VALUE_COLUMNS))
+    rows = response.json() if response.status_code == 200 else []
+    return taxhistory.summarize_rows(blklot, rows)
+
+@app.route('/api/parcels/<path:parcel>/history', methods=['GET'])
+def parcel_history(parcel):
+    """Assessed land/fixture/improvement values by roll year, growth and likely last sale"""
+    try:
+        block, _, lot = parcel.partition('/')
+        blklot = f"{block.zfill(4)}{lot.zfill(3)}" if lot else parcel.upper()
+        store = taxhistory.get_store()
+        if store is not None:
+            result = store.history(blklot)
+            source = 'local'
+        else:
+            result = fetch_taxroll_history(blklot)
+            source = 'datasf'
+        if result is None:
+            return jsonify({'error': 'Parcel not found on the tax roll', 'blklot': blklot}), 404
+        result['source'] = source
+        return jsonify(result), 200
+    except Exception as e:
+        log.exception("/api/parcels/history error: %s", e)
+        return jsonify({'error': 'Failed to load tax roll history', 'details': str(e)}), 500
+
+@app.route('/api/owners/<owner_id>', methods=['GET'])
+def owner_portfolio(owner_id):
+    """Every parcel held by an owner, with unit and eviction/complaint/buyout rollups"""
+    try:
+        if indexes.get_index(owners.PORTFOLIO_INDEX) is None:
+            return jsonify({'error': 'Owner index not built',
+                            'details': 'run `python owners.py build` or the build_owners job'}), 503
+        entry = owners.lookup(owner_id.lower())
+        if entry is None:
+            # Accept a raw owner name as well as an id
+            entry = owners.lookup(owners.owner_id(owner_id) or '')
+        if entry is None:
+            return jsonify({'error': 'Owner not found', 'owner_id': owner_id}), 404
+        return jsonify(entry), 200
+    except Exception as e:
+        log.exception("/api/owners error: %s", e)
+        return jsonify({'error': 'Failed to load owner portfolio', 'details': str(e)}), 500
+
+@app.route('/api/comparables', methods=['GET'])
+def rent_comparables():
+    """
+    The ?k most comparable Rent Board inventory units citywide to ?bedrooms,
+    ?bathrooms, ?sqft, ?year_built and ?submission_year, preferring ?neighborhood
+    """
+    try:
+        index = comparables.get_index()
+        if index is None:
+            return jsonify({'error': 'Comparables index not built',
+                            'details': 'run `python comparables.py build` or the build_comparables job'}), 503
+        query = {}
+        for name in comparables.FEATURES:
+            value = request.args.get(name)
+            if value:
+                query[name] = float(value)
+        if not query:
+            return jsonify({'error': f"Give at least one of {', '.join(comparables.FEATURES)}"}), 400
+        k = max(1, min(int(request.args.get('k', comparables.DEFAULT_K)), comparables.MAX_K))
+        result = index.nearest(query, k, request.args.get('neighborhood'))
+        result['query'] = query
+        result['rent_summary'] = comparables.rent_summary(result['comparables'])
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({'error': 'Invalid query value', 'details': str(e)}), 400
+    except Exception as e:
+        log.exception("/api/comparables error: %s", e)
+        return jsonify({'error': 'Failed to find comparable units', 'details': str(e)}), 500
+
+@app.route('/api/images', methods=['GET'])
+def listing_image():
+    """Listing photo ?url resized to ?w pixels wide, served from the local image cache"""
+    url = request.args.get('url', '')
+    if not imageproxy.allowed(url):
+        return jsonify({'error': 'Only listing image URLs can be proxied'}), 400
+    try:
+        width = int(request.args.get('w', 600))
+    except ValueError:
+        return jsonify({'error': 'w must be a number of pixels'}), 400
+    try:
+        etag, data, mimetype = imageproxy.thumbnail(url, width)
+    except imageproxy.ImageError as e:
+        return jsonify({'error': 'Failed to fetch image', 'details': str(e)}), 502
+    except Exception as e:
+        log.exception("/api/images error: %s", e)
+        return jsonify({'error': 'Failed to load image', 'details': str(e)}), 500
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = imageproxy.CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+def _pin_request():
+    """(property_id, image URLs) from a pin/unpin body, or raise ValueError"""
+    data = request.get_json(silent=True) or {}
+    property_id, urls = data.get('property_id'), data.get('urls')
+    if not isinstance(property_id, int) or not isinstance(urls, list):
+        raise ValueError('property_id (integer) and urls (list) are required')
+    urls = [url for url in urls if isinstance(url, str) and imageproxy.allowed(url)]
+    if len(urls) > imageproxy.MAX_PINNED_IMAGES:
+        raise ValueError(f"at most {imageproxy.MAX_PINNED_IMAGES} images per property")
+    return property_id, urls
+
+@app.route('/api/images/pin', methods=['POST'])
+def pin_images():
+    """Keep a saved property's listing photos cached for good (fetched in the background)"""
+    try:
+        property_id, urls = _pin_request()
+    except ValueError as e:
+        return jsonify({'error': 'Invalid pin request', 'details': str(e)}), 400
+    pin_listing_images(urls, property_id)
+    return jsonify({'pinned': len(urls)}), 202
+
+@app.route('/api/images/unpin', methods=['POST'])
+def unpin_images():
+    """Release a deleted property's photos so they can be evicted"""
+    try:
+        property_id, urls = _pin_request()
+        imageproxy.unpin(urls, property_id)
+        return jsonify({'unpinned': len(urls)}), 200
+    except ValueError as e:
+        return jsonify({'error': 'Invalid unpin request', 'details': str(e)}), 400
+    except Exception as e:
+        log.exception("/api/images/unpin error: %s", e)
+        return jsonify({'error': 'Failed to unpin images', 'details': str(e)}), 500
+
+@app.route('/api/listings', methods=['GET'])
+def search_listings():
+    """Filter crawled listings by price, bedrooms, amenities and rent-control status"""
+    try:
+        limit = min(int(request.args.get('limit', 100)), 500)
+        results = listings.query_listings(request.args, limit=limit)
+        return jsonify({'count': len(results), 'listings': results}), 200
+    except ValueError as e:
+        return jsonify({'error': 'Invalid filter value', 'details': str(e)}), 400
+    except Exception as e:
+        log.exception("/api/listings error: %s", e)
+        return jsonify({'error': 'Failed to query listings', 'details': str(e)}), 500
+
 @app.route('/api/properties', methods=['GET'])
 def get_properties():
     """Get all saved properties"""
-    return jsonify(saved_properties), 200
+    ensure_properties_loaded()
+    return jsonify([snapshots.hydrate(p) for p in saved_properties]), 200
+
+@app.route('/api/properties/export', methods=['GET'])
+def export_properties():
+    """
+    Stream saved properties as ?format=ndjson|csv|parquet, optionally
+    limited to ?fields=a,b,c ('all' for every field in NDJSON)
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(export.FORMATS)}"}), 400
+    fields = export.parse_fields(request.args.get('fields', ''), fmt)
+    if fields is None and fmt != 'ndjson':
+        return jsonify({'error': f"{fmt} export needs an explicit field list"}), 400
+    ensure_properties_loaded()
+    with _properties_lock:
+        entries = list(saved_properties)
+    headers = {'Content-Disposition': f'attachment; filename="saved_properties.{fmt}"'}
+
+    if fmt == 'parquet':
+        if not export.parquet_available():
+            return jsonify({'error': 'Parquet export needs pyarrow installed'}), 501
+        chunks = export.parquet_chunks(entries, fields)
+    elif fmt == 'csv':
+        chunks = export.csv_chunks(entries, fields)
+    else:
+        chunks = export.ndjson_chunks(entries, fields)
+    return Response(stream_with_context(chunks), mimetype=export.MIMETYPES[fmt], headers=headers)
+
+def listing_images(entry):
+    """Photo URLs of a saved entry's listing and its reposts"""
+    urls = list((entry.get('listing_amenities') or {}).get('listing_images') or [])
+    for repost in entry.get('reposts', []):
+        urls.extend(repost.get('listing_images') or [])
+    return urls
+
+def pin_listing_images(urls, property_id):
+    """Cache a saved listing's photos in the background so they outlive the listing"""
+    if urls:
+        threading.Thread(target=imageproxy.pin, args=(list(urls), property_id), name='image-pin',
+                         daemon=True).start()
 
 @app.route('/api/properties', methods=['POST'])
 def save_property():
     """Save a property to the list"""
     global property_counter
+    ensure_properties_loaded()
     data = request.json
-    data['id'] = property_counter
-    data['saved_date'] = datetime.now().isoformat()
-    saved_properties.append(data)
-    property_counter += 1
-    save_properties_to_file()
+    url = data.get('listing_url')
+    # Requests run on threads (gthread workers), so serialize store updates
+    with _properties_lock:
+        # A repost of a listing that's already saved is attached to that entry
+        matches = flag_reposts(url, data.get('listing_amenities') or {}) if url else []
+        saved_ids = {m['property_id'] for m in matches if m.get('property_id') is not None}
+        existing = next((p for p in saved_properties if p.get('id') in saved_ids), None)
+        if existing is not None and existing.get('listing_url') != url:
+            amenities = data.get('listing_amenities') or {}
+            known = {r.get('listing_url') for r in existing.get('reposts', [])}
+            if url not in known:
+                existing.setdefault('reposts', []).append({
+                    'listing_url': url,
+                    'listing_title': amenities.get('listing_title'),
+                    'listing_price': amenities.get('listing_price'),
+                    'listing_images': amenities.get('listing_images') or [],
+                    'seen_at': datetime.now().isoformat(),
+                })
+                save_properties_to_file()
+            reposts.attach(url, existing['id'])
+            pin_listing_images(listing_images(data), existing['id'])
+            return jsonify(dict(snapshots.hydrate(existing), repost_of=existing['id'])), 200
+        # Only the user fields are kept per save; the parcel data is shared
+        entry = snapshots.dehydrate(data)
+        entry['id'] = data['id'] = property_counter
+        entry['saved_date'] = data['saved_date'] = datetime.now().isoformat()
+        saved_properties.append(entry)
+        property_counter += 1
+        save_properties_to_file()
+        if url:
+            reposts.attach(url, entry['id'])
+    pin_listing_images(listing_images(entry), entry['id'])
     return jsonify(data), 201
 
+@app.route('/api/properties/listing-status', methods=['POST'])
+def listing_status():
+    """
+    Check whether saved listings are still live, all in one response.
+    Body: {"listings": [{"id": ..., "url": ...}]}; defaults to the server-side saved properties.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        listings = data.get('listings')
+        if listings is None:
+            ensure_properties_loaded()
+            listings = [{'id': p.get('id'), 'url': p.get('listing_url')} for p in saved_properties]
+        listings = [l for l in listings if isinstance(l, dict) and l.get('url')]
+
+        import linkcheck
+        results = linkcheck.check_links([l['url'] for l in listings])
+        statuses = {}
+        for listing in listings:
+            result = results.get(listing['url'])
+            if result:
+                statuses[str(listing.get('id'))] = dict(result, url=listing['url'])
+        return jsonify({'statuses': statuses}), 200
+    except Exception as e:
+        log.exception("/api/properties/listing-status error: %s", e)
+        return jsonify({'error': 'Failed to check listings', 'details': str(e)}), 500
+
 @app.route('/api/properties/<int:property_id>', methods=['DELETE'])
 def delete_property(property_id):
     """Delete a saved property"""
     global saved_properties
+    ensure_properties_loaded()
     
-    saved_properties = [p for p in saved_properties if p.get('id') != property_id]
-    save_properties_to_file()
+    with _properties_lock:
+        removed = [p for p in saved_properties if p.get('id') == property_id]
+        saved_properties = [p for p in saved_properties if p.get('id') != property_id]
+        save_properties_to_file()
+        referenced = {p.get(snapshots.SNAPSHOT_KEY) for p in saved_properties}
+        for entry in removed:
+            digest = entry.get(snapshots.SNAPSHOT_KEY)
+            if digest and digest not in referenced:
+                snapshots.discard(digest)
+        if removed:
+            try:
+                reposts.detach(property_id)
+            except Exception as e:
+                log.warning("Repost index update error: %s", e)
+            for entry in removed:
+                imageproxy.unpin(listing_images(entry), entry['id'])
     
     return jsonify({'message': 'Property deleted'}), 200
 
+@app.route('/api/reposts', methods=['POST'])
+def check_repost():
+    """
+    Fingerprint a listing the client is saving and tell it which of its saved
+    listings this reposts. Body: {"listing_url", "listing_amenities",
+    "property_id", "saved": {listing_url: saved property id}}. The listing is
+    attached to the saved property it reposts, else to property_id.
+    """
+    data = request.get_json(silent=True) or {}
+    url = data.get('listing_url')
+    property_id = data.get('property_id')
+    if not url or not isinstance(property_id, int):
+        return jsonify({'error': 'listing_url and an integer property_id are required'}), 400
+    saved = data.get('saved') or {}
+    try:
+        matches = reposts.record(url, data.get('listing_amenities') or {})
+        repost_of = next((saved[m['listing_url']] for m in matches if m['listing_url'] in saved), None)
+        reposts.attach(url, repost_of if isinstance(repost_of, int) else property_id)
+        return jsonify({'repost_of': repost_of, 'matches': matches}), 200
+    except Exception as e:
+        log.exception("/api/reposts error: %s", e)
+        return jsonify({'error': 'Failed to check for reposts', 'details': str(e)}), 500
+
+@app.route('/api/reposts/<int:property_id>', methods=['DELETE'])
+def detach_reposts(property_id):
+    """Forget the listings attached to a saved property the client deleted"""
+    try:
+        reposts.detach(property_id)
+        return jsonify({'message': 'Listings detached'}), 200
+    except Exception as e:
+        log.exception("/api/reposts delete error: %s", e)
+        return jsonify({'error': 'Failed to detach listings', 'details': str(e)}), 500
+
 @app.route('/', methods=['GET'])
 def root():
     """Root endpoint - API info"""
@@ -1155,16 +1712,223 @@ def root():
         'status': 'running',
         'endpoints': {
             'search': '/api/search',
+            'prefetch': '/api/prefetch',
+            'jobs': '/api/jobs',
             'properties': '/api/properties',
+            'listing_status': '/api/properties/listing-status',
+            'export': '/api/properties/export',
+            'parcel_history': '/api/parcels/<blklot>/history',
+            'comparables': '/api/comparables',
+            'owners': '/api/owners/<owner_id>',
             'parse_listing': '/api/parse-listing',
-            'health': '/health'
+            'listings': '/api/listings',
+            'reposts': '/api/reposts',
+            'images': '/api/images',
+            'image_pins': '/api/images/pin',
+            'upstream_stats': '/api/upstream/stats',
+            'health': '/health',
+            'ready': '/ready'
         }
     }), 200
 
+@app.route('/api/upstream/stats', methods=['GET'])
+def upstream_stats():
+    """Per-source upstream latency percentiles, adaptive timeouts and hedging counters"""
+    return jsonify(dict(upstream.stats(), listing_parser=listing_parser.stats(), prefetch=prefetch.stats(),
+                        images=imageproxy.stats())), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy'}), 200
+    """Liveness check - the process is up and serving requests"""
+    return jsonify({'status': 'healthy', 'startup': startup_report(), 'admission': admission.stats(), 'logging': logs.stats()}), 200
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness check - saved properties and indexes are loaded"""
+    start_warmup()
+    if not _ready.is_set():
+        return jsonify({'status': 'warming', 'startup': startup_report()}), 503
+    return jsonify({'status': 'ready', 'startup': startup_report()}), 200
+
+# ============================================================
+# STARTUP WARM-UP AND READINESS
+# ============================================================
+
+POPULAR_PARCELS_FILE = os.path.join(indexes.DATA_DIR, 'popular_parcels.json')
+WARMUP_PARCELS = int(os.environ.get('WARMUP_PARCELS', '20'))
+POPULAR_FLUSH_SECONDS = 30
+
+_ready = threading.Event()
+_warmup_started = False
+_warmup_lock = threading.Lock()
+_startup_timings = {'import_seconds': None, 'ready_seconds': None, 'primed_seconds': None, 'primed_parcels': 0}
+_search_counts = {}
+_search_counts_lock = threading.Lock()
+_last_popular_flush = time.monotonic()
+
+def startup_report():
+    """Cold-start timings for this worker (seconds since app import began)"""
+    report = dict(_startup_timings)
+    report['uptime_seconds'] = round(time.monotonic() - _IMPORT_STARTED, 3)
+    report['indexes'] = sorted(indexes.index_info())
+    return report
+
+def load_popular_parcels():
+    """Return {parcel: search_count} recorded across restarts"""
+    try:
+        with open(POPULAR_PARCELS_FILE, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def flush_popular_parcels():
+    """Merge this worker's search counts into the popular parcels file"""
+    global _last_popular_flush
+    with _search_counts_lock:
+        counts = dict(_search_counts)
+        _search_counts.clear()
+        _last_popular_flush = time.monotonic()
+    if not counts:
+        return
+    try:
+        merged = load_popular_parcels()
+        for parcel, count in counts.items():
+            merged[parcel] = merged.get(parcel, 0) + count
+        os.makedirs(os.path.dirname(POPULAR_PARCELS_FILE), exist_ok=True)
+        tmp_path = f"{POPULAR_PARCELS_FILE}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(merged, f)
+        os.replace(tmp_path, POPULAR_PARCELS_FILE)
+    except Exception as e:
+        log.warning("Error saving popular parcels: %s", e)
+
+def record_search(blklot):
+    """Count a successful search so warm-up can prime the most searched parcels"""
+    if not blklot or len(blklot) < 5:
+        return
+    parcel = f"{blklot[:4]}/{blklot[4:]}"
+    with _search_counts_lock:
+        _search_counts[parcel] = _search_counts.get(parcel, 0) + 1
+    if time.monotonic() - _last_popular_flush > POPULAR_FLUSH_SECONDS:
+        flush_popular_parcels()
+
+def _warm_up():
+    """Load what readiness depends on, then prime caches for popular parcels"""
+    try:
+        ensure_properties_loaded()
+        for name in indexes.BUILDERS:
+            indexes.get_index(name)
+        geoindex.get_index()
+        taxhistory.get_store()
+        comparables.get_index()
+        # Pay for the heavy parser imports here instead of on the first listing
+        import bs4
+        import lxml.etree
+    except Exception as e:
+        log.warning("Warm-up error: %s", e)
+    _startup_timings['ready_seconds'] = round(time.monotonic() - _IMPORT_STARTED, 3)
+    _ready.set()
+    log.info("Worker ready", extra={'ready_seconds': _startup_timings['ready_seconds'],
+                                    'import_seconds': _startup_timings['import_seconds']})
+
+    popular = sorted(load_popular_parcels().items(), key=lambda item: item[1], reverse=True)
+    for parcel, _ in popular[:WARMUP_PARCELS]:
+        try:
+            get_property_details(parcel=parcel)
+            _startup_timings['primed_parcels'] += 1
+        except Exception as e:
+            log.warning("Warm-up priming error: %s", e, extra={'parcel': parcel})
+    _startup_timings['primed_seconds'] = round(time.monotonic() - _IMPORT_STARTED, 3)
+
+def start_warmup():
+    """Start the background warm-up once per process"""
+    global _warmup_started
+    if _warmup_started:
+        return
+    with _warmup_lock:
+        if not _warmup_started:
+            _warmup_started = True
+            threading.Thread(target=_warm_up, name='warmup', daemon=True).start()
+
+@app.before_request
+def _ensure_warmup():
+    # Covers servers that don't call start_warmup() from a post-fork hook
+    start_warmup()
+
+# ============================================================
+# ADMISSION CONTROL
+# ============================================================
+
+@app.before_request
+def _admit_request():
+    """Rate-limit per client and shed load before the request does any work"""
+    if request.method == 'OPTIONS' or admission.exempt(request.path):
+        return None
+    try:
+        if admission.is_image(request.method, request.path):
+            g.admission_ticket = admission.admit_image(client_key())
+        else:
+            g.admission_ticket = admission.admit(client_key())
+    except admission.Rejected as e:
+        if e.status == 429:
+            body = {'error': 'Too many requests', 'details': e.reason}
+        else:
+            body = {'error': 'Server is busy, try again shortly', 'details': e.reason}
+        response = jsonify(body)
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, e.status
+    return None
+
+@app.teardown_request
+def _release_request(exc):
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        admission.release(ticket)
+
+# ============================================================
+# REQUEST PROFILING (opt-in, see profiling.py)
+# ============================================================
+
+def _profile_token():
+    return request.headers.get('X-Profile-Token') or request.args.get('profile')
+
+if profiling.ENABLED:
+    @app.before_request
+    def _start_profile():
+        reason = profiling.should_profile(_profile_token())
+        if reason and not request.path.startswith('/admin/'):
+            profiling.start(request.method, request.path, reason)
+
+    @app.after_request
+    def _profile_header(response):
+        profile = profiling.current()
+        if profile is not None:
+            response.headers['X-Profile-Id'] = str(profile.id)
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        profiling.finish(getattr(g, 'response_status', None) or (500 if exc else None))
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_request_profiles():
+    """Recent request profiles, newest first (admin token required)"""
+    if not profiling.is_admin(_profile_token()):
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({'profiles': profiling.list_profiles()}), 200
+
+@app.route('/admin/profiles/<int:profile_id>', methods=['GET'])
+def get_request_profile(profile_id):
+    """One request profile: phase timings and cProfile summary (admin token required)"""
+    if not profiling.is_admin(_profile_token()):
+        return jsonify({'error': 'Not found'}), 404
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify(profile), 200
+
+_startup_timings['import_seconds'] = round(time.monotonic() - _IMPORT_STARTED, 3)
 
 if __name__ == '__main__':
+    start_warmup()
     app.run(debug=True, port=5000)
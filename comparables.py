@@ -0,0 +1,318 @@
+"""
+Comparable rental units citywide: K nearest neighbours over the Rent Board
+housing inventory (gdc7-dmcn).
+
+Every inventory unit with a reported rent becomes a point of scaled numeric
+features (bedrooms, bathrooms, square footage, year built, submission year;
+SCALES says how much of each counts as one unit of distance). Points are
+built offline into a file that workers memory-map read-only. The file holds
+one implicit KD-tree per neighborhood plus a citywide one. An implicit tree
+is a balanced median layout with no child pointers: the node for range
+[lo, hi) is the median (lo + hi) // 2, it splits on dimension depth % D, and
+its children are [lo, mid) and [mid + 1, hi). A query searches the
+neighborhood tree first and fills up from the citywide tree if that
+neighborhood has fewer than K units. Features the query leaves out are
+ignored.
+
+File layout (little-endian):
+    header      b'SFCU' | version u32 | points u32 | neighborhoods u32
+    nbhd_ranges neighborhoods x (start u32, end u32) into the point array
+    nbhd_offs   (neighborhoods + 1) x u32 into the name blob
+    name blob   UTF-8 neighborhood names
+    features    points x DIMS f32, scaled, each neighborhood's range one tree
+    city_tree   points x u32 point numbers, laid out as the citywide tree
+    unit_offs   (points + 1) x u32 into the unit blob
+    unit blob   compact JSON per point (address block, unit details, rent)
+
+Usage:
+    python comparables.py build
+    python comparables.py query '{"bedrooms": 2, "sqft": 900, "neighborhood": "Mission"}'
+"""
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+
+import logs
+from indexes import INDEX_DIR, get_mapped, iter_dataset_rows
+
+log = logs.get_logger('comparables')
+
+COMPARABLES_PATH = os.path.join(INDEX_DIR, 'rent_comparables.bin')
+# Query feature -> how much of it counts as one unit of distance
+FEATURES = ('bedrooms', 'bathrooms', 'sqft', 'year_built', 'submission_year')
+SCALES = (1.0, 1.0, 250.0, 20.0, 2.0)
+DIMS = len(FEATURES)
+DEFAULT_K = 10
+MAX_K = 100
+
+MAGIC = b'SFCU'
+VERSION = 1
+HEADER = struct.Struct('<4sIII')
+NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
+
+def parse_measure(text):
+    """'2', '1.5', '750-1000 Sq.Ft', '$2,001-$2,250', 'Studio' -> number (range midpoint) or None"""
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+    text = str(text).replace(',', '')
+    numbers = [float(n) for n in NUMBER_RE.findall(text)]
+    if not numbers:
+        return 0.0 if 'studio' in text.lower() else None
+    if len(numbers) >= 2 and '-' in text:
+        return (numbers[0] + numbers[1]) / 2
+    return numbers[0]
+
+
+def unit_features(row):
+    """Unscaled feature values for an inventory row (None where unknown)"""
+    return (
+        parse_measure(row.get('bedroom_count')),
+        parse_measure(row.get('bathroom_count')),
+        parse_measure(row.get('square_footage')),
+        parse_measure(row.get('year_property_built')),
+        parse_measure(row.get('submission_year')),
+    )
+
+
+def _median(values):
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] if values else 0.0
+
+
+def _layout(points, lo, hi, depth, out):
+    """Append `points[lo:hi]` to `out` in implicit KD-tree order"""
+    if lo >= hi:
+        return
+    dim = depth % DIMS
+    segment = sorted(points[lo:hi], key=lambda p: p[0][dim])
+    mid = (hi - lo) // 2
+    left, node, right = segment[:mid], segment[mid], segment[mid + 1:]
+    # Write the subtrees around the node so [lo, hi) keeps the median layout
+    placed = []
+    _layout(left, 0, len(left), depth + 1, placed)
+    placed.append(node)
+    _layout(right, 0, len(right), depth + 1, placed)
+    out.extend(placed)
+
+
+def write_comparables(path, rows):
+    """Build the per-neighborhood and citywide trees from inventory rows; returns the point count"""
+    units = []
+    for row in rows:
+        rent = parse_measure(row.get('monthly_rent'))
+        if not rent:
+            continue
+        units.append((unit_features(row), row))
+    medians = [_median(u[0][d] for u in units) for d in range(DIMS)]
+
+    by_neighborhood = {}
+    for raw, row in units:
+        scaled = tuple((medians[d] if raw[d] is None else raw[d]) / SCALES[d] for d in range(DIMS))
+        payload = {
+            'block_address': row.get('block_address'),
+            'neighborhood': row.get('analysis_neighborhood'),
+            'bedrooms': row.get('bedroom_count'),
+            'bathrooms': row.get('bathroom_count'),
+            'square_footage': row.get('square_footage'),
+            'year_built': row.get('year_property_built'),
+            'submission_year': row.get('submission_year'),
+            'monthly_rent': row.get('monthly_rent'),
+            'monthly_rent_estimate': parse_measure(row.get('monthly_rent')),
+            'occupancy_type': row.get('occupancy_type'),
+        }
+        neighborhood = (row.get('analysis_neighborhood') or '').strip()
+        by_neighborhood.setdefault(neighborhood, []).append((scaled, payload))
+
+    ordered, ranges, names = [], [], sorted(by_neighborhood)
+    for name in names:
+        start = len(ordered)
+        points = by_neighborhood[name]
+        _layout(points, 0, len(points), 0, ordered)
+        ranges.append((start, len(ordered)))
+    numbered = [(point[0], number) for number, point in enumerate(ordered)]
+    city = []
+    _layout(numbered, 0, len(numbered), 0, city)
+
+    name_offs, name_blob = [0], b''
+    for name in names:
+        name_blob += name.encode('utf-8')
+        name_offs.append(len(name_blob))
+    unit_offs, unit_blob = array('I', [0]), bytearray()
+    for _, payload in ordered:
+        unit_blob += json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        unit_offs.append(len(unit_blob))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(ordered), len(names)))
+        f.write(struct.pack(f'<{2 * len(ranges)}I', *(v for r in ranges for v in r)))
+        f.write(struct.pack(f'<{len(name_offs)}I', *name_offs))
+        f.write(name_blob)
+        array('f', (v for scaled, _ in ordered for v in scaled)).tofile(f)
+        array('I', (number for _, number in city)).tofile(f)
+        unit_offs.tofile(f)
+        f.write(unit_blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(ordered)
+
+
+class Comparables:
+    """The memory-mapped unit trees"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, neighborhoods = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} comparables file")
+        offset = HEADER.size
+        ranges = struct.unpack_from(f'<{2 * neighborhoods}I', self._mm, offset)
+        offset += 8 * neighborhoods
+        name_offs = struct.unpack_from(f'<{neighborhoods + 1}I', self._mm, offset)
+        offset += 4 * (neighborhoods + 1)
+        self.neighborhoods = {}
+        for i in range(neighborhoods):
+            name = self._mm[offset + name_offs[i]:offset + name_offs[i + 1]].decode('utf-8')
+            self.neighborhoods[name.lower()] = (name, ranges[2 * i], ranges[2 * i + 1])
+        offset += name_offs[-1]
+        view = memoryview(self._mm)
+        self._features = view[offset:offset + self.count * DIMS * 4].cast('f')
+        offset += self.count * DIMS * 4
+        self._city = view[offset:offset + self.count * 4].cast('I')
+        offset += self.count * 4
+        self._unit_offs = view[offset:offset + (self.count + 1) * 4].cast('I')
+        self._units = offset + (self.count + 1) * 4
+
+    def __len__(self):
+        return self.count
+
+    def unit(self, number):
+        start = self._units + self._unit_offs[number]
+        return json.loads(self._mm[start:self._units + self._unit_offs[number + 1]])
+
+    def _search(self, query, mask, k, lo, hi, point_at, heap):
+        """
+        KNN over the implicit tree in [lo, hi); `heap` holds (-dist2, number).
+        Each pending subtree carries its per-dimension offset from the query,
+        so a subtree is skipped once its box is no nearer than the kth best.
+        """
+        features = self._features
+        stack = [(lo, hi, 0, 0.0, (0.0,) * DIMS)]
+        while stack:
+            lo, hi, depth, box2, offsets = stack.pop()
+            if lo >= hi:
+                continue
+            full = len(heap) == k
+            if full and box2 >= -heap[0][0]:
+                continue
+            mid = (lo + hi) // 2
+            number = point_at(mid)
+            base = number * DIMS
+            dist2 = 0.0
+            for d in mask:
+                diff = features[base + d] - query[d]
+                dist2 += diff * diff
+            if not full:
+                heapq.heappush(heap, (-dist2, number))
+            elif dist2 < -heap[0][0]:
+                heapq.heapreplace(heap, (-dist2, number))
+            dim = depth % DIMS
+            if dim not in mask:
+                stack.append((lo, mid, depth + 1, box2, offsets))
+                stack.append((mid + 1, hi, depth + 1, box2, offsets))
+                continue
+            diff = query[dim] - features[base + dim]
+            near, far = ((mid + 1, hi), (lo, mid)) if diff > 0 else ((lo, mid), (mid + 1, hi))
+            far_box2 = box2 - offsets[dim] * offsets[dim] + diff * diff
+            if len(heap) < k or far_box2 < -heap[0][0]:
+                far_offsets = offsets[:dim] + (diff,) + offsets[dim + 1:]
+                stack.append((far[0], far[1], depth + 1, far_box2, far_offsets))
+            stack.append((near[0], near[1], depth + 1, box2, offsets))
+
+    def nearest(self, query, k=DEFAULT_K, neighborhood=None):
+        """
+        The k units nearest to `query` ({feature: value}; missing features are
+        ignored), preferring `neighborhood` and filling up citywide
+        """
+        scaled = [0.0] * DIMS
+        mask = []
+        for d, name in enumerate(FEATURES):
+            value = parse_measure(query.get(name))
+            if value is not None:
+                scaled[d] = value / SCALES[d]
+                mask.append(d)
+        mask = tuple(mask)
+        matched = self.neighborhoods.get((neighborhood or '').strip().lower()) if neighborhood else None
+
+        results, seen = [], set()
+        if matched:
+            heap = []
+            self._search(scaled, mask, k, matched[1], matched[2], lambda i: i, heap)
+            results = sorted((-d, n) for d, n in heap)
+            seen = {n for _, n in results}
+        if len(results) < k:
+            heap = []
+            city = self._city
+            self._search(scaled, mask, k + len(seen), 0, self.count, lambda i: city[i], heap)
+            extra = sorted((-d, n) for d, n in heap if n not in seen)
+            results += extra[:k - len(results)]
+
+        comparables = []
+        for dist2, number in results:
+            unit = self.unit(number)
+            unit['distance'] = round(dist2 ** 0.5, 3)
+            comparables.append(unit)
+        return {'neighborhood': matched[0] if matched else None, 'comparables': comparables}
+
+
+def get_index():
+    """The mapped comparables index, or None if it hasn't been built; remaps after a rebuild"""
+    return get_mapped(COMPARABLES_PATH, Comparables)
+
+
+def rent_summary(comparables):
+    """Median and range of the comparables' rent estimates"""
+    rents = sorted(c['monthly_rent_estimate'] for c in comparables if c.get('monthly_rent_estimate'))
+    if not rents:
+        return None
+    return {'median': rents[len(rents) // 2], 'low': rents[0], 'high': rents[-1], 'units': len(rents)}
+
+
+def build_comparables():
+    select = ('block_address,analysis_neighborhood,bedroom_count,bathroom_count,square_footage,'
+              'year_property_built,submission_year,monthly_rent,occupancy_type')
+    return write_comparables(COMPARABLES_PATH, iter_dataset_rows('gdc7-dmcn', select=select))
+
+
+def main(argv):
+    if len(argv) >= 1 and argv[0] == 'build':
+        start = time.time()
+        count = build_comparables()
+        print(f"Built rent comparables: {count} units in {time.time() - start:.1f}s -> {COMPARABLES_PATH}")
+        return 0
+    if len(argv) == 2 and argv[0] == 'query':
+        index = get_index()
+        query = json.loads(argv[1])
+        result = index.nearest(query, int(query.get('k', DEFAULT_K)), query.get('neighborhood')) if index else None
+        print(json.dumps(result, indent=2))
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,162 @@
+"""
+Crawl Craigslist SF apartment search results into the local listing index.
+
+Walks search-result pages, fetches listing pages concurrently with per-host
+politeness limits, parses them with the same amenity extractor the API uses,
+resolves each listing to a blklot and upserts it into listings.db. Each listing is
+also fingerprinted for repost detection (reposts.py).
+
+Usage:
+    python crawler.py [--search-url URL] [--max-pages 5] [--workers 8]
+                      [--per-host 2] [--interval 1.0] [--no-resolve]
+                      [--parse-mode inline|process]
+
+Point --search-url at a local fixture server to test without Craigslist.
+"""
+import argparse
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse, urlencode, parse_qsl, urlunparse
+
+import upstream
+import listings
+import listing_parser
+import reposts
+import logs
+
+log = logs.get_logger('crawler')
+
+SEARCH_URL = 'https://sfbay.craigslist.org/search/sfc/apa'
+RESULTS_PER_PAGE = 120
+# Listing pages end in the numeric post id
+LISTING_URL_RE = re.compile(r'/\d{6,}\.html$')
+
+
+def page_url(search_url, offset):
+    """Search URL for the result page starting at `offset`"""
+    parts = urlparse(search_url)
+    query = dict(parse_qsl(parts.query))
+    if offset:
+        query['s'] = str(offset)
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+
+def extract_listing_links(html, base_url):
+    """Absolute listing URLs on a search-result page, in page order"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'lxml')
+    links = []
+    for anchor in soup.find_all('a', href=True):
+        url = urljoin(base_url, anchor['href']).split('#')[0].split('?')[0]
+        if LISTING_URL_RE.search(url) and url not in links:
+            links.append(url)
+    return links
+
+
+def resolve_listing(url, amenities):
+    """(address, blklot, rent_controlled) for a parsed listing, best effort"""
+    from app import (extract_address_from_url, normalize_address, get_parcel_info, rent_control_from_year_built,
+                     parcel_from_coordinates)
+    from indexes import parcel_address
+    address = extract_address_from_url(url)
+    if not address and amenities.get('listing_title'):
+        address = extract_address_from_url(amenities['listing_title'])
+    if address:
+        address = normalize_address(address.split(',')[0])
+        parcel_info = get_parcel_info(address=address)
+    else:
+        # No address anywhere in the posting; fall back to its map pin
+        parcel = parcel_from_coordinates(amenities)
+        if not parcel:
+            return None, None, None
+        parcel_info = get_parcel_info(parcel=parcel)
+        address = parcel_address(parcel_info) if parcel_info else None
+    if not parcel_info:
+        return address, None, None
+    return address, parcel_info.get('blklot'), rent_control_from_year_built(parcel_info.get('year_property_built'))
+
+
+def crawl(search_url=SEARCH_URL, max_pages=5, workers=8, per_host=2, interval=1.0,
+          resolve_parcels=True, progress=None, parse_mode=None):
+    """
+    Crawl up to `max_pages` result pages into the listing index.
+    `progress(done, total)` is called as listings complete. `parse_mode`
+    overrides LISTING_PARSE_MODE ('inline' or 'process').
+    Returns a summary dict.
+    """
+    from app import CRAIGSLIST_HEADERS
+    limiter = upstream.HostLimiter(per_host, interval)
+    summary = {'pages': 0, 'listings_found': 0, 'stored': 0, 'resolved': 0, 'failed': 0}
+    start = time.time()
+
+    listing_urls = []
+    for page in range(max_pages):
+        url = page_url(search_url, page * RESULTS_PER_PAGE)
+        try:
+            with limiter(url):
+                response = upstream.get(url, headers=CRAIGSLIST_HEADERS, cache=False)
+        except Exception as e:
+            log.warning("Search page fetch error: %s", e, extra={'url': url})
+            break
+        if response.status_code != 200:
+            log.warning("Search page fetch failed", extra={'url': url, 'status': response.status_code})
+            break
+        summary['pages'] += 1
+        new_links = [l for l in extract_listing_links(response.text, url) if l not in listing_urls]
+        if not new_links:
+            break
+        listing_urls.extend(new_links)
+    summary['listings_found'] = len(listing_urls)
+
+    def process(url):
+        with limiter(url):
+            response = upstream.get(url, headers=CRAIGSLIST_HEADERS, cache=False)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        amenities = listing_parser.parse_listing_html(response.text, mode=parse_mode)
+        address = blklot = rent_controlled = None
+        if resolve_parcels:
+            address, blklot, rent_controlled = resolve_listing(url, amenities)
+        listings.upsert_listing(url, amenities, address, blklot, rent_controlled)
+        reposts.record(url, amenities)
+        return blklot
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crawler') as executor:
+        futures = {executor.submit(process, url): url for url in listing_urls}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                blklot = future.result()
+                summary['stored'] += 1
+                if blklot:
+                    summary['resolved'] += 1
+            except Exception as e:
+                summary['failed'] += 1
+                log.warning("Listing crawl error: %s", e, extra={'url': futures[future]})
+            if progress:
+                progress(done, len(futures))
+
+    summary['seconds'] = round(time.time() - start, 2)
+    return summary
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Crawl Craigslist SF apartments into the local listing index')
+    parser.add_argument('--search-url', default=SEARCH_URL)
+    parser.add_argument('--max-pages', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--per-host', type=int, default=2, help='concurrent requests per host')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between requests to one host')
+    parser.add_argument('--no-resolve', action='store_true', help='skip blklot resolution')
+    parser.add_argument('--parse-mode', choices=['inline', 'process'], default=None,
+                        help='parse listing HTML inline or in a process pool')
+    args = parser.parse_args(argv)
+    summary = crawl(args.search_url, args.max_pages, args.workers, args.per_host,
+                    args.interval, resolve_parcels=not args.no_resolve, parse_mode=args.parse_mode)
+    print(summary)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,304 @@
+"""
+Bulk enrichment of address lists with the fields /api/search returns.
+
+Reads a CSV or JSONL file of addresses (or block/lot parcels), resolves
+each row to a parcel and runs get_property_details for it on a thread pool,
+with a cap on concurrent upstream requests. Rows that resolve to a parcel
+already enriched in this run (or an earlier, interrupted one) reuse that
+result instead of refetching. Results are appended to the output as rows
+finish. Re-running the same command resumes: rows already in the output are
+skipped, rows that raised or came back with an error are retried, and
+successful per-parcel results are kept in a sqlite checkpoint next to the
+output.
+
+Usage:
+    python enrich.py INPUT OUTPUT [--workers 4] [--upstream-concurrency 8]
+                     [--address-column address] [--parcel-column parcel]
+                     [--fields owner,year_built,...] [--limit N]
+
+INPUT and OUTPUT may be .csv or .jsonl. CSV output gets the input columns,
+enrich_status, blklot and the selected fields (nested values JSON-encoded).
+JSONL output gets {"row", "input", "status", "blklot", "property"}; with
+--fields all it carries the full property record.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import upstream
+import logs
+
+log = logs.get_logger('enrich')
+
+DEFAULT_FIELDS = [
+    'address', 'owner', 'property_type', 'year_built', 'num_units', 'rent_controlled',
+    'assessed_value', 'zoning', 'lot_size', 'building_sqft', 'number_of_bedrooms',
+    'number_of_bathrooms', 'eviction_count', 'complaint_count', 'buyout_count',
+]
+ROW_KEY = 'row'
+
+
+def is_jsonl(path):
+    return path.lower().endswith(('.jsonl', '.ndjson'))
+
+
+def read_rows(path):
+    """Yield input rows as dicts, in file order"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if is_jsonl(path):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def completed_rows(path):
+    """Row numbers already written to an existing output file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, newline='', encoding='utf-8') as f:
+        if is_jsonl(path):
+            for line in f:
+                try:
+                    done.add(int(json.loads(line)[ROW_KEY]))
+                except (ValueError, KeyError):
+                    # A partial last line from an interrupted run
+                    continue
+        else:
+            for row in csv.DictReader(f):
+                if (row.get(ROW_KEY) or '').isdigit():
+                    done.add(int(row[ROW_KEY]))
+    return done
+
+
+def normalize_parcel(parcel):
+    """'1234/567' or '1234567' -> blklot"""
+    parcel = parcel.strip().upper()
+    if '/' in parcel:
+        block, lot = parcel.split('/', 1)
+        return f"{block.zfill(4)}{lot.zfill(3)}"
+    return parcel
+
+
+class Checkpoint:
+    """Per-parcel results and address resolutions kept across runs"""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.lock = threading.Lock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS parcels (blklot TEXT PRIMARY KEY, details TEXT);
+            CREATE TABLE IF NOT EXISTS addresses (address TEXT PRIMARY KEY, blklot TEXT);
+        """)
+
+    def parcel(self, blklot):
+        with self.lock:
+            row = self.conn.execute('SELECT details FROM parcels WHERE blklot = ?', (blklot,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_parcel(self, blklot, details):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO parcels VALUES (?, ?)', (blklot, json.dumps(details)))
+            self.conn.commit()
+
+    def address(self, address):
+        with self.lock:
+            row = self.conn.execute('SELECT blklot FROM addresses WHERE address = ?', (address,)).fetchone()
+        return row[0] if row else None
+
+    def save_address(self, address, blklot):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO addresses VALUES (?, ?)', (address, blklot))
+            self.conn.commit()
+
+
+class Writer:
+    """Appends finished rows to the output, flushing each so progress survives a kill"""
+
+    def __init__(self, path, input_columns, fields):
+        self.jsonl = is_jsonl(path)
+        self.fields = fields
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'a', newline='', encoding='utf-8')
+        self.lock = threading.Lock()
+        if not self.jsonl:
+            columns = [ROW_KEY] + list(input_columns) + ['enrich_status', 'blklot'] + \
+                      [f for f in fields if f not in input_columns]
+            self.csv = csv.DictWriter(self.file, fieldnames=columns, extrasaction='ignore')
+            if not exists:
+                self.csv.writeheader()
+
+    def write(self, index, row, status, blklot, details):
+        selected = {f: details.get(f) for f in self.fields} if details and self.fields else details
+        with self.lock:
+            if self.jsonl:
+                self.file.write(json.dumps({ROW_KEY: index, 'input': row, 'status': status,
+                                            'blklot': blklot, 'property': selected}) + '\n')
+            else:
+                out = {ROW_KEY: index, 'enrich_status': status, 'blklot': blklot}
+                for key, value in (selected or {}).items():
+                    out[key] = json.dumps(value) if isinstance(value, (dict, list)) else value
+                out.update(row)
+                self.csv.writerow(out)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def enrich(input_path, output_path, workers=4, upstream_concurrency=8, address_column='address',
+           parcel_column='parcel', fields=None, limit=None, progress=None):
+    """
+    Enrich every row of `input_path` into `output_path`; returns a summary
+    dict. `progress(done, total)` is called as rows finish; if it raises,
+    unstarted rows are cancelled and the exception propagates.
+    """
+    import app
+
+    upstream.set_max_concurrency(upstream_concurrency)
+    checkpoint = Checkpoint(output_path + '.checkpoint.db')
+    done = completed_rows(output_path)
+    rows = list(read_rows(input_path))
+    if limit:
+        rows = rows[:limit]
+    input_columns = list(rows[0].keys()) if rows else []
+    if fields is None and not is_jsonl(output_path):
+        fields = DEFAULT_FIELDS
+    writer = Writer(output_path, input_columns, fields)
+    errors_before = {name: s['errors'] + s['http_errors'] for name, s in upstream.stats()['sources'].items()}
+
+    summary = {'rows': len(rows), 'resumed': len(done & set(range(len(rows)))), 'enriched': 0,
+               'deduplicated': 0, 'unresolved': 0, 'failed': 0}
+    counts_lock = threading.Lock()
+
+    def resolve(row):
+        parcel = (row.get(parcel_column) or '').strip()
+        if parcel:
+            return normalize_parcel(parcel), None
+        address = (row.get(address_column) or '').strip()
+        if not address:
+            return None, None
+        normalized = app.normalize_address(address.split(',')[0])
+        blklot = checkpoint.address(normalized)
+        if blklot is None:
+            # Strict: a failed lookup raises, so only a confirmed no-match is checkpointed
+            # as unresolved; the failure is counted and retried on resume like an error row
+            info = app.get_parcel_info(address=address, strict=True)
+            blklot = (info or {}).get('blklot') or ''
+            checkpoint.save_address(normalized, blklot)
+        return blklot or None, address
+
+    def details_for(blklot, address):
+        cached = checkpoint.parcel(blklot)
+        if cached is not None:
+            return cached, True
+
+        fetched = []
+
+        def fetch():
+            # A concurrent row may have stored it while we waited
+            stored = checkpoint.parcel(blklot)
+            if stored is not None:
+                return stored
+            fetched.append(True)
+            if address:
+                details = app.get_property_details(address=address)
+            else:
+                details = app.get_property_details(parcel=f"{blklot[:4]}/{blklot[4:]}")
+            if 'error' not in details:
+                checkpoint.save_parcel(blklot, details)
+            return details
+
+        # Rows for the same parcel arriving together share one enrichment
+        details = upstream.single_flight(('enrich', blklot), fetch)
+        return details, not fetched
+
+    def process(index, row):
+        blklot, address = resolve(row)
+        if not blklot:
+            return index, row, 'unresolved', None, None, False
+        details, reused = details_for(blklot, address)
+        status = 'error' if 'error' in details else 'ok'
+        return index, row, status, blklot, details, reused
+
+    start = time.time()
+    pending = [(i, row) for i, row in enumerate(rows) if i not in done]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='enrich') as executor:
+        futures = {executor.submit(process, i, row): (i, row) for i, row in pending}
+        for finished, future in enumerate(as_completed(futures), 1):
+            index, row = futures[future]
+            try:
+                index, row, status, blklot, details, reused = future.result()
+            except Exception as e:
+                # Not written, so a resumed run retries it
+                log.warning("Enrichment error: %s", e, extra={ROW_KEY: index})
+                status = 'failed'
+            else:
+                if status == 'error':
+                    # Like an exception: neither written nor checkpointed, so a resumed run retries it
+                    log.warning("Enrichment error: %s", details['error'], extra={ROW_KEY: index})
+                else:
+                    writer.write(index, row, status, blklot, details)
+            with counts_lock:
+                if status == 'ok':
+                    summary['enriched'] += 1
+                    summary['deduplicated'] += int(reused)
+                elif status == 'unresolved':
+                    summary['unresolved'] += 1
+                else:
+                    summary['failed'] += 1
+            if progress:
+                try:
+                    progress(finished, len(pending))
+                except BaseException:
+                    for other in futures:
+                        other.cancel()
+                    writer.close()
+                    raise
+            if finished % 50 == 0:
+                log.info("Enrichment progress", extra={'done': finished, 'pending': len(pending),
+                                                       'rows_per_sec': round(finished / (time.time() - start), 2)})
+    writer.close()
+
+    seconds = time.time() - start
+    summary['seconds'] = round(seconds, 2)
+    summary['rows_per_sec'] = round(len(pending) / seconds, 2) if seconds > 0 else None
+    failures = {}
+    for name, s in upstream.stats()['sources'].items():
+        count = s['errors'] + s['http_errors'] - errors_before.get(name, 0)
+        if count:
+            failures[name] = count
+    summary['upstream_failures'] = failures
+    return summary
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Enrich a CSV/JSONL address list with property details')
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--workers', type=int, default=4, help='rows enriched concurrently')
+    parser.add_argument('--upstream-concurrency', type=int, default=8,
+                        help='max DataSF requests in flight at once')
+    parser.add_argument('--address-column', default='address')
+    parser.add_argument('--parcel-column', default='parcel')
+    parser.add_argument('--fields', default=','.join(DEFAULT_FIELDS),
+                        help="comma-separated property fields to write ('all' for everything)")
+    parser.add_argument('--limit', type=int, default=None, help='only the first N rows')
+    args = parser.parse_args(argv)
+    fields = None if args.fields == 'all' else [f.strip() for f in args.fields.split(',') if f.strip()]
+    summary = enrich(args.input, args.output, args.workers, args.upstream_concurrency,
+                     args.address_column, args.parcel_column, fields, args.limit)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
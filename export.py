@@ -0,0 +1,221 @@
+"""
+Streaming export of saved properties.
+
+Saved entries are hydrated from their snapshots one at a time and written out
+as NDJSON, CSV (one row per property, nested values JSON-encoded) or Parquet,
+so memory stays flat however many properties are saved. Every format is a
+generator of chunks that the API streams as they're produced: text lines
+for NDJSON and CSV, and for Parquet (needs pyarrow, which is optional) the
+bytes of each row group of PARQUET_BATCH_SIZE as it's written, then the
+footer.
+
+Usage:
+    python export.py OUTPUT [--format ndjson|csv|parquet] [--fields id,address,...]
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+
+import snapshots
+
+FORMATS = ('ndjson', 'csv', 'parquet')
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+DEFAULT_FIELDS = [
+    'id', 'saved_date', 'listing_url', 'notes', 'rent_price', 'address', 'owner', 'property_type',
+    'year_built', 'num_units', 'rent_controlled', 'assessed_value', 'zoning', 'lot_size',
+    'building_sqft', 'number_of_bedrooms', 'number_of_bathrooms', 'eviction_count',
+    'complaint_count', 'buyout_count',
+]
+PARQUET_BATCH_SIZE = 500
+
+
+def parse_fields(value, fmt):
+    """'a,b,c' -> list; 'all' (or nothing, for NDJSON) -> None meaning every field"""
+    if value == 'all' or (not value and fmt == 'ndjson'):
+        return None
+    if not value:
+        return list(DEFAULT_FIELDS)
+    return [f.strip() for f in value.split(',') if f.strip()]
+
+
+def iter_documents(entries, fields=None):
+    """Hydrate saved entries one at a time, keeping only `fields` if given"""
+    for entry in entries:
+        document = snapshots.hydrate(entry)
+        if fields is not None:
+            document = {f: document.get(f) for f in fields}
+        yield document
+
+
+def flat_value(value):
+    return json.dumps(value, default=str) if isinstance(value, (dict, list)) else value
+
+
+def ndjson_chunks(entries, fields=None):
+    for document in iter_documents(entries, fields):
+        yield json.dumps(document, default=str) + '\n'
+
+
+def csv_chunks(entries, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for document in iter_documents(entries, fields):
+        writer.writerow({k: flat_value(v) for k, v in document.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _parquet_schema(pa, fields, batch):
+    """Numeric/bool columns keep their type (from the first batch); everything else is text"""
+    columns = []
+    for field in fields:
+        values = [doc.get(field) for doc in batch if doc.get(field) is not None]
+        if values and all(isinstance(v, bool) for v in values):
+            columns.append(pa.field(field, pa.bool_()))
+        elif values and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            columns.append(pa.field(field, pa.float64()))
+        else:
+            columns.append(pa.field(field, pa.string()))
+    return pa.schema(columns)
+
+
+def _parquet_value(value, kind):
+    if value is None:
+        return None
+    if kind == 'string':
+        value = flat_value(value)
+        return value if isinstance(value, str) else str(value)
+    if kind == 'bool':
+        return value if isinstance(value, bool) else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parquet_available():
+    """Whether pyarrow is installed, checked before a Parquet export starts streaming"""
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    return pyarrow.parquet is not None
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file for ParquetWriter that hands back what was written so far"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def write_parquet(entries, fields, out):
+    """Write Parquet to a path or binary file object; raises ImportError without pyarrow"""
+    for _ in _parquet_row_groups(entries, fields, out):
+        pass
+
+
+def parquet_chunks(entries, fields):
+    """Parquet file bytes, one chunk per row group (the last carries the footer)"""
+    sink = _ChunkSink()
+    for _ in _parquet_row_groups(entries, fields, sink):
+        chunk = sink.take()
+        if chunk:
+            yield chunk
+    chunk = sink.take()
+    if chunk:
+        yield chunk
+
+
+def _parquet_row_groups(entries, fields, out):
+    """Write Parquet to `out`, yielding after each row group"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    schema = None
+    batch = []
+
+    def flush():
+        nonlocal writer, schema
+        if schema is None:
+            schema = _parquet_schema(pa, fields, batch)
+            writer = pq.ParquetWriter(out, schema)
+        columns = {}
+        for column in schema:
+            kind = 'bool' if column.type == pa.bool_() else 'float' if column.type == pa.float64() else 'string'
+            columns[column.name] = [_parquet_value(doc.get(column.name), kind) for doc in batch]
+        writer.write_table(pa.table(columns, schema=schema))
+        batch.clear()
+
+    for document in iter_documents(entries, fields):
+        batch.append(document)
+        if len(batch) >= PARQUET_BATCH_SIZE:
+            flush()
+            yield
+    if batch or writer is None:
+        flush()
+    writer.close()
+    yield
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Export saved properties')
+    parser.add_argument('output', help="output path ('-' for stdout; not for parquet)")
+    parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('--fields', default='',
+                        help="comma-separated fields ('all' for everything; default depends on format)")
+    args = parser.parse_args(argv)
+
+    from app import load_properties
+    entries, _ = load_properties()
+    fields = parse_fields(args.fields, args.format)
+    if args.format == 'parquet':
+        if fields is None:
+            parser.error('parquet export needs an explicit field list')
+        write_parquet(entries, fields, args.output)
+        return 0
+    if fields is None and args.format == 'csv':
+        parser.error('csv export needs an explicit field list')
+    chunks = ndjson_chunks(entries, fields) if args.format == 'ndjson' else csv_chunks(entries, fields)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,302 @@
+"""
+Local reverse geocoder: latitude/longitude -> parcel blklot.
+
+Parcel polygons (the `shape` / `the_geom` geometry of the assessor parcel
+dataset, or a GeoJSON export of it) are built offline into a binary file
+that every worker memory-maps read-only, like indexes.py. Lookups hash the
+point to a uniform grid cell, test the parcels whose bounding box covers the
+point with an even-odd point-in-polygon test (holes and multipolygon parts
+both work), and otherwise fall back to the parcel with the nearest edge
+within GEO_NEAREST_MAX_METERS. No remote calls.
+
+File layout (little-endian):
+    header      b'SFGX' | version u32 | parcels u32 | rings u32 | vertices u32
+                | nx u32 | ny u32 | min_lon f64 | min_lat f64 | cell f64
+    cell_offs   (nx * ny + 1) x u32 into cell_items
+    cell_items  u32 parcel numbers, for every cell a parcel's bbox overlaps
+    bboxes      parcels x (min_lon, min_lat, max_lon, max_lat) f64
+    parcel_offs (parcels + 1) x u32 into ring_offs
+    ring_offs   (rings + 1) x u32 into vertices
+    vertices    vertices x (lon, lat) f64
+    blklots     parcels x 10 bytes, ASCII, NUL-padded
+
+Usage:
+    python geoindex.py build [GEOJSON_FILE]
+    python geoindex.py locate LAT LON
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+
+import logs
+from indexes import INDEX_DIR, get_mapped, iter_dataset_rows
+
+log = logs.get_logger('geoindex')
+
+GEO_INDEX_PATH = os.path.join(INDEX_DIR, 'parcel_geo.bin')
+# Grid cell size in degrees (~55m north-south in San Francisco)
+GEO_CELL_DEGREES = 0.0005
+# A point outside every parcel (a street, say) snaps to a parcel this close
+GEO_NEAREST_MAX_METERS = float(os.environ.get('GEO_NEAREST_MAX_METERS', '40'))
+
+MAGIC = b'SFGX'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIIIIddd')
+BLKLOT_BYTES = 10
+METERS_PER_DEGREE = 111320.0
+
+
+def _polygons(geometry):
+    """GeoJSON Polygon/MultiPolygon -> list of polygons, each a list of rings"""
+    if isinstance(geometry, str):
+        geometry = json.loads(geometry)
+    if not isinstance(geometry, dict):
+        return []
+    if geometry.get('type') == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry.get('type') == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+
+def write_geo_index(path, parcels):
+    """
+    Write (blklot, geometry) pairs to a grid-indexed polygon file and
+    atomically swap it in. Returns the number of parcels written.
+    """
+    blklots, bboxes, parcel_rings = [], [], []
+    for blklot, geometry in parcels:
+        rings = []
+        for polygon in _polygons(geometry):
+            for ring in polygon:
+                if len(ring) >= 3:
+                    rings.append([(float(x), float(y)) for x, y, *_ in ring])
+        if not rings or not blklot:
+            continue
+        xs = [x for ring in rings for x, _ in ring]
+        ys = [y for ring in rings for _, y in ring]
+        blklots.append(blklot)
+        bboxes.append((min(xs), min(ys), max(xs), max(ys)))
+        parcel_rings.append(rings)
+
+    if bboxes:
+        min_lon = min(b[0] for b in bboxes)
+        min_lat = min(b[1] for b in bboxes)
+        nx = int((max(b[2] for b in bboxes) - min_lon) / GEO_CELL_DEGREES) + 1
+        ny = int((max(b[3] for b in bboxes) - min_lat) / GEO_CELL_DEGREES) + 1
+    else:
+        min_lon = min_lat = 0.0
+        nx = ny = 1
+
+    cells = [[] for _ in range(nx * ny)]
+    for number, (x0, y0, x1, y1) in enumerate(bboxes):
+        for cy in range(int((y0 - min_lat) / GEO_CELL_DEGREES), int((y1 - min_lat) / GEO_CELL_DEGREES) + 1):
+            for cx in range(int((x0 - min_lon) / GEO_CELL_DEGREES), int((x1 - min_lon) / GEO_CELL_DEGREES) + 1):
+                cells[cy * nx + cx].append(number)
+
+    cell_offs = [0]
+    for cell in cells:
+        cell_offs.append(cell_offs[-1] + len(cell))
+    parcel_offs, ring_offs, vertices = [0], [0], []
+    for rings in parcel_rings:
+        for ring in rings:
+            for x, y in ring:
+                vertices.extend((x, y))
+            ring_offs.append(len(vertices) // 2)
+        parcel_offs.append(len(ring_offs) - 1)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(blklots), len(ring_offs) - 1, len(vertices) // 2,
+                            nx, ny, min_lon, min_lat, GEO_CELL_DEGREES))
+        f.write(struct.pack(f'<{len(cell_offs)}I', *cell_offs))
+        f.write(struct.pack(f'<{cell_offs[-1]}I', *(n for cell in cells for n in cell)))
+        f.write(struct.pack(f'<{len(bboxes) * 4}d', *(v for bbox in bboxes for v in bbox)))
+        f.write(struct.pack(f'<{len(parcel_offs)}I', *parcel_offs))
+        f.write(struct.pack(f'<{len(ring_offs)}I', *ring_offs))
+        f.write(struct.pack(f'<{len(vertices)}d', *vertices))
+        for blklot in blklots:
+            f.write(blklot.encode('ascii')[:BLKLOT_BYTES].ljust(BLKLOT_BYTES, b'\0'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(blklots)
+
+
+def _point_in_ring(x, y, vertices, start, end):
+    inside = False
+    x1, y1 = vertices[2 * (end - 1)], vertices[2 * (end - 1) + 1]
+    for i in range(start, end):
+        x2, y2 = vertices[2 * i], vertices[2 * i + 1]
+        if (y2 > y) != (y1 > y) and x < (x1 - x2) * (y - y2) / (y1 - y2) + x2:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def _segment_distance(px, py, x1, y1, x2, y2):
+    dx, dy = x2 - x1, y2 - y1
+    length = dx * dx + dy * dy
+    t = 0.0 if length == 0 else max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length))
+    ex, ey = x1 + t * dx - px, y1 + t * dy - py
+    return math.sqrt(ex * ex + ey * ey)
+
+
+class GeoIndex:
+    """A memory-mapped parcel polygon grid"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.count, rings, vertices, self.nx, self.ny,
+         self.min_lon, self.min_lat, self.cell) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} geo index file")
+        view = memoryview(self._mm)
+        offset = HEADER.size
+
+        def take(count, fmt, size):
+            nonlocal offset
+            part = view[offset:offset + count * size].cast(fmt)
+            offset += count * size
+            return part
+
+        self._cell_offs = take(self.nx * self.ny + 1, 'I', 4)
+        self._cell_items = take(self._cell_offs[-1], 'I', 4)
+        self._bboxes = take(self.count * 4, 'd', 8)
+        self._parcel_offs = take(self.count + 1, 'I', 4)
+        self._ring_offs = take(rings + 1, 'I', 4)
+        self._vertices = take(vertices * 2, 'd', 8)
+        self._blklots = offset
+        # Longitude degrees are shorter than latitude degrees away from the equator
+        self._lon_scale = math.cos(math.radians(self.min_lat + self.ny * self.cell / 2))
+
+    def __len__(self):
+        return self.count
+
+    def blklot(self, number):
+        start = self._blklots + number * BLKLOT_BYTES
+        return self._mm[start:start + BLKLOT_BYTES].rstrip(b'\0').decode('ascii')
+
+    def _cell_parcels(self, cx, cy):
+        if 0 <= cx < self.nx and 0 <= cy < self.ny:
+            cell = cy * self.nx + cx
+            return self._cell_items[self._cell_offs[cell]:self._cell_offs[cell + 1]]
+        return ()
+
+    def _contains(self, number, x, y):
+        b = self._bboxes
+        if not (b[4 * number] <= x <= b[4 * number + 2] and b[4 * number + 1] <= y <= b[4 * number + 3]):
+            return False
+        inside = False
+        for ring in range(self._parcel_offs[number], self._parcel_offs[number + 1]):
+            if _point_in_ring(x, y, self._vertices, self._ring_offs[ring], self._ring_offs[ring + 1]):
+                inside = not inside
+        return inside
+
+    def _distance(self, number, x, y):
+        """Distance in meters from the point to the parcel's nearest edge"""
+        v = self._vertices
+        sx = x * self._lon_scale
+        best = float('inf')
+        for ring in range(self._parcel_offs[number], self._parcel_offs[number + 1]):
+            start, end = self._ring_offs[ring], self._ring_offs[ring + 1]
+            px, py = v[2 * (end - 1)] * self._lon_scale, v[2 * (end - 1) + 1]
+            for i in range(start, end):
+                qx, qy = v[2 * i] * self._lon_scale, v[2 * i + 1]
+                best = min(best, _segment_distance(sx, y, px, py, qx, qy))
+                px, py = qx, qy
+        return best * METERS_PER_DEGREE
+
+    def locate(self, lat, lon, max_meters=None):
+        """
+        {'blklot', 'match': 'contains'|'nearest', 'distance_m'} for the parcel
+        at (lat, lon), or None if nothing is within `max_meters`
+        """
+        max_meters = GEO_NEAREST_MAX_METERS if max_meters is None else max_meters
+        x, y = float(lon), float(lat)
+        cx = int(math.floor((x - self.min_lon) / self.cell))
+        cy = int(math.floor((y - self.min_lat) / self.cell))
+        for number in self._cell_parcels(cx, cy):
+            if self._contains(number, x, y):
+                return {'blklot': self.blklot(number), 'match': 'contains', 'distance_m': 0.0}
+
+        # Nearest edge among parcels in the surrounding cells
+        reach = int(math.ceil(max_meters / (self.cell * METERS_PER_DEGREE * self._lon_scale)))
+        best, best_distance = None, max_meters
+        seen = set()
+        for ny in range(cy - reach, cy + reach + 1):
+            for nx in range(cx - reach, cx + reach + 1):
+                for number in self._cell_parcels(nx, ny):
+                    if number in seen:
+                        continue
+                    seen.add(number)
+                    distance = self._distance(number, x, y)
+                    if distance <= best_distance:
+                        best, best_distance = number, distance
+        if best is None:
+            return None
+        return {'blklot': self.blklot(best), 'match': 'nearest', 'distance_m': round(best_distance, 1)}
+
+
+def get_index():
+    """The mapped geo index, or None if it hasn't been built; remaps after a rebuild"""
+    return get_mapped(GEO_INDEX_PATH, GeoIndex)
+
+
+def locate(lat, lon, max_meters=None):
+    """Reverse geocode (lat, lon) to a parcel; None without an index or a match"""
+    index = get_index()
+    if index is None:
+        return None
+    try:
+        return index.locate(lat, lon, max_meters)
+    except (TypeError, ValueError):
+        return None
+
+
+# ============================================================
+# OFFLINE BUILDER
+# ============================================================
+
+def iter_geojson_parcels(path):
+    """(blklot, geometry) from a GeoJSON FeatureCollection export of the parcel dataset"""
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+    for feature in collection.get('features', []):
+        properties = feature.get('properties') or {}
+        yield properties.get('blklot'), feature.get('geometry')
+
+
+def build_geo_index(geojson_path=None):
+    """Parcel polygons from a GeoJSON export, or from dataset acdm-wktn"""
+    if geojson_path:
+        parcels = iter_geojson_parcels(geojson_path)
+    else:
+        parcels = ((row.get('blklot'), row.get('shape') or row.get('the_geom'))
+                   for row in iter_dataset_rows('acdm-wktn', select='blklot,shape'))
+    return write_geo_index(GEO_INDEX_PATH, parcels)
+
+
+def main(argv):
+    if len(argv) >= 1 and argv[0] == 'build':
+        start = time.time()
+        count = build_geo_index(argv[1] if len(argv) > 1 else None)
+        print(f"Built parcel geo index: {count} parcels in {time.time() - start:.1f}s -> {GEO_INDEX_PATH}")
+        return 0
+    if len(argv) == 3 and argv[0] == 'locate':
+        print(json.dumps(locate(float(argv[1]), float(argv[2]))))
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
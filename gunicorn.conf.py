@@ -0,0 +1,81 @@
+# Gunicorn picks this file up automatically from the working directory.
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Threaded workers so a slow upstream call doesn't block the whole worker.
+# admission.py limits how many requests run at once (ADMISSION_MAX_IN_FLIGHT)
+# and queue for a slot (ADMISSION_MAX_QUEUE); the remaining threads keep
+# /health and /ready responsive under load.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+
+# Background jobs run in their own process next to the web workers (same
+# disk, so they share data/jobs.db) when the deployment sets JOB_WORKERS to
+# its thread count. The default, 0, leaves it to a separately started
+# `python jobs.py worker`. The master restarts it whenever it exits, backing
+# off up to JOB_WORKER_MAX_BACKOFF seconds while it keeps failing.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '0'))
+JOB_WORKER_MAX_BACKOFF = 60
+# A worker that ran this long before exiting restarts without delay
+JOB_WORKER_HEALTHY_SECONDS = 60
+_job_worker = None
+_job_worker_lock = threading.Lock()
+_stopping = threading.Event()
+
+
+def _start_job_worker(server):
+    global _job_worker
+    with _job_worker_lock:
+        if _stopping.is_set():
+            return None
+        _job_worker = subprocess.Popen(
+            [sys.executable, 'jobs.py', 'worker', '--concurrency', str(JOB_WORKERS)],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        server.log.info(f"Started job worker (pid {_job_worker.pid})")
+        return _job_worker
+
+
+def _supervise_job_worker(server, process):
+    """Restart the job worker each time it exits, until the server shuts down"""
+    delay = 1
+    while process is not None:
+        started = time.monotonic()
+        code = process.wait()
+        if _stopping.is_set():
+            return
+        if time.monotonic() - started >= JOB_WORKER_HEALTHY_SECONDS:
+            delay = 1
+        server.log.warning(f"Job worker exited with status {code}; restarting in {delay}s")
+        if _stopping.wait(delay):
+            return
+        delay = min(delay * 2, JOB_WORKER_MAX_BACKOFF)
+        process = _start_job_worker(server)
+
+
+def when_ready(server):
+    if JOB_WORKERS > 0:
+        process = _start_job_worker(server)
+        threading.Thread(target=_supervise_job_worker, args=(server, process), name='job-worker-supervisor',
+                         daemon=True).start()
+
+
+def on_exit(server):
+    with _job_worker_lock:
+        _stopping.set()
+        process = _job_worker
+    if process is not None and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def post_worker_init(worker):
+    """Start each worker's background warm-up as soon as it has forked"""
+    from app import start_warmup
+    start_warmup()
@@ -0,0 +1,357 @@
+"""
+Listing image proxy with an on-disk, content-addressed thumbnail cache.
+
+Each source image is fetched once. Its bytes are stored under their SHA-256
+(blobs/), and the source URL maps to that digest (urls/). Thumbnails are
+generated per width in THUMBNAIL_WIDTHS and stored next to it (thumbs/).
+Generating them needs Pillow (in requirements.txt); without it the original
+is served at every width. All paths are under DATA_DIR/images.
+
+Images of saved listings are pinned: pins/<digest> lists the saved
+properties holding the image, and the file goes away with the last of them.
+Pinned images (and their thumbnails) are never evicted, so they keep loading
+after Craigslist removes the listing, and they don't count toward the bound.
+The pin endpoints aren't authenticated, so pinned bytes have their own cap,
+IMAGE_PIN_MAX_BYTES: past it, new images are fetched and cached as usual but
+not pinned (images already pinned can still gain owners).
+
+The unpinned rest is bounded by IMAGE_CACHE_MAX_BYTES. Every hit touches the
+file's mtime, and when the cache grows past the bound the least recently used
+files are deleted until it is back under IMAGE_CACHE_LOW_WATER of it.
+
+Only hosts in IMAGE_PROXY_HOSTS are proxied.
+"""
+import hashlib
+import io
+import os
+import threading
+from urllib.parse import urlparse
+
+import logs
+import upstream
+from indexes import DATA_DIR
+
+log = logs.get_logger('imageproxy')
+
+IMAGE_CACHE_DIR = os.path.join(DATA_DIR, 'images')
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+IMAGE_CACHE_LOW_WATER = 0.9
+IMAGE_PROXY_HOSTS = tuple(h.strip() for h in os.environ.get('IMAGE_PROXY_HOSTS', 'images.craigslist.org').split(',')
+                          if h.strip())
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+# Images one saved property may pin (its listing and reposts)
+MAX_PINNED_IMAGES = 50
+# Cap on pinned bytes, which eviction can't reclaim
+IMAGE_PIN_MAX_BYTES = int(os.environ.get('IMAGE_PIN_MAX_BYTES', str(256 * 1024 * 1024)))
+THUMBNAIL_WIDTHS = (150, 300, 600, 1200)
+THUMBNAIL_QUALITY = 82
+# Source images never change under the same URL
+CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'image/avif,image/webp,image/*,*/*;q=0.8',
+}
+
+
+class ImageError(Exception):
+    """The image couldn't be fetched or isn't allowed"""
+
+
+_size_lock = threading.Lock()
+_pin_lock = threading.Lock()
+# Unpinned and pinned bytes on disk (None until first counted)
+_cache_bytes = None
+_pinned_bytes = None
+_stats = {'hits': 0, 'fetches': 0, 'thumbnails': 0, 'evicted': 0, 'pins_refused': 0}
+_warned_no_pillow = False
+
+
+def allowed(url):
+    parsed = urlparse(url or '')
+    return parsed.scheme in ('http', 'https') and parsed.hostname in IMAGE_PROXY_HOSTS
+
+
+def snap_width(width):
+    """Smallest supported thumbnail width >= width (the largest for bigger requests)"""
+    for size in THUMBNAIL_WIDTHS:
+        if width <= size:
+            return size
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def _path(kind, name):
+    return os.path.join(IMAGE_CACHE_DIR, kind, name[:2], name)
+
+
+def _url_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    _grew(len(data))
+
+
+def _read(path):
+    """File contents, bumping its mtime for LRU; None if it isn't cached"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path)
+        return data
+    except OSError:
+        return None
+
+
+def _fetch(url):
+    response = upstream.get(url, headers=HEADERS, cache=False)
+    if response.status_code != 200:
+        raise ImageError(f"HTTP {response.status_code}")
+    data = response.content
+    if not data or len(data) > IMAGE_MAX_BYTES:
+        raise ImageError(f"unexpected image size {len(data or b'')}")
+    return data
+
+
+def _cached_digest(url):
+    return (_read(_path('urls', _url_key(url))) or b'').decode('ascii') or None
+
+
+def original(url):
+    """(digest, bytes) of the source image, fetched once and then served from disk"""
+    if not allowed(url):
+        raise ImageError('image host not allowed')
+    url_path = _path('urls', _url_key(url))
+    digest = _cached_digest(url)
+    data = _read(_path('blobs', digest)) if digest else None
+    if data is not None:
+        _stats['hits'] += 1
+        return digest, data
+
+    def fetch():
+        _stats['fetches'] += 1
+        data = _fetch(url)
+        digest = hashlib.sha256(data).hexdigest()
+        _write(_path('blobs', digest), data)
+        _write(url_path, digest.encode('ascii'))
+        return digest, data
+    return upstream.single_flight(('image', url), fetch)
+
+
+def _resize(data, width):
+    """JPEG thumbnail `width` pixels wide at most; None without Pillow or for unreadable images"""
+    global _warned_no_pillow
+    try:
+        from PIL import Image
+    except ImportError:
+        if not _warned_no_pillow:
+            log.warning("Pillow not installed; image proxy serves originals")
+            _warned_no_pillow = True
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((width, width * 4))
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            out = io.BytesIO()
+            image.save(out, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+            return out.getvalue()
+    except Exception as e:
+        log.warning("Thumbnail error: %s", e)
+        return None
+
+
+def _mimetype(data):
+    if data[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return 'application/octet-stream'
+
+
+def thumbnail(url, width):
+    """(etag, bytes, mimetype) for `url` at the snapped `width`; raises ImageError"""
+    width = snap_width(width)
+    digest = _cached_digest(url) if allowed(url) else None
+    thumb = _read(_path('thumbs', f"{digest}-{width}.jpg")) if digest else None
+    if thumb is not None:
+        _stats['hits'] += 1
+        return f"{digest}-{width}.jpg", thumb, 'image/jpeg'
+    digest, data = original(url)
+    name = f"{digest}-{width}.jpg"
+    thumb = _resize(data, width)
+    if thumb is None:
+        return digest, data, _mimetype(data)
+    _stats['thumbnails'] += 1
+    _write(_path('thumbs', name), thumb)
+    return name, thumb, 'image/jpeg'
+
+
+# ============================================================
+# PINNING + EVICTION
+# ============================================================
+
+def _pin_owners(path):
+    try:
+        with open(path) as f:
+            return {line.strip() for line in f if line.strip()}
+    except OSError:
+        return set()
+
+
+def _set_pin_owners(path, owners):
+    if not owners:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, 'w') as f:
+        f.write(''.join(f"{owner}\n" for owner in sorted(owners)))
+    os.replace(tmp_path, path)
+
+
+def _pinned_changed(size):
+    """Adjust the pinned byte count by `size`; returns the new count"""
+    global _pinned_bytes
+    with _size_lock:
+        if _pinned_bytes is None:
+            files, pinned = _cache_files(), _pinned()
+            _pinned_bytes = sum(f[1] for f in files) - _unpinned_bytes(files, pinned)
+        _pinned_bytes = max(0, _pinned_bytes + size)
+        return _pinned_bytes
+
+
+def pin(urls, owner):
+    """
+    Fetch a saved listing's images and keep them out of eviction while
+    `owner` (the saved property's id) holds them; returns the digests pinned
+    """
+    digests = []
+    for url in urls or []:
+        try:
+            digest, data = original(url)
+        except Exception as e:
+            log.warning("Image pin error: %s", e, extra={'url': url})
+            continue
+        path = _path('pins', digest)
+        with _pin_lock:
+            owners = _pin_owners(path)
+            if not owners and _pinned_changed(0) + len(data) > IMAGE_PIN_MAX_BYTES:
+                _stats['pins_refused'] += 1
+                log.warning("Image not pinned: pinned images are at IMAGE_PIN_MAX_BYTES (%d)",
+                            IMAGE_PIN_MAX_BYTES, extra={'url': url})
+                continue
+            _set_pin_owners(path, owners | {str(owner)})
+            if not owners:
+                _pinned_changed(len(data))
+        digests.append(digest)
+    return digests
+
+
+def unpin(urls, owner):
+    """Release `owner`'s hold on images; they can be evicted once nobody holds them"""
+    for url in urls or []:
+        digest = _cached_digest(url)
+        if digest:
+            path = _path('pins', digest)
+            with _pin_lock:
+                owners = _pin_owners(path)
+                if owners and not owners - {str(owner)}:
+                    try:
+                        _pinned_changed(-os.path.getsize(_path('blobs', digest)))
+                    except OSError:
+                        pass
+                _set_pin_owners(path, owners - {str(owner)})
+
+
+def _pinned():
+    pins = set()
+    root = os.path.join(IMAGE_CACHE_DIR, 'pins')
+    if os.path.isdir(root):
+        for prefix in os.listdir(root):
+            pins.update(name for name in os.listdir(os.path.join(root, prefix)) if '.tmp.' not in name)
+    return pins
+
+
+def _cache_files():
+    """[(mtime, size, path, digest)] for every blob and thumbnail"""
+    files = []
+    for kind in ('blobs', 'thumbs'):
+        root = os.path.join(IMAGE_CACHE_DIR, kind)
+        if not os.path.isdir(root):
+            continue
+        for prefix in os.listdir(root):
+            for entry in os.scandir(os.path.join(root, prefix)):
+                if '.tmp.' in entry.name:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path, entry.name.split('-')[0].split('.')[0]))
+    return files
+
+
+def _unpinned_bytes(files, pinned):
+    return sum(size for _, size, _, digest in files if digest not in pinned)
+
+
+def _grew(size):
+    global _cache_bytes
+    with _size_lock:
+        if _cache_bytes is None:
+            _cache_bytes = _unpinned_bytes(_cache_files(), _pinned())
+        _cache_bytes += size
+        over = _cache_bytes > IMAGE_CACHE_MAX_BYTES
+    if over:
+        evict()
+
+
+def evict(max_bytes=None):
+    """
+    Delete least recently used unpinned files until the unpinned bytes are
+    under the low-water mark; returns the unpinned bytes left
+    """
+    global _cache_bytes, _pinned_bytes
+    max_bytes = IMAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _size_lock:
+        files = _cache_files()
+        pinned = _pinned()
+        total = _unpinned_bytes(files, pinned)
+        target = max_bytes * IMAGE_CACHE_LOW_WATER
+        if total > max_bytes:
+            for mtime, size, path, digest in sorted(files):
+                if total <= target:
+                    break
+                if digest in pinned:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                _stats['evicted'] += 1
+        # Pinned files can't be evicted, so they don't count: the next scan
+        # happens only after the unpinned part grows past the bound again
+        _cache_bytes = total
+        _pinned_bytes = sum(f[1] for f in files) - _unpinned_bytes(files, pinned)
+    return total
+
+
+def stats():
+    with _size_lock:
+        size, pinned = _cache_bytes, _pinned_bytes
+    return dict(_stats, bytes=size, pinned_bytes=pinned, max_bytes=IMAGE_CACHE_MAX_BYTES,
+                pin_max_bytes=IMAGE_PIN_MAX_BYTES)
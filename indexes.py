@@ -0,0 +1,334 @@
+"""
+Read-only lookup indexes shared across gunicorn workers.
+
+Indexes are built offline into a compact binary file (sorted keys plus offset
+tables) and memory-mapped read-only by every worker, so N workers share one
+copy of the pages and opening an index costs no parsing. Rebuilds write a
+temp file and os.replace() it into place; readers notice the new inode and
+remap on their next lookup.
+
+File layout (little-endian):
+    header      b'SFIX' | version u32 | count u32 | reserved u32
+    key_offs    (count + 1) x u64, relative to the key blob
+    val_offs    (count + 1) x u64, relative to the value blob
+    key blob    UTF-8 keys, sorted bytewise
+    value blob  compact JSON values
+
+Usage:
+    python indexes.py build [address_blklot|parcel_attrs|rent_inventory_stats|all]
+    python indexes.py info
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+import requests
+
+import logs
+
+log = logs.get_logger('indexes')
+
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+INDEX_DIR = os.path.join(DATA_DIR, 'indexes')
+
+MAGIC = b'SFIX'
+VERSION = 1
+HEADER = struct.Struct('<4sIII')
+OFFSET = struct.Struct('<Q')
+# How often a reader re-stats its file to pick up an atomic swap
+RELOAD_CHECK_SECONDS = 5
+
+
+def index_path(name):
+    return os.path.join(INDEX_DIR, f"{name}.idx")
+
+
+def write_index(path, items):
+    """
+    Write (key, value) pairs to an index file and atomically swap it in.
+    Keys are strings, values anything JSON-serializable. Duplicate keys keep
+    the last value.
+    """
+    entries = {}
+    for key, value in items:
+        entries[key.encode('utf-8')] = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    keys = sorted(entries)
+
+    key_offsets, val_offsets = [0], [0]
+    for key in keys:
+        key_offsets.append(key_offsets[-1] + len(key))
+        val_offsets.append(val_offsets[-1] + len(entries[key]))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys), 0))
+        f.write(struct.pack(f'<{len(key_offsets)}Q', *key_offsets))
+        f.write(struct.pack(f'<{len(val_offsets)}Q', *val_offsets))
+        for key in keys:
+            f.write(key)
+        for key in keys:
+            f.write(entries[key])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(keys)
+
+
+class MappedIndex:
+    """A read-only, memory-mapped sorted key/value index"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} index file")
+        self.count = count
+        self._key_offs = HEADER.size
+        self._val_offs = self._key_offs + (count + 1) * OFFSET.size
+        self._keys = self._val_offs + (count + 1) * OFFSET.size
+        self._vals = self._keys + OFFSET.unpack_from(self._mm, self._key_offs + count * OFFSET.size)[0]
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, table, i):
+        return OFFSET.unpack_from(self._mm, table + i * OFFSET.size)[0]
+
+    def _key(self, i):
+        start = self._keys + self._offset(self._key_offs, i)
+        end = self._keys + self._offset(self._key_offs, i + 1)
+        return self._mm[start:end]
+
+    def _value(self, i):
+        start = self._vals + self._offset(self._val_offs, i)
+        end = self._vals + self._offset(self._val_offs, i + 1)
+        return json.loads(self._mm[start:end])
+
+    def _lower_bound(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, key, default=None):
+        key = key.encode('utf-8')
+        i = self._lower_bound(key)
+        if i < self.count and self._key(i) == key:
+            return self._value(i)
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def prefix(self, prefix, limit=20):
+        """Return up to `limit` (key, value) pairs whose key starts with prefix"""
+        prefix = prefix.encode('utf-8')
+        results = []
+        i = self._lower_bound(prefix)
+        while i < self.count and len(results) < limit:
+            key = self._key(i)
+            if not key.startswith(prefix):
+                break
+            results.append((key.decode('utf-8'), self._value(i)))
+            i += 1
+        return results
+
+    def items(self):
+        for i in range(self.count):
+            yield self._key(i).decode('utf-8'), self._value(i)
+
+
+_open_indexes = {}
+_last_checked = {}
+_lock = threading.Lock()
+
+
+def get_mapped(path, loader):
+    """
+    The file at `path` opened as `loader(path)` (MappedIndex or another
+    memory-mapped reader with an `inode`), or None if it doesn't exist.
+    Shared across threads, and reopened after an atomic rebuild replaces it
+    (checked every RELOAD_CHECK_SECONDS). If the new file won't load, the
+    one already open keeps serving.
+    """
+    now = time.monotonic()
+    mapped = _open_indexes.get(path)
+    if mapped is not None and now - _last_checked.get(path, 0) < RELOAD_CHECK_SECONDS:
+        return mapped
+    with _lock:
+        _last_checked[path] = now
+        try:
+            inode = os.stat(path).st_ino
+        except OSError:
+            _open_indexes.pop(path, None)
+            return None
+        if mapped is None or mapped.inode != inode:
+            try:
+                mapped = loader(path)
+            except Exception as e:
+                log.warning("Index load error: %s", e, extra={'path': path})
+                return _open_indexes.get(path)
+            _open_indexes[path] = mapped
+        return mapped
+
+
+def get_index(name):
+    """
+    Return the mapped index `name`, or None if it hasn't been built.
+    Remaps automatically after an atomic rebuild.
+    """
+    return get_mapped(index_path(name), MappedIndex)
+
+
+def lookup(name, key, default=None):
+    """Look up `key` in index `name`; `default` if the index or key is missing"""
+    index = get_index(name)
+    if index is None:
+        return default
+    return index.get(key, default)
+
+
+def index_info():
+    """Entry counts and file sizes for every built index"""
+    info = {}
+    if os.path.isdir(INDEX_DIR):
+        for filename in sorted(os.listdir(INDEX_DIR)):
+            if filename.endswith('.idx'):
+                name = filename[:-4]
+                index = get_index(name)
+                info[name] = {
+                    'entries': len(index) if index else 0,
+                    'bytes': os.path.getsize(os.path.join(INDEX_DIR, filename)),
+                }
+    return info
+
+
+# ============================================================
+# OFFLINE BUILDERS
+# ============================================================
+
+def iter_dataset_rows(dataset, select=None, where=None, page_size=50000, order=':id'):
+    """Page through every row of a DataSF dataset"""
+    url = f"https://data.sfgov.org/resource/{dataset}.json"
+    offset = 0
+    while True:
+        params = {'$limit': page_size, '$offset': offset, '$order': order}
+        if select:
+            params['$select'] = select
+        if where:
+            params['$where'] = where
+        response = requests.get(url, params=params, timeout=120)
+        response.raise_for_status()
+        rows = response.json()
+        yield from rows
+        if len(rows) < page_size:
+            return
+        offset += page_size
+
+
+def format_blklot(block, lot):
+    """'1234', '5' -> '1234005'"""
+    return f"{str(block).zfill(4)}{str(lot).zfill(3) if lot else ''}"
+
+
+def parcel_address(row):
+    """Normalized street address for a parcel row, or None"""
+    from app import normalize_address
+    if row.get('address'):
+        return normalize_address(row['address'].split(',')[0])
+    if row.get('from_address_num') and row.get('street_name'):
+        return normalize_address(
+            f"{row['from_address_num']} {row['street_name']} {row.get('street_type') or ''}".strip()
+        )
+    return None
+
+
+def build_address_blklot():
+    """Normalized address -> list of blklots (dataset acdm-wktn)"""
+    mapping = {}
+    for row in iter_dataset_rows('acdm-wktn'):
+        address = parcel_address(row)
+        if address and row.get('blklot'):
+            mapping.setdefault(address, set()).add(row['blklot'])
+    return write_index(index_path('address_blklot'),
+                       ((address, sorted(blklots)) for address, blklots in mapping.items()))
+
+
+def build_parcel_attrs():
+    """blklot -> parcel attribute row (dataset acdm-wktn)"""
+    def rows():
+        for row in iter_dataset_rows('acdm-wktn'):
+            if row.get('blklot'):
+                # Geometry is large and unused by the search path
+                row.pop('shape', None)
+                row.pop('the_geom', None)
+                yield row['blklot'], row
+    return write_index(index_path('parcel_attrs'), rows())
+
+
+def build_rent_inventory_stats():
+    """block_num -> rent board inventory summary (dataset gdc7-dmcn)"""
+    stats = {}
+    select = 'block_num,bedroom_count,bathroom_count,square_footage,submission_year'
+    for row in iter_dataset_rows('gdc7-dmcn', select=select):
+        block = row.get('block_num')
+        if not block:
+            continue
+        entry = stats.setdefault(block.zfill(4), {'records': 0, 'units': set(), 'latest_year': 0, 'bedrooms': {}})
+        entry['records'] += 1
+        entry['units'].add((row.get('bedroom_count'), row.get('bathroom_count'), row.get('square_footage')))
+        try:
+            entry['latest_year'] = max(entry['latest_year'], int(row.get('submission_year') or 0))
+        except ValueError:
+            pass
+        bedrooms = row.get('bedroom_count') or 'unknown'
+        entry['bedrooms'][bedrooms] = entry['bedrooms'].get(bedrooms, 0) + 1
+
+    def items():
+        for block, entry in stats.items():
+            entry['units'] = len(entry['units'])
+            yield block, entry
+    return write_index(index_path('rent_inventory_stats'), items())
+
+
+BUILDERS = {
+    'address_blklot': build_address_blklot,
+    'parcel_attrs': build_parcel_attrs,
+    'rent_inventory_stats': build_rent_inventory_stats,
+}
+
+
+def main(argv):
+    if len(argv) >= 1 and argv[0] == 'info':
+        print(json.dumps(index_info(), indent=2))
+        return 0
+    if len(argv) >= 1 and argv[0] == 'build':
+        names = argv[1:] or ['all']
+        if names == ['all']:
+            names = list(BUILDERS)
+        for name in names:
+            if name not in BUILDERS:
+                print(f"Unknown index: {name} (choose from {', '.join(BUILDERS)})")
+                return 2
+            start = time.time()
+            count = BUILDERS[name]()
+            print(f"Built {name}: {count} entries in {time.time() - start:.1f}s -> {index_path(name)}")
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
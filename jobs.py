@@ -0,0 +1,414 @@
+"""
+Durable background jobs: a sqlite-backed queue plus a worker pool.
+
+Web requests only enqueue jobs (enqueue()) and return; a separate worker
+process (`python jobs.py worker`, or gunicorn.conf.py when JOB_WORKERS is set) claims
+queued jobs and runs them on a small thread pool. Failed jobs are retried
+with exponential backoff up to max_attempts. Running jobs heartbeat, so a
+job whose worker died is put back in the queue. Handlers report progress,
+and a cancel request stops a job at its next progress report.
+
+Job kinds (params):
+    crawl         search_url, max_pages, workers, per_host, interval, resolve
+    enrich        input, output, workers, upstream_concurrency, fields
+                  (paths are relative to DATA_DIR/jobs)
+    build_index   names (list, default all)
+    build_geo_index  geojson (optional export, relative to DATA_DIR/jobs)
+    build_tax_history
+    build_comparables
+    link_records
+    build_owners
+
+Usage:
+    python jobs.py worker [--concurrency 2]
+    python jobs.py enqueue KIND '{"param": ...}'
+    python jobs.py list
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+import logs
+from indexes import DATA_DIR
+
+log = logs.get_logger('jobs')
+
+JOBS_DB = os.path.join(DATA_DIR, 'jobs.db')
+JOBS_FILES_DIR = os.path.join(DATA_DIR, 'jobs')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+# Retry n waits BACKOFF_BASE * 2**(n-1) seconds (plus jitter), capped
+BACKOFF_BASE = 10
+BACKOFF_MAX = 600
+POLL_INTERVAL = 1.0
+HEARTBEAT_INTERVAL = 15
+# A running job with no heartbeat for this long is assumed orphaned
+STALE_AFTER = 120
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL,
+    progress_done INTEGER,
+    progress_total INTEGER,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, run_after);
+"""
+
+STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised from a progress report once the job has been cancelled"""
+
+
+_local = threading.local()
+
+
+def connect(path=None):
+    """Per-thread connection to the jobs database (schema created on first use)"""
+    path = path or JOBS_DB
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        conns[path] = conn
+    return conn
+
+
+def job_file(name):
+    """Resolve a job's file parameter inside JOBS_FILES_DIR"""
+    path = os.path.realpath(os.path.join(JOBS_FILES_DIR, name))
+    if not path.startswith(os.path.realpath(JOBS_FILES_DIR) + os.sep):
+        raise ValueError(f"path escapes the jobs directory: {name}")
+    return path
+
+
+# ============================================================
+# HANDLERS
+# ============================================================
+
+def run_crawl(params, progress):
+    import crawler
+    return crawler.crawl(
+        params.get('search_url', crawler.SEARCH_URL),
+        max_pages=int(params.get('max_pages', 5)),
+        workers=int(params.get('workers', 8)),
+        per_host=int(params.get('per_host', 2)),
+        interval=float(params.get('interval', 1.0)),
+        resolve_parcels=bool(params.get('resolve', True)),
+        progress=progress,
+    )
+
+
+def run_enrich(params, progress):
+    import enrich
+    os.makedirs(JOBS_FILES_DIR, exist_ok=True)
+    return enrich.enrich(
+        job_file(params['input']),
+        job_file(params['output']),
+        workers=int(params.get('workers', 4)),
+        upstream_concurrency=int(params.get('upstream_concurrency', 8)),
+        fields=params.get('fields'),
+        progress=progress,
+    )
+
+
+def run_build_index(params, progress):
+    import indexes
+    names = params.get('names') or list(indexes.BUILDERS)
+    unknown = [name for name in names if name not in indexes.BUILDERS]
+    if unknown:
+        raise ValueError(f"unknown index: {', '.join(unknown)}")
+    counts = {}
+    for done, name in enumerate(names):
+        progress(done, len(names), f"building {name}")
+        counts[name] = indexes.BUILDERS[name]()
+    return counts
+
+
+def run_build_geo_index(params, progress):
+    import geoindex
+    geojson = job_file(params['geojson']) if params.get('geojson') else None
+    return {'parcels': geoindex.build_geo_index(geojson)}
+
+
+def run_build_tax_history(params, progress):
+    import taxhistory
+    return {'parcels': taxhistory.build_tax_history()}
+
+
+def run_build_comparables(params, progress):
+    import comparables
+    return {'units': comparables.build_comparables()}
+
+
+def run_link_records(params, progress):
+    import linkage
+    report = linkage.build()
+    return {'keys': report['keys'], 'datasets': report['datasets']}
+
+
+def run_build_owners(params, progress):
+    import owners
+    return owners.build()
+
+
+HANDLERS = {
+    'crawl': run_crawl,
+    'enrich': run_enrich,
+    'build_index': run_build_index,
+    'build_geo_index': run_build_geo_index,
+    'build_tax_history': run_build_tax_history,
+    'build_comparables': run_build_comparables,
+    'link_records': run_link_records,
+    'build_owners': run_build_owners,
+}
+
+
+# ============================================================
+# QUEUE
+# ============================================================
+
+def job_dict(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+
+def enqueue(kind, params=None, max_attempts=None, conn=None):
+    """Queue a job; returns its id. Raises ValueError for unknown kinds."""
+    if kind not in HANDLERS:
+        raise ValueError(f"unknown job kind: {kind} (choose from {', '.join(HANDLERS)})")
+    conn = conn or connect()
+    now = time.time()
+    cursor = conn.execute(
+        'INSERT INTO jobs (kind, params, status, max_attempts, run_after, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        (kind, json.dumps(params or {}), 'queued', max_attempts or JOB_MAX_ATTEMPTS, now, now),
+    )
+    return cursor.lastrowid
+
+
+def get_job(job_id, conn=None):
+    conn = conn or connect()
+    return job_dict(conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+
+def list_jobs(status=None, limit=50, conn=None):
+    conn = conn or connect()
+    if status:
+        rows = conn.execute('SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?', (status, limit))
+    else:
+        rows = conn.execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,))
+    return [job_dict(row) for row in rows]
+
+
+def cancel_job(job_id, conn=None):
+    """Cancel a queued job now, or ask a running one to stop; returns the job"""
+    conn = conn or connect()
+    now = time.time()
+    conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                 (now, job_id))
+    conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+    return get_job(job_id, conn)
+
+
+def claim(conn=None):
+    """Atomically take the next runnable job and mark it running; None if the queue is empty"""
+    conn = conn or connect()
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status = 'queued' AND run_after <= ? ORDER BY run_after, id LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row is None:
+            conn.execute('COMMIT')
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, heartbeat_at = ?, "
+            "error = NULL WHERE id = ?",
+            (now, now, row['id']),
+        )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return get_job(row['id'], conn)
+
+
+def requeue_stale(conn=None):
+    """Put running jobs whose worker stopped heartbeating back in the queue"""
+    conn = conn or connect()
+    cursor = conn.execute(
+        "UPDATE jobs SET status = 'queued', run_after = ? WHERE status = 'running' AND heartbeat_at < ?",
+        (time.time(), time.time() - STALE_AFTER),
+    )
+    return cursor.rowcount
+
+
+def backoff(attempt):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _finish(conn, job, status, result=None, error=None):
+    conn.execute(
+        'UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?',
+        (status, time.time(), json.dumps(result, default=str) if result is not None else None, error, job['id']),
+    )
+
+
+def run_job(job, conn=None):
+    """Run one claimed job to completion, retry or failure"""
+    conn = conn or connect()
+    last_beat = [time.monotonic()]
+
+    def progress(done=None, total=None, message=None):
+        # Called from handler threads too, so use this thread's own connection
+        c = connect()
+        c.execute('UPDATE jobs SET progress_done = ?, progress_total = ?, message = COALESCE(?, message), '
+                  'heartbeat_at = ? WHERE id = ?', (done, total, message, time.time(), job['id']))
+        last_beat[0] = time.monotonic()
+        if c.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job['id'],)).fetchone()[0]:
+            raise JobCancelled()
+
+    stop = threading.Event()
+
+    def heartbeat():
+        # Keeps the job from looking orphaned while a handler runs without reporting
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            if time.monotonic() - last_beat[0] >= HEARTBEAT_INTERVAL:
+                connect().execute('UPDATE jobs SET heartbeat_at = ? WHERE id = ?', (time.time(), job['id']))
+
+    beater = threading.Thread(target=heartbeat, daemon=True, name=f"job-{job['id']}-heartbeat")
+    beater.start()
+    started = time.monotonic()
+    try:
+        result = HANDLERS[job['kind']](job['params'], progress)
+        _finish(conn, job, 'succeeded', result=result)
+        log.info("Job succeeded", extra={'job_id': job['id'], 'kind': job['kind'],
+                                         'seconds': round(time.monotonic() - started, 2)})
+    except JobCancelled:
+        _finish(conn, job, 'cancelled')
+        log.info("Job cancelled", extra={'job_id': job['id'], 'kind': job['kind']})
+    except Exception as e:
+        if job['attempts'] < job['max_attempts'] and not isinstance(e, (ValueError, KeyError)):
+            delay = backoff(job['attempts'])
+            conn.execute("UPDATE jobs SET status = 'queued', run_after = ?, error = ? WHERE id = ?",
+                         (time.time() + delay, str(e), job['id']))
+            log.warning("Job failed, retrying: %s", e, extra={'job_id': job['id'], 'kind': job['kind'],
+                                                               'attempt': job['attempts'], 'retry_in': round(delay, 1)})
+        else:
+            # Bad parameters (ValueError/KeyError) won't succeed on retry
+            _finish(conn, job, 'failed', error=str(e))
+            log.exception("Job failed: %s", e, extra={'job_id': job['id'], 'kind': job['kind']})
+    finally:
+        stop.set()
+
+
+def stats(conn=None):
+    conn = conn or connect()
+    counts = {status: 0 for status in STATUSES}
+    for row in conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+        counts[row[0]] = row[1]
+    return counts
+
+
+# ============================================================
+# WORKER POOL
+# ============================================================
+
+def work(concurrency=None, stop=None):
+    """Run jobs on `concurrency` threads until `stop` is set (forever by default)"""
+    concurrency = concurrency or JOB_WORKERS
+    stop = stop or threading.Event()
+    requeued = requeue_stale()
+    if requeued:
+        log.info("Requeued orphaned jobs", extra={'jobs': requeued})
+    log.info("Job worker started", extra={'concurrency': concurrency, 'db': JOBS_DB})
+
+    def loop():
+        while not stop.is_set():
+            try:
+                job = claim()
+            except sqlite3.OperationalError as e:
+                log.warning("Job claim error: %s", e)
+                job = None
+            if job is None:
+                stop.wait(POLL_INTERVAL)
+                continue
+            run_job(job)
+
+    def reaper():
+        while not stop.wait(STALE_AFTER):
+            requeue_stale()
+
+    threads = [threading.Thread(target=loop, name=f"job-worker-{i}") for i in range(concurrency)]
+    threads.append(threading.Thread(target=reaper, name='job-reaper', daemon=True))
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads[:-1]:
+            while thread.is_alive():
+                thread.join(1)
+    except KeyboardInterrupt:
+        stop.set()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Background job queue')
+    sub = parser.add_subparsers(dest='command')
+    worker = sub.add_parser('worker', help='run queued jobs')
+    worker.add_argument('--concurrency', type=int, default=JOB_WORKERS)
+    add = sub.add_parser('enqueue', help='queue a job')
+    add.add_argument('kind', choices=sorted(HANDLERS))
+    add.add_argument('params', nargs='?', default='{}', help='JSON object of job parameters')
+    sub.add_parser('list', help='show recent jobs')
+    args = parser.parse_args(argv)
+
+    if args.command == 'worker':
+        work(args.concurrency)
+        return 0
+    if args.command == 'enqueue':
+        print(enqueue(args.kind, json.loads(args.params)))
+        return 0
+    if args.command == 'list':
+        for job in list_jobs():
+            print(json.dumps(job))
+        return 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
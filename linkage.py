@@ -0,0 +1,207 @@
+"""
+Offline record linkage: eviction notices, housing complaints and buyout
+agreements -> parcels.
+
+Each record's address is normalized and resolved against the address_blklot
+index. Records with a full street address link to their parcel ("P:<blklot>");
+records the city publishes only at block level ("1200 BLOCK OF SUTTER ST")
+link to that street block ("B:1200 SUTTER ST"), as do street addresses that
+don't resolve to a parcel. Block records are kept apart from the parcel's
+own: they may belong to any building on the block. The result is written as the
+record_links index, so a search becomes two exact key probes instead of
+LIKE scans upstream, plus a link-quality report next to it.
+
+Usage:
+    python linkage.py build
+    python linkage.py report
+"""
+import json
+import os
+import re
+import sys
+import time
+
+import indexes
+import logs
+
+log = logs.get_logger('linkage')
+
+INDEX_NAME = 'record_links'
+REPORT_PATH = os.path.join(indexes.INDEX_DIR, f"{INDEX_NAME}.report.json")
+
+# dataset -> (DataSF id, address field, date field, summary function name in app)
+DATASETS = {
+    'evictions': ('5cei-gny5', 'address', 'file_date', 'eviction_summary'),
+    'complaints': ('7d5q-jf8x', 'block_address', 'date_filed', 'complaint_summary'),
+    'buyouts': ('wmam-7g8d', 'address', 'filing_date', 'buyout_summary'),
+}
+# Records kept per key; counts stay exact
+MAX_RECORDS_PER_KEY = 20
+
+_BLOCK_RE = re.compile(r'^(\d+)\s+BLOCK\s+OF\s+(.+)$')
+_STREET_RE = re.compile(r'^(\d+)[A-Z]?(?:\s*-\s*\d+[A-Z]?)?\s+(.+)$')
+_UNIT_RE = re.compile(r'\s+(?:#|APT\.?|UNIT|STE\.?|SUITE|NO\.?)\s*[\w-]+$')
+_SPACES_RE = re.compile(r'\s+')
+
+
+def block_key(number, street):
+    """Street-block key: '1234', 'SUTTER ST' -> 'B:1200 SUTTER ST'"""
+    return f"B:{(int(number) // 100) * 100} {street}"
+
+
+def address_block_key(normalized_address):
+    """Street-block key for a normalized street address ('1250 SUTTER ST'), or None"""
+    parts = (normalized_address or '').split(' ', 1)
+    if len(parts) == 2 and parts[0].isdigit():
+        return block_key(parts[0], parts[1])
+    return None
+
+
+def parse_address(raw, normalize):
+    """
+    Split a raw dataset address into (kind, number, street), where kind is
+    'street' or 'block'. `normalize` is app.normalize_address. Returns None
+    if the address can't be parsed.
+    """
+    if not raw or not isinstance(raw, str):
+        return None
+    text = _SPACES_RE.sub(' ', raw.upper().split(',')[0]).strip()
+    match = _BLOCK_RE.match(text)
+    kind = 'block'
+    if not match:
+        text = _UNIT_RE.sub('', text)
+        match = _STREET_RE.match(text)
+        kind = 'street'
+    if not match:
+        return None
+    street = normalize(match.group(2).strip())
+    return kind, match.group(1), street
+
+
+def resolve_blklots(number, street, address_index):
+    """
+    Exact address -> blklots (all lots of a condo building), trying the
+    suffix-less form as a unique prefix. Returns (blklots, outcome) where
+    outcome is 'exact', 'prefix', 'ambiguous' or 'unlinked'.
+    """
+    if address_index is None:
+        return [], 'unlinked'
+    blklots = address_index.get(f"{number} {street}")
+    if blklots:
+        return blklots, 'exact'
+    matches = address_index.prefix(f"{number} {street} ", limit=2)
+    if len(matches) == 1:
+        return matches[0][1], 'prefix'
+    return [], 'ambiguous' if matches else 'unlinked'
+
+
+def lookup(blklot=None, normalized_address=None):
+    """
+    Linked records for a parcel, and separately for its street block:
+    {'evictions': [...], 'complaints': [...], 'buyouts': [...], 'counts': {...},
+     'block': {'evictions': [...], ...}, 'block_counts': {...}}.
+    `counts` covers records linked to the parcel itself only. Returns None
+    when the linkage table hasn't been built.
+    """
+    index = indexes.get_index(INDEX_NAME)
+    if index is None:
+        return None
+    parcel = index.get(f"P:{blklot}") if blklot else None
+    key = address_block_key(normalized_address)
+    block = index.get(key) if key else None
+
+    parcel, block = parcel or {}, block or {}
+    linked = {name: list(parcel.get(name, [])) for name in DATASETS}
+    linked['counts'] = {name: parcel.get('counts', {}).get(name, 0) for name in DATASETS}
+    linked['block'] = {name: list(block.get(name, [])) for name in DATASETS}
+    linked['block_counts'] = {name: block.get('counts', {}).get(name, 0) for name in DATASETS}
+    return linked
+
+
+def history(linked, name, limit):
+    """
+    Records to show for a parcel: its own, or when it has none, its street
+    block's, each marked 'match': 'block' (they may belong to a neighbour)
+    """
+    if linked['counts'][name] or not linked['block_counts'][name]:
+        return linked[name][:limit]
+    return [dict(record, match='block') for record in linked['block'][name][:limit]]
+
+
+def build():
+    """Link every record of every dataset and write the index and report"""
+    import app
+    address_index = indexes.get_index('address_blklot')
+    if address_index is None:
+        log.warning("address_blklot index not found; only block-level records will link "
+                    "(run: python indexes.py build address_blklot)")
+
+    links = {}
+    report = {'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'datasets': {}}
+    for name, (dataset, address_field, date_field, summary_name) in DATASETS.items():
+        summarize = getattr(app, summary_name)
+        stats = {'records': 0, 'parcel_exact': 0, 'parcel_prefix': 0, 'block': 0,
+                 'ambiguous': 0, 'unparsed': 0, 'unlinked': 0}
+        for row in indexes.iter_dataset_rows(dataset):
+            stats['records'] += 1
+            parsed = parse_address(row.get(address_field), app.normalize_address)
+            if not parsed:
+                stats['unparsed'] += 1
+                continue
+            kind, number, street = parsed
+            keys = []
+            if kind == 'block':
+                stats['block'] += 1
+            else:
+                blklots, outcome = resolve_blklots(number, street, address_index)
+                keys = [f"P:{blklot}" for blklot in blklots]
+                stats[f"parcel_{outcome}" if blklots else outcome] += 1
+            if not keys:
+                # Block-level records, and unresolved ones so they aren't lost
+                keys = [block_key(number, street)]
+            summary = summarize(row)
+            for key in keys:
+                links.setdefault(key, {}).setdefault(name, []).append(summary)
+
+        linked = stats['parcel_exact'] + stats['parcel_prefix']
+        stats['parcel_link_rate'] = round(linked / stats['records'], 4) if stats['records'] else 0
+        report['datasets'][name] = stats
+        log.info("Linked %s: %s", name, json.dumps(stats))
+
+    def items():
+        for key, entry in links.items():
+            value = {'counts': {}}
+            for name, (_, _, date_field, _) in DATASETS.items():
+                records = sorted(entry.get(name, []), key=lambda r: r.get(date_field) or '', reverse=True)
+                value['counts'][name] = len(records)
+                value[name] = records[:MAX_RECORDS_PER_KEY]
+            yield key, value
+
+    report['keys'] = indexes.write_index(indexes.index_path(INDEX_NAME), items())
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def main(argv):
+    if argv[:1] == ['build']:
+        start = time.time()
+        report = build()
+        for name, stats in report['datasets'].items():
+            print(f"{name}: {json.dumps(stats)}")
+        print(f"Built {INDEX_NAME}: {report['keys']} keys in {time.time() - start:.1f}s -> {REPORT_PATH}")
+        return 0
+    if argv[:1] == ['report']:
+        try:
+            with open(REPORT_PATH) as f:
+                print(f.read())
+        except OSError:
+            print(f"No report at {REPORT_PATH}; run: python linkage.py build")
+            return 1
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
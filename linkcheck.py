@@ -0,0 +1,131 @@
+"""
+Batch liveness checks for saved listing URLs.
+
+Checks run concurrently with bounded parallelism and per-host politeness, and
+each result is cached with a TTL that depends on the outcome (a removed
+listing stays removed, a live one is re-checked sooner).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import logs
+import upstream
+
+log = logs.get_logger('linkcheck')
+
+MAX_CONCURRENCY = int(os.environ.get('LINKCHECK_CONCURRENCY', '8'))
+PER_HOST_CONCURRENCY = 2
+PER_HOST_INTERVAL = 0.5
+MAX_URLS = 200
+# Only listing sites are fetched; any other URL is reported 'unknown' unchecked
+LINKCHECK_HOSTS = tuple(h.strip().lower() for h in os.environ.get('LINKCHECK_HOSTS', 'craigslist.org').split(',')
+                        if h.strip())
+CACHE_MAX_ENTRIES = 5000
+
+# Seconds to cache each status
+STATUS_TTL = {
+    'live': 60 * 60,
+    'removed': 24 * 60 * 60,
+    'expired': 24 * 60 * 60,
+    'unknown': 5 * 60,
+}
+
+# Craigslist serves these pages with a 200 (or 404/410) once a posting is gone
+REMOVED_MARKERS = (
+    'this posting has been deleted',
+    'this posting has been flagged for removal',
+)
+EXPIRED_MARKERS = (
+    'this posting has expired',
+)
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+}
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='linkcheck')
+_host_limiter = upstream.HostLimiter(PER_HOST_CONCURRENCY, PER_HOST_INTERVAL)
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def classify(status_code, text):
+    """Map an HTTP status and page body to live/removed/expired/unknown"""
+    if status_code in (404, 410):
+        lowered = (text or '').lower()
+        if any(marker in lowered for marker in EXPIRED_MARKERS):
+            return 'expired'
+        return 'removed'
+    if status_code != 200:
+        return 'unknown'
+    lowered = (text or '').lower()
+    if any(marker in lowered for marker in REMOVED_MARKERS):
+        return 'removed'
+    if any(marker in lowered for marker in EXPIRED_MARKERS):
+        return 'expired'
+    return 'live'
+
+
+def allowed(url):
+    """True for http(s) URLs on a LINKCHECK_HOSTS domain or one of its subdomains"""
+    parsed = urlparse(url or '')
+    host = (parsed.hostname or '').lower()
+    return parsed.scheme in ('http', 'https') and any(host == h or host.endswith('.' + h) for h in LINKCHECK_HOSTS)
+
+
+def _cached(url):
+    with _cache_lock:
+        entry = _cache.get(url)
+        if entry:
+            _cache.move_to_end(url)
+    if entry and entry['expires_at'] > time.time():
+        return entry
+    return None
+
+
+def check_link(url):
+    """Return {'status', 'http_status', 'checked_at'} for one listing URL"""
+    if not allowed(url):
+        # Never fetched (and not cached), so callers can't probe arbitrary hosts
+        return {'status': 'unknown', 'http_status': None, 'checked_at': time.time()}
+    entry = _cached(url)
+    if entry:
+        return entry
+    http_status = None
+    try:
+        with _host_limiter(url):
+            response = upstream.get(url, headers=HEADERS, cache=False)
+        http_status = response.status_code
+        status = classify(response.status_code, response.text)
+    except Exception as e:
+        log.info("Link check error: %s", e, extra={'url': url})
+        status = 'unknown'
+    now = time.time()
+    entry = {
+        'status': status,
+        'http_status': http_status,
+        'checked_at': now,
+        'expires_at': now + STATUS_TTL[status],
+    }
+    with _cache_lock:
+        _cache[url] = entry
+        _cache.move_to_end(url)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return entry
+
+
+def check_links(urls):
+    """Check many URLs concurrently; returns {url: result}"""
+    unique = list(dict.fromkeys(u for u in urls if u))[:MAX_URLS]
+    results = dict(zip(unique, _executor.map(check_link, unique)))
+    return {
+        url: {'status': r['status'], 'http_status': r['http_status'], 'checked_at': r['checked_at']}
+        for url, r in results.items()
+    }
@@ -0,0 +1,294 @@
+"""
+Craigslist listing HTML -> amenities dict.
+
+This module has no Flask dependency so it can run in worker processes. With
+LISTING_PARSE_MODE=process, parse_listing_html() ships the raw HTML to a
+process pool and gets the amenities dict back, so BeautifulSoup tree building
+and amenity matching don't hold the web worker's GIL. The pool sits behind a
+bounded queue and every parse has a timeout. A parse that times out can't be
+cancelled once it's running, so the pool is replaced and its processes killed.
+"""
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import logs
+import profiling
+import reposts
+
+log = logs.get_logger('listing_parser')
+
+PARSE_MODE = os.environ.get('LISTING_PARSE_MODE', 'inline')  # 'inline' or 'process'
+PARSE_WORKERS = int(os.environ.get('LISTING_PARSE_WORKERS', str(os.cpu_count() or 2)))
+# Parses queued or running at once; more than this are rejected
+PARSE_QUEUE_LIMIT = int(os.environ.get('LISTING_PARSE_QUEUE_LIMIT', str(PARSE_WORKERS * 4)))
+PARSE_TIMEOUT = float(os.environ.get('LISTING_PARSE_TIMEOUT', '10'))
+
+
+BEDROOMS_RE = re.compile(r'(\d+)\s*br', re.I)
+BATHROOMS_RE = re.compile(r'(\d+(?:\.\d+)?)\s*ba', re.I)
+SQFT_RE = re.compile(r'(\d+)\s*ft', re.I)
+
+
+class ParseQueueFull(Exception):
+    """The process pool's bounded queue has no free slot"""
+
+
+def empty_amenities():
+    """Amenities dict with every field unset"""
+    return {
+        'parking': None,
+        'laundry': None,
+        'pets_allowed': None,
+        'furnished': None,
+        'smoking': None,
+        'wheelchair_accessible': None,
+        'air_conditioning': None,
+        'ev_charging': None,
+        'listing_title': None,
+        'listing_price': None,
+        'listing_sqft': None,
+        'listing_bedrooms': None,
+        'listing_bathrooms': None,
+        'listing_available_date': None,
+        'listing_latitude': None,
+        'listing_longitude': None,
+        'listing_simhash': None,
+        'listing_images': []
+    }
+
+
+def match_amenities(attr_texts, amenities):
+    """Set parking, laundry, pets, ... in `amenities` from a listing's attribute texts"""
+    for raw_text in attr_texts:
+        text = raw_text.lower()
+        
+        # Parking detection
+        if 'carport' in text:
+            amenities['parking'] = 'Carport'
+        elif 'attached garage' in text:
+            amenities['parking'] = 'Attached Garage'
+        elif 'detached garage' in text:
+            amenities['parking'] = 'Detached Garage'
+        elif 'off-street parking' in text:
+            amenities['parking'] = 'Off-street Parking'
+        elif 'street parking' in text:
+            amenities['parking'] = 'Street Parking'
+        elif 'valet parking' in text:
+            amenities['parking'] = 'Valet Parking'
+        elif 'no parking' in text:
+            amenities['parking'] = 'No Parking'
+        
+        # Laundry detection
+        if 'w/d in unit' in text or 'washer/dryer in unit' in text or 'wd in unit' in text:
+            amenities['laundry'] = 'In-unit W/D'
+        elif 'w/d hookups' in text or 'washer/dryer hookups' in text:
+            amenities['laundry'] = 'W/D Hookups'
+        elif 'laundry in bldg' in text or 'laundry on site' in text:
+            amenities['laundry'] = 'Shared Laundry'
+        elif 'no laundry' in text:
+            amenities['laundry'] = 'No Laundry'
+        
+        # Pets
+        if 'cats are ok' in text and 'dogs are ok' in text:
+            amenities['pets_allowed'] = 'Cats & Dogs OK'
+        elif 'cats are ok' in text:
+            amenities['pets_allowed'] = 'Cats OK'
+        elif 'dogs are ok' in text:
+            amenities['pets_allowed'] = 'Dogs OK'
+        elif 'no pets' in text:
+            amenities['pets_allowed'] = 'No Pets'
+        
+        # Furnished
+        if 'furnished' in text and 'unfurnished' not in text:
+            amenities['furnished'] = 'Yes'
+        elif 'unfurnished' in text:
+            amenities['furnished'] = 'No'
+        
+        # Smoking
+        if 'no smoking' in text:
+            amenities['smoking'] = 'No Smoking'
+        
+        # Wheelchair accessible
+        if 'wheelchair accessible' in text:
+            amenities['wheelchair_accessible'] = 'Yes'
+        
+        # Air conditioning
+        if 'air conditioning' in text or 'a/c' in text:
+            amenities['air_conditioning'] = 'Yes'
+        
+        # EV charging
+        if 'ev charging' in text:
+            amenities['ev_charging'] = 'Yes'
+
+
+def parse_craigslist_html(html):
+    """Extract amenities from the HTML of a Craigslist listing page"""
+    amenities = empty_amenities()
+    
+    try:
+        # Imported lazily so BeautifulSoup/lxml don't slow down cold starts
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'lxml')
+        
+        # Get listing title
+        title_elem = soup.find('span', id='titletextonly')
+        if title_elem:
+            amenities['listing_title'] = title_elem.get_text(strip=True)
+        
+        # Get price
+        price_elem = soup.find('span', class_='price')
+        if price_elem:
+            amenities['listing_price'] = price_elem.get_text(strip=True)
+        
+        # Get housing info (bedrooms, sqft)
+        housing_elem = soup.find('span', class_='housing')
+        if housing_elem:
+            housing_text = housing_elem.get_text(strip=True)
+            # Parse bedrooms (e.g., "2br")
+            br_match = BEDROOMS_RE.search(housing_text)
+            if br_match:
+                amenities['listing_bedrooms'] = br_match.group(1)
+            # Parse bathrooms (e.g., "1ba")
+            ba_match = BATHROOMS_RE.search(housing_text)
+            if ba_match:
+                amenities['listing_bathrooms'] = ba_match.group(1)
+            # Parse sqft
+            sqft_match = SQFT_RE.search(housing_text)
+            if sqft_match:
+                amenities['listing_sqft'] = sqft_match.group(1)
+        
+        # Get attribute groups (parking, laundry, etc.) - handle newer Craigslist markup
+        attr_groups = soup.select('.attrgroup, .mapAndAttrs, .attr')
+        attr_texts = []
+        for group in attr_groups:
+            # Collect text from spans and links inside each group
+            for node in group.find_all(['span', 'a', 'div']):
+                text = node.get_text(strip=True)
+                if text:
+                    attr_texts.append(text)
+        # Fallback to generic attrgroup spans if nothing found
+        if not attr_texts:
+            for span in soup.find_all('span'):
+                text = span.get_text(strip=True)
+                if text:
+                    attr_texts.append(text)
+
+        match_amenities(attr_texts, amenities)
+        
+        # Get available date
+        avail_elem = soup.find('span', class_='property_date')
+        if avail_elem:
+            amenities['listing_available_date'] = avail_elem.get('data-date', avail_elem.get_text(strip=True))
+        
+        # Map position (present even when the posting has no street address)
+        map_elem = soup.find(id='map')
+        if map_elem and map_elem.get('data-latitude') and map_elem.get('data-longitude'):
+            try:
+                amenities['listing_latitude'] = float(map_elem['data-latitude'])
+                amenities['listing_longitude'] = float(map_elem['data-longitude'])
+            except ValueError:
+                pass
+        
+        # Text fingerprint for repost detection
+        body_elem = soup.find(id='postingbody')
+        body = body_elem.get_text(' ', strip=True) if body_elem else ''
+        amenities['listing_simhash'] = reposts.simhash(f"{amenities['listing_title'] or ''} {body}")
+        
+        # Get images
+        thumbs = soup.find_all('a', class_='thumb')
+        for thumb in thumbs[:5]:  # Limit to 5 images
+            href = thumb.get('href')
+            if href:
+                amenities['listing_images'].append(href)
+        
+    except Exception as e:
+        log.warning("Craigslist parsing error: %s", e)
+    
+    return amenities
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PARSE_QUEUE_LIMIT)
+_stats = {'inline': 0, 'process': 0, 'timeouts': 0, 'rejected': 0, 'recycled': 0}
+
+
+def _get_pool():
+    global _pool
+    pool = _pool
+    if pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # forkserver children start from a clean process instead of
+                # forking a multi-threaded web worker
+                try:
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(['listing_parser', 'bs4', 'lxml.etree'])
+                except ValueError:
+                    context = multiprocessing.get_context('spawn')
+                _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=context)
+            pool = _pool
+    return pool
+
+
+def _recycle_pool(pool):
+    """Swap out `pool` for a fresh one and kill its processes (a stuck parse can't be cancelled)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    _stats['recycled'] += 1
+    log.warning("Recycling listing parse pool after a timeout")
+    # Other parses still running on it fail with BrokenProcessPool and are retried on the new pool
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_listing_html(html, mode=None):
+    """
+    Parse listing HTML inline or in the process pool, depending on `mode`
+    (default LISTING_PARSE_MODE). Raises ParseQueueFull or TimeoutError in
+    process mode when the pool is saturated or a parse takes too long.
+    """
+    mode = mode or PARSE_MODE
+    with profiling.phase('parse_listing', mode):
+        return _parse(html, mode)
+
+
+def _parse(html, mode):
+    if mode != 'process':
+        _stats['inline'] += 1
+        return parse_craigslist_html(html)
+
+    if not _slots.acquire(blocking=False):
+        _stats['rejected'] += 1
+        raise ParseQueueFull(f"{PARSE_QUEUE_LIMIT} parses already queued")
+    _stats['process'] += 1
+    try:
+        for attempt in range(2):
+            pool = _get_pool()
+            try:
+                return pool.submit(parse_craigslist_html, html).result(timeout=PARSE_TIMEOUT)
+            except FutureTimeoutError:
+                _stats['timeouts'] += 1
+                _recycle_pool(pool)
+                raise TimeoutError(f"listing parse exceeded {PARSE_TIMEOUT}s")
+            except (BrokenProcessPool, RuntimeError):
+                # The pool was recycled under this parse (another parse timed
+                # out); retry once on the fresh one
+                _recycle_pool(pool)
+                if attempt:
+                    raise
+    finally:
+        # The parse's process is done or killed, so its slot is free
+        _slots.release()
+
+
+def stats():
+    return dict(_stats, mode=PARSE_MODE, workers=PARSE_WORKERS, queue_limit=PARSE_QUEUE_LIMIT)
@@ -0,0 +1,173 @@
+"""
+Local index of crawled Craigslist listings, joined to parcels.
+
+Listings live in a sqlite table under DATA_DIR with indexes on the columns
+searches filter by (price, bedrooms, amenities, rent-control status, blklot).
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from indexes import DATA_DIR
+
+LISTINGS_DB = os.path.join(DATA_DIR, 'listings.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    url TEXT PRIMARY KEY,
+    title TEXT,
+    price INTEGER,
+    bedrooms REAL,
+    bathrooms REAL,
+    sqft INTEGER,
+    parking TEXT,
+    laundry TEXT,
+    pets_allowed TEXT,
+    furnished TEXT,
+    address TEXT,
+    blklot TEXT,
+    rent_controlled TEXT,
+    amenities TEXT,
+    crawled_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_listings_price ON listings (price);
+CREATE INDEX IF NOT EXISTS idx_listings_bedrooms ON listings (bedrooms, price);
+CREATE INDEX IF NOT EXISTS idx_listings_blklot ON listings (blklot);
+CREATE INDEX IF NOT EXISTS idx_listings_rent_controlled ON listings (rent_controlled, price);
+CREATE INDEX IF NOT EXISTS idx_listings_laundry ON listings (laundry);
+CREATE INDEX IF NOT EXISTS idx_listings_parking ON listings (parking);
+CREATE INDEX IF NOT EXISTS idx_listings_pets ON listings (pets_allowed);
+"""
+
+# Query-string filter -> column for exact-match amenity filters
+AMENITY_FILTERS = {
+    'parking': 'parking',
+    'laundry': 'laundry',
+    'pets_allowed': 'pets_allowed',
+    'furnished': 'furnished',
+}
+
+# rent_controlled filter -> LIKE patterns for the values app.rent_control_from_year_built and the
+# Rent Board check store ('Likely No (Built after 1979)', 'Yes (Verified by Rent Board)');
+# 'Unknown' matches neither
+RENT_CONTROL_PATTERNS = {
+    'yes': ('Yes', 'Yes (%', 'Likely Yes%'),
+    'no': ('No', 'No (%', 'Likely No%'),
+}
+
+_local = threading.local()
+_NUMBER_RE = re.compile(r'[\d.]+')
+
+
+def connect(path=None):
+    """Per-thread connection to the listings database (schema created on first use)"""
+    path = path or LISTINGS_DB
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        conns[path] = conn
+    return conn
+
+
+def _number(value, cast=float):
+    if value is None:
+        return None
+    match = _NUMBER_RE.search(str(value).replace(',', ''))
+    if not match:
+        return None
+    try:
+        return cast(float(match.group(0)))
+    except ValueError:
+        return None
+
+
+def upsert_listing(url, amenities, address=None, blklot=None, rent_controlled=None, conn=None):
+    """Insert or refresh one parsed listing"""
+    conn = conn or connect()
+    conn.execute(
+        """INSERT OR REPLACE INTO listings
+           (url, title, price, bedrooms, bathrooms, sqft, parking, laundry, pets_allowed,
+            furnished, address, blklot, rent_controlled, amenities, crawled_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (
+            url,
+            amenities.get('listing_title'),
+            _number(amenities.get('listing_price'), int),
+            _number(amenities.get('listing_bedrooms')),
+            _number(amenities.get('listing_bathrooms')),
+            _number(amenities.get('listing_sqft'), int),
+            amenities.get('parking'),
+            amenities.get('laundry'),
+            amenities.get('pets_allowed'),
+            amenities.get('furnished'),
+            address,
+            blklot,
+            rent_controlled,
+            json.dumps(amenities),
+            datetime.now().isoformat(),
+        ),
+    )
+    conn.commit()
+
+
+def query_listings(filters, limit=100, conn=None):
+    """
+    Filter the listing index. Supported filters: min_price, max_price,
+    min_bedrooms, max_bedrooms, rent_controlled ('yes'/'no'), blklot, and
+    exact-match parking/laundry/pets_allowed/furnished.
+    """
+    conn = conn or connect()
+    clauses, params = [], []
+    if filters.get('min_price'):
+        clauses.append('price >= ?')
+        params.append(int(filters['min_price']))
+    if filters.get('max_price'):
+        clauses.append('price <= ?')
+        params.append(int(filters['max_price']))
+    if filters.get('min_bedrooms'):
+        clauses.append('bedrooms >= ?')
+        params.append(float(filters['min_bedrooms']))
+    if filters.get('max_bedrooms'):
+        clauses.append('bedrooms <= ?')
+        params.append(float(filters['max_bedrooms']))
+    if filters.get('blklot'):
+        clauses.append('blklot = ?')
+        params.append(filters['blklot'])
+    rent_controlled = (filters.get('rent_controlled') or '').lower()
+    rent_controlled = {'true': 'yes', '1': 'yes', 'false': 'no', '0': 'no'}.get(rent_controlled, rent_controlled)
+    if rent_controlled in RENT_CONTROL_PATTERNS:
+        patterns = RENT_CONTROL_PATTERNS[rent_controlled]
+        clauses.append('(' + ' OR '.join(['rent_controlled LIKE ?'] * len(patterns)) + ')')
+        params.extend(patterns)
+    for name, column in AMENITY_FILTERS.items():
+        if filters.get(name):
+            clauses.append(f"{column} = ?")
+            params.append(filters[name])
+
+    sql = 'SELECT * FROM listings'
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    sql += ' ORDER BY price IS NULL, price LIMIT ?'
+    params.append(int(limit))
+
+    results = []
+    for row in conn.execute(sql, params):
+        listing = dict(row)
+        listing['amenities'] = json.loads(listing['amenities']) if listing['amenities'] else {}
+        results.append(listing)
+    return results
+
+
+def listing_count(conn=None):
+    conn = conn or connect()
+    return conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0]
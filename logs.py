@@ -0,0 +1,193 @@
+"""
+Structured, non-blocking logging.
+
+Loggers under "sfra" hand records to a bounded in-memory queue. A background
+listener thread writes them to stdout as one JSON object per line, so a
+request thread never blocks on stdout. If the queue is full, records are
+dropped and counted rather than blocking. Each line carries the current
+request id, and extra fields passed to the log call (dataset, seconds,
+status, ...) become JSON keys.
+
+Configuration:
+    LOG_LEVEL=INFO                          default level for sfra.* loggers
+    LOG_LEVELS=upstream=DEBUG,app=WARNING   per-logger overrides
+    LOG_DEBUG_SAMPLE=1.0                    fraction of requests whose DEBUG lines are kept
+    LOG_FORMAT=json|text
+    LOG_QUEUE_SIZE=10000
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_DEBUG_SAMPLE = float(os.environ.get('LOG_DEBUG_SAMPLE', '1.0'))
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
+ROOT_LOGGER = 'sfra'
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_debug_sampled = contextvars.ContextVar('debug_sampled', default=None)
+_timings = contextvars.ContextVar('timings', default=None)
+_dropped = 0
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        extras = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+        if extras:
+            line += ' ' + ' '.join(f"{k}={v}" for k, v in extras.items())
+        return line
+
+
+class _LineHandler(logging.StreamHandler):
+    """Writes each record with a single write() so lines from workers don't interleave"""
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + '\n')
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue without blocking; count and drop records when the queue is full"""
+
+    def prepare(self, record):
+        # Format the message and exception on the calling thread, keep extras
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+
+class _ContextFilter(logging.Filter):
+    """Stamp the request id and apply per-request DEBUG sampling"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        if record.levelno <= logging.DEBUG and LOG_DEBUG_SAMPLE < 1.0:
+            sampled = _debug_sampled.get()
+            if sampled is None:
+                sampled = random.random() < LOG_DEBUG_SAMPLE
+            return sampled
+        return True
+
+
+def configure():
+    """Install the queue handler and start the writer thread (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    for item in filter(None, (part.strip() for part in LOG_LEVELS.split(','))):
+        name, _, level = item.partition('=')
+        logging.getLogger(f"{ROOT_LOGGER}.{name.strip()}").setLevel(level.strip().upper())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = _DroppingQueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+    root.addHandler(handler)
+
+    writer = _LineHandler(sys.stdout)
+    if LOG_FORMAT == 'text':
+        writer.setFormatter(TextFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    else:
+        writer.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    """Logger "sfra.<name>"; configures logging on first use"""
+    configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def start_request(request_id=None):
+    """Bind a request id (generated if not given) and decide DEBUG sampling"""
+    request_id = (request_id or uuid.uuid4().hex[:16])[:64]
+    _request_id.set(request_id)
+    _debug_sampled.set(LOG_DEBUG_SAMPLE >= 1.0 or random.random() < LOG_DEBUG_SAMPLE)
+    _timings.set({'started': time.perf_counter(), 'sources': {}})
+    return request_id
+
+
+def request_timings():
+    """(seconds so far, {source: {calls, seconds}}) for the current request"""
+    timings = _timings.get()
+    if timings is None:
+        return None, {}
+    return round(time.perf_counter() - timings['started'], 4), timings['sources']
+
+
+def end_request():
+    _request_id.set(None)
+    _debug_sampled.set(None)
+    _timings.set(None)
+
+
+def add_timing(source, seconds):
+    """Accumulate an upstream call's time against the current request"""
+    timings = _timings.get()
+    if timings is None:
+        return
+    entry = timings['sources'].setdefault(source, {'calls': 0, 'seconds': 0.0})
+    entry['calls'] += 1
+    entry['seconds'] = round(entry['seconds'] + seconds, 4)
+
+
+def request_id():
+    return _request_id.get()
+
+
+def stats():
+    return {'dropped': _dropped, 'queued': _listener.queue.qsize() if _listener else 0}
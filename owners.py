@@ -0,0 +1,180 @@
+"""
+Offline owner portfolios: every parcel held by the same owner, with
+eviction, complaint and buyout rollups across the portfolio.
+
+Owner names from the parcel rows (acdm-wktn) are normalized so spelling
+variants of one entity share a key: 'Sutter Holdings, L.L.C.' and
+'SUTTER HOLDINGS LLC' both become the owner id 'sutter-holdings-llc'. Each
+parcel's eviction/complaint/buyout counts and latest dates come from the
+record_links table. Block-level records can't be attributed to one owner,
+so they're rolled up apart as block_<kind>: the records of each distinct
+street block holding a portfolio parcel with no parcel-level links of that
+kind (otherwise those parcels would read as 0). Two indexes are written:
+
+    owner_portfolios  owner id -> owner name, rollup, parcels (first MAX_PARCELS_LISTED)
+    parcel_owner      blklot -> owner id
+
+so both the /api/owners/<id> endpoint and the portfolio summary in search
+results are a single key probe. Build it after `linkage.py build`.
+
+Usage:
+    python owners.py build
+    python owners.py show OWNER_ID
+"""
+import json
+import re
+import sys
+import time
+
+import indexes
+import linkage
+import logs
+
+log = logs.get_logger('owners')
+
+PORTFOLIO_INDEX = 'owner_portfolios'
+PARCEL_OWNER_INDEX = 'parcel_owner'
+# Parcels listed per owner in /api/owners/<id>; rollups always cover them all
+MAX_PARCELS_LISTED = 500
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s&]")
+_SPACES_RE = re.compile(r'\s+')
+_SLUG_RE = re.compile(r'[^a-z0-9]+')
+# Entity designations spelled several ways on the roll
+_SUFFIXES = {
+    'L L C': 'LLC', 'LIMITED LIABILITY COMPANY': 'LLC', 'L P': 'LP', 'LIMITED PARTNERSHIP': 'LP',
+    'INCORPORATED': 'INC', 'CORPORATION': 'CORP', 'COMPANY': 'CO', 'TRUSTEE': 'TR', 'TRUST': 'TR',
+}
+_SUFFIX_RE = re.compile(r'\b(' + '|'.join(sorted(_SUFFIXES, key=len, reverse=True)) + r')\b')
+
+
+def normalize_owner(name):
+    """'Sutter Holdings, L.L.C.' -> 'SUTTER HOLDINGS LLC'; None for blank names"""
+    if isinstance(name, list):
+        name = ', '.join(name)
+    if not name or not isinstance(name, str):
+        return None
+    text = _PUNCTUATION_RE.sub(' ', name.upper().replace('.', ''))
+    text = _SPACES_RE.sub(' ', text).strip()
+    text = _SUFFIX_RE.sub(lambda m: _SUFFIXES[m.group(1)], text)
+    if text.startswith('THE '):
+        text = text[4:]
+    return text or None
+
+
+def owner_id(name):
+    """URL-safe key for an owner name: 'SUTTER HOLDINGS LLC' -> 'sutter-holdings-llc'"""
+    normalized = normalize_owner(name)
+    if not normalized:
+        return None
+    return _SLUG_RE.sub('-', normalized.lower().replace('&', ' and ')).strip('-') or None
+
+
+def _units(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def portfolio_summary(entry):
+    """The rollup part of an owner_portfolios entry, for search results"""
+    return dict(entry['rollup'], owner_id=entry['owner_id'], owner=entry['owner'])
+
+
+def lookup(owner):
+    """Full portfolio for an owner id, or None (also when the index hasn't been built)"""
+    return indexes.lookup(PORTFOLIO_INDEX, owner)
+
+
+def lookup_parcel(blklot):
+    """Portfolio summary for the owner of `blklot`, or None"""
+    owner = indexes.lookup(PARCEL_OWNER_INDEX, blklot)
+    entry = lookup(owner) if owner else None
+    return portfolio_summary(entry) if entry else None
+
+
+def iter_parcel_rows():
+    """Parcel rows from the local parcel_attrs index when built, else from DataSF"""
+    local = indexes.get_index('parcel_attrs')
+    if local is not None:
+        for _, row in local.items():
+            yield row
+        return
+    yield from indexes.iter_dataset_rows('acdm-wktn', select='blklot,owner,address,from_address_num,'
+                                                              'street_name,street_type,number_of_units')
+
+
+def build():
+    """Group parcels by owner, roll up their linked records and write both indexes"""
+    links = indexes.get_index(linkage.INDEX_NAME)
+    if links is None:
+        log.warning("%s index not found; portfolios will have no record counts (run: python linkage.py build)",
+                    linkage.INDEX_NAME)
+
+    portfolios, parcel_owner = {}, {}
+    for row in iter_parcel_rows():
+        blklot = row.get('blklot')
+        oid = owner_id(row.get('owner'))
+        if not blklot or not oid:
+            continue
+        entry = portfolios.setdefault(oid, {'owner_id': oid, 'owner': normalize_owner(row.get('owner')),
+                                            'parcels': {}})
+        entry['parcels'][blklot] = {'blklot': blklot, 'address': indexes.parcel_address(row),
+                                    'units': _units(row.get('number_of_units')),
+                                    **dict.fromkeys(linkage.DATASETS, 0)}
+        parcel_owner[blklot] = oid
+
+    def items():
+        for oid, entry in portfolios.items():
+            rollup = {'parcels': len(entry['parcels']), 'units': 0}
+            for name in linkage.DATASETS:
+                rollup[name] = 0
+                rollup[f"parcels_with_{name}"] = 0
+                rollup[f"last_{name}"] = None
+                rollup[f"block_{name}"] = 0
+            counted_blocks = {name: set() for name in linkage.DATASETS}
+            parcels = sorted(entry['parcels'].values(), key=lambda p: (-p['units'], p['blklot']))
+            for parcel in parcels:
+                rollup['units'] += parcel['units']
+                if links is None:
+                    continue
+                linked = links.get(f"P:{parcel['blklot']}") or {}
+                block = linkage.address_block_key(parcel['address'])
+                for name, (_, _, date_field, _) in linkage.DATASETS.items():
+                    count = linked.get('counts', {}).get(name, 0)
+                    if not count and block and block not in counted_blocks[name]:
+                        counted_blocks[name].add(block)
+                        rollup[f"block_{name}"] += (links.get(block) or {}).get('counts', {}).get(name, 0)
+                    parcel[name] = count
+                    rollup[name] += count
+                    if count:
+                        rollup[f"parcels_with_{name}"] += 1
+                    records = linked.get(name) or []
+                    latest = records[0].get(date_field) if records else None
+                    if latest and latest != 'Unknown' and latest > (rollup[f"last_{name}"] or ''):
+                        rollup[f"last_{name}"] = latest
+            yield oid, {'owner_id': oid, 'owner': entry['owner'], 'rollup': rollup,
+                        'parcels': parcels[:MAX_PARCELS_LISTED]}
+
+    owners = indexes.write_index(indexes.index_path(PORTFOLIO_INDEX), items())
+    indexes.write_index(indexes.index_path(PARCEL_OWNER_INDEX), parcel_owner.items())
+    return {'owners': owners, 'parcels': len(parcel_owner)}
+
+
+def main(argv):
+    if argv[:1] == ['build']:
+        start = time.time()
+        result = build()
+        print(f"Built {PORTFOLIO_INDEX}: {result['owners']} owners, {result['parcels']} parcels "
+              f"in {time.time() - start:.1f}s")
+        return 0
+    if len(argv) == 2 and argv[0] == 'show':
+        print(json.dumps(lookup(argv[1]), indent=2))
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
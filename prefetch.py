@@ -0,0 +1,138 @@
+"""
+Speculative prefetch for searches the user is about to run.
+
+The search form calls /api/prefetch when an address suggestion is picked or a
+listing URL is pasted. The work runs on a small background pool and only
+warms caches (listing parse, parcel lookup, dataset queries), so the real
+search that follows mostly hits them. Each client (the caller's address)
+has at most PREFETCH_PER_CLIENT jobs running, however many sessions
+(client_id values, one per browser tab) it sends. Sessions only pick which
+jobs are superseded or cancelled: a new prefetch from a session supersedes
+that session's older ones, and jobs check for cancellation between stages.
+"""
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import logs
+
+log = logs.get_logger('prefetch')
+
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', '4'))
+PREFETCH_PER_CLIENT = int(os.environ.get('PREFETCH_PER_CLIENT', '2'))
+# Jobs queued or running across all clients before new ones are rejected
+PREFETCH_MAX_PENDING = int(os.environ.get('PREFETCH_MAX_PENDING', '32'))
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='prefetch')
+# Re-entrant: cancelling a queued job runs its done callback synchronously
+_lock = threading.RLock()
+_jobs = {}
+_ids = itertools.count(1)
+_counters = {'started': 0, 'completed': 0, 'cancelled': 0, 'rejected': 0, 'errors': 0, 'deduplicated': 0}
+
+
+class Cancelled(Exception):
+    """Raised by PrefetchJob.checkpoint() once the job has been cancelled"""
+
+
+class PrefetchJob:
+    def __init__(self, client, session, key):
+        self.id = next(_ids)
+        self.client = client
+        self.session = session
+        self.key = key
+        self.cancelled = threading.Event()
+        self.future = None
+        self.stage = 'queued'
+        self.created = time.monotonic()
+
+    def checkpoint(self, stage):
+        """Mark the next stage, or stop here if the client moved on"""
+        if self.cancelled.is_set():
+            raise Cancelled()
+        self.stage = stage
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+def _pending():
+    return sum(len(jobs) for jobs in _jobs.values())
+
+
+def _run(job, work):
+    try:
+        job.checkpoint('started')
+        work(job)
+        _counters['completed'] += 1
+    except Cancelled:
+        _counters['cancelled'] += 1
+    except Exception as e:
+        _counters['errors'] += 1
+        log.warning("Prefetch error: %s", e, extra={'key': job.key})
+    finally:
+        _finish(job)
+
+
+def _finish(job):
+    with _lock:
+        jobs = _jobs.get(job.client, [])
+        if job in jobs:
+            jobs.remove(job)
+        if not jobs:
+            _jobs.pop(job.client, None)
+
+
+def submit(client, session, key, work):
+    """
+    Start `work(job)` in the background for `client`. Older jobs from the same
+    session are cancelled. Returns the job (an identical running job is
+    reused), or None if the client or the server is at its prefetch cap.
+    """
+    with _lock:
+        jobs = _jobs.setdefault(client, [])
+        for existing in jobs:
+            if existing.key == key and not existing.cancelled.is_set():
+                _counters['deduplicated'] += 1
+                return existing
+        for existing in [j for j in jobs if j.session == session]:
+            existing.cancel()
+        jobs = _jobs.setdefault(client, [])
+        # Jobs cancelled mid-stage stay listed until they reach a checkpoint,
+        # since they still hold a worker
+        if len(jobs) >= PREFETCH_PER_CLIENT or _pending() >= PREFETCH_MAX_PENDING:
+            _counters['rejected'] += 1
+            if not jobs:
+                _jobs.pop(client, None)
+            return None
+        job = PrefetchJob(client, session, key)
+        jobs.append(job)
+        _counters['started'] += 1
+    job.future = _executor.submit(_run, job, work)
+    job.future.add_done_callback(lambda future: _on_done(job, future))
+    return job
+
+
+def _on_done(job, future):
+    # A job cancelled while still queued never reaches _run
+    if future.cancelled():
+        _counters['cancelled'] += 1
+        _finish(job)
+
+
+def cancel(client, session):
+    """Cancel `client`'s prefetches for `session`; returns how many were cancelled"""
+    with _lock:
+        jobs = [j for j in _jobs.get(client, []) if j.session == session and not j.cancelled.is_set()]
+    for job in jobs:
+        job.cancel()
+    return len(jobs)
+
+
+def stats():
+    with _lock:
+        return dict(_counters, pending=_pending(), clients=len(_jobs))
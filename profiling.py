@@ -0,0 +1,211 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries the admin token (X-Profile-Token header
+or ?profile=<token>) or is picked by PROFILE_SAMPLE_RATE. A profiled request
+records per-phase wall timings (upstream calls, listing parsing, and the
+stages of get_property_details) and, if no other request is being profiled
+at the moment, a cProfile of the request thread. Finished profiles go into
+a ring buffer of the last PROFILE_BUFFER_SIZE that /admin/profiles serves.
+
+With no token and a zero sample rate, ENABLED is False, the Flask hooks are
+not registered, and phase()/mark() return right away.
+"""
+import cProfile
+import hmac
+import io
+import itertools
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE', '50'))
+# Functions listed in each stored cProfile summary
+PROFILE_TOP_FUNCTIONS = 40
+
+ENABLED = bool(PROFILE_ADMIN_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+_local = threading.local()
+_profiles = deque(maxlen=PROFILE_BUFFER_SIZE)
+_profiles_lock = threading.Lock()
+# Only one cProfile can be active per process (sys.monitoring on 3.12+)
+_cprofile_lock = threading.Lock()
+_ids = itertools.count(1)
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def note(self, **info):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class RequestProfile:
+    def __init__(self, method, path, reason):
+        self.id = next(_ids)
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.phases = []
+        self.last_mark = None
+        self.profiler = None
+        self.status = None
+        self.seconds = None
+        self.cprofile = None
+
+    def add_phase(self, name, detail, started, seconds):
+        self.phases.append({
+            'name': name,
+            'detail': detail,
+            'offset': round(started - self.start, 4),
+            'seconds': round(seconds, 4),
+        })
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'reason': self.reason,
+            'status': self.status,
+            'started_at': self.started_at,
+            'seconds': self.seconds,
+            'phases': len(self.phases),
+            'cprofile': self.cprofile is not None,
+        }
+
+    def to_dict(self):
+        result = self.summary()
+        result['phases'] = self.phases
+        result['cprofile'] = self.cprofile
+        return result
+
+
+class _Phase:
+    def __init__(self, profile, name, detail):
+        self.profile = profile
+        self.name = name
+        self.detail = detail
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add_phase(self.name, self.detail, self.started, time.perf_counter() - self.started)
+        return False
+
+    def note(self, **info):
+        """Attach extra fields (status, time to first byte, ...) to the phase"""
+        self.detail = dict(self.detail if isinstance(self.detail, dict) else {'detail': self.detail}, **info)
+
+
+def current():
+    return getattr(_local, 'profile', None)
+
+
+def phase(name, detail=None):
+    """Context manager timing one phase of the current request (no-op if unprofiled)"""
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return _NULL_PHASE
+    return _Phase(profile, name, detail)
+
+
+def mark(name):
+    """
+    Start a named stage in a long function; the stage runs until the next
+    mark() or end_marks(). No-op if the request isn't profiled.
+    """
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return
+    now = time.perf_counter()
+    end_marks(now)
+    profile.last_mark = (name, now)
+
+
+def end_marks(now=None):
+    profile = getattr(_local, 'profile', None)
+    if profile is None or profile.last_mark is None:
+        return
+    now = now or time.perf_counter()
+    name, started = profile.last_mark
+    profile.add_phase(name, None, started, now - started)
+    profile.last_mark = None
+
+
+def is_admin(token):
+    return bool(PROFILE_ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN)
+
+
+def should_profile(token):
+    """'admin', 'sampled' or None for a request carrying `token`"""
+    if is_admin(token):
+        return 'admin'
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+
+def start(method, path, reason):
+    """Begin profiling the request running on this thread"""
+    profile = RequestProfile(method, path, reason)
+    if _cprofile_lock.acquire(blocking=False):
+        profile.profiler = cProfile.Profile()
+        try:
+            profile.profiler.enable()
+        except ValueError:
+            # Another profiling tool (a debugger, say) owns the hook
+            profile.profiler = None
+            _cprofile_lock.release()
+    _local.profile = profile
+    return profile
+
+
+def finish(status=None):
+    """Stop profiling this thread's request and store it in the ring buffer"""
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return None
+    end_marks()
+    _local.profile = None
+    profile.seconds = round(time.perf_counter() - profile.start, 4)
+    profile.status = status
+    if profile.profiler is not None:
+        profile.profiler.disable()
+        _cprofile_lock.release()
+        out = io.StringIO()
+        pstats.Stats(profile.profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        profile.cprofile = out.getvalue()
+        profile.profiler = None
+    with _profiles_lock:
+        _profiles.append(profile)
+    return profile
+
+
+def list_profiles():
+    with _profiles_lock:
+        return [p.summary() for p in reversed(_profiles)]
+
+
+def get_profile(profile_id):
+    with _profiles_lock:
+        for profile in _profiles:
+            if profile.id == profile_id:
+                return profile.to_dict()
+    return None
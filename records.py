@@ -0,0 +1,115 @@
+"""
+Compact typed records for DataSF rows on the search hot path.
+
+Rows arrive as dicts of strings. These classes keep only the columns the
+merge in get_property_details uses, in __slots__ instead of a per-row dict,
+and parse numeric fields once at ingest. to_dict() turns them back into the
+string-valued shape the API has always returned.
+
+They pay off for rows that are read typed or held onto. Rows that only pass
+through to the response (the Rent Board units, eviction and complaint
+summaries) are used as they arrive: a record and a dict back would only add
+allocations to every search.
+"""
+
+
+def parse_int(value):
+    """'2023' -> 2023; anything that isn't a clean integer string is returned unchanged"""
+    if isinstance(value, str):
+        stripped = value.strip()
+        if stripped.isdigit():
+            return int(stripped)
+    return value
+
+
+def format_value(value):
+    """Inverse of parse_int for API output"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+class Record:
+    """Base class: subclasses list their string FIELDS and parsed INT_FIELDS"""
+    __slots__ = ()
+    FIELDS = ()
+    INT_FIELDS = ()
+
+    @classmethod
+    def from_row(cls, row):
+        record = cls.__new__(cls)
+        get = row.get
+        for name in cls.FIELDS:
+            setattr(record, name, get(name))
+        for name in cls.INT_FIELDS:
+            setattr(record, name, parse_int(get(name)))
+        return record
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+    def to_dict(self):
+        """String-valued dict of the non-empty fields, like the source row"""
+        result = {}
+        for name in self.FIELDS + self.INT_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                result[name] = format_value(value)
+        return result
+
+
+class ParcelRecord(Record):
+    """Assessor parcel row (acdm-wktn)"""
+    FIELDS = (
+        'blklot', 'address', 'from_address_num', 'street_name', 'street_type', 'owner',
+        'closed_roll_assessed_fixtures_value', 'closed_roll_assessed_land_value',
+        'property_class_description', 'building_sqft', 'number_of_bedrooms',
+        'number_of_bathrooms', 'number_of_rooms', 'lot_area', 'zoning_district',
+    )
+    INT_FIELDS = ('year_property_built', 'number_of_units')
+    __slots__ = FIELDS + INT_FIELDS
+
+
+class TaxRollRecord(Record):
+    """Historical secured property tax roll row (wv5m-vpq2)"""
+    FIELDS = (
+        'parcel_number', 'property_location', 'owner', 'property_class_code',
+        'property_class_code_definition', 'use_code', 'use_definition', 'supervisor_district',
+        'zoning_code', 'number_of_rooms', 'number_of_bathrooms', 'number_of_bedrooms',
+        'property_area', 'assessed_fixtures_value', 'assessed_land_value',
+        'assessed_improvement_value',
+    )
+    INT_FIELDS = ('closed_roll_year', 'year_property_built', 'number_of_units')
+    __slots__ = FIELDS + INT_FIELDS
+
+
+class RentBoardUnit(Record):
+    """Rent Board housing inventory row (gdc7-dmcn)"""
+    FIELDS = (
+        'block_address', 'bedroom_count', 'bathroom_count', 'square_footage', 'monthly_rent',
+        'occupancy_type', 'analysis_neighborhood', 'supervisor_district',
+        'base_rent_includes_water_sewer', 'base_rent_includes_natural_gas',
+        'base_rent_includes_electricity', 'base_rent_includes_refuse_recycling',
+        'base_rent_includes_other_utilities',
+    )
+    INT_FIELDS = ('submission_year', 'year_property_built', 'unit_count')
+    __slots__ = FIELDS + INT_FIELDS
+
+    @property
+    def unit_key(self):
+        """Identity of a unit across yearly submissions"""
+        return (self.bedroom_count, self.bathroom_count, self.square_footage)
+
+    @staticmethod
+    def row_key(row):
+        """unit_key of a source row, without building the record"""
+        return (row.get('bedroom_count'), row.get('bathroom_count'), row.get('square_footage'))
+
+    def utilities(self):
+        return {
+            'water_sewer': self.base_rent_includes_water_sewer == 'Y',
+            'natural_gas': self.base_rent_includes_natural_gas == 'Y',
+            'electricity': self.base_rent_includes_electricity == 'Y',
+            'refuse_recycling': self.base_rent_includes_refuse_recycling == 'Y'
+        }
@@ -0,0 +1,234 @@
+"""
+Repost detection: the same unit posted again under a new Craigslist post id.
+
+Each parsed listing gets a fingerprint: a 64-bit SimHash of its title and
+body text (listing_simhash, computed by the parser) and the ids of its
+photos. Fingerprints live in a sqlite database under DATA_DIR with two
+locality-sensitive lookups:
+
+    text_bands  the SimHash cut into TEXT_BANDS 16-bit bands; two listings
+                within TEXT_BANDS - 1 bits always share a band exactly, and
+                ones a few bits further apart almost always do
+    image_keys  one row per photo id
+
+A lookup reads only the buckets its own bands and photos fall into (at most
+MAX_BUCKET_CANDIDATES each), then checks the candidates. This stays
+sublinear as the corpus grows. A candidate is a repost if its SimHash is
+within MAX_HAMMING bits, or if it shares MIN_SHARED_IMAGES photos (one
+when either listing has a single photo).
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from indexes import DATA_DIR
+
+REPOSTS_DB = os.path.join(DATA_DIR, 'reposts.db')
+SIMHASH_BITS = 64
+TEXT_BANDS = 4
+BAND_BITS = SIMHASH_BITS // TEXT_BANDS
+# Random 64-bit SimHashes differ in ~32 bits; edits to a repost move only a few
+MAX_HAMMING = 6
+MIN_SHARED_IMAGES = 2
+# Texts shorter than this many shingles are too generic to fingerprint
+MIN_SHINGLES = 8
+SHINGLE_WORDS = 3
+MAX_BUCKET_CANDIDATES = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id INTEGER PRIMARY KEY,
+    url TEXT UNIQUE,
+    simhash INTEGER,
+    images TEXT,
+    title TEXT,
+    price TEXT,
+    property_id INTEGER,
+    seen_at TEXT
+);
+CREATE TABLE IF NOT EXISTS text_bands (
+    bucket INTEGER,
+    listing INTEGER,
+    PRIMARY KEY (bucket, listing)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS image_keys (
+    key TEXT,
+    listing INTEGER,
+    PRIMARY KEY (key, listing)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_fingerprints_property ON fingerprints (property_id);
+"""
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+# images.craigslist.org/00E0E_5d3HkX1aXyZ_0CI0t2_600x450.jpg -> 00E0E_5d3HkX1aXyZ_0CI0t2
+_IMAGE_ID_RE = re.compile(r'/([\w-]+?)_\d+x\d+\.\w+$')
+_BOILERPLATE = ('qr code link to this post',)
+_MASK = (1 << SIMHASH_BITS) - 1
+
+_local = threading.local()
+
+
+def connect(path=None):
+    """Per-thread connection to the fingerprint database (schema created on first use)"""
+    path = path or REPOSTS_DB
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        conns[path] = conn
+    return conn
+
+
+# ============================================================
+# FINGERPRINTS
+# ============================================================
+
+def simhash(text):
+    """64-bit SimHash of a text's word shingles as 16 hex digits, or None for short texts"""
+    text = (text or '').lower()
+    for phrase in _BOILERPLATE:
+        text = text.replace(phrase, ' ')
+    words = _WORD_RE.findall(text)
+    shingles = set(zip(*(words[i:] for i in range(SHINGLE_WORDS))))
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    # Each bit is set when most shingle hashes have it set; counting down the
+    # columns of the hashes' bit strings keeps the per-bit loop out of Python
+    hashes = [f"{int.from_bytes(hashlib.blake2b(' '.join(s).encode('utf-8'), digest_size=8).digest(), 'big'):064b}"
+              for s in shingles]
+    value = 0
+    for column in zip(*hashes):
+        value = value << 1 | (2 * column.count('1') > len(hashes))
+    return f"{value:016x}"
+
+
+def image_keys(urls):
+    """Stable photo ids from listing image URLs (the URL itself for other hosts)"""
+    keys = []
+    for url in urls or []:
+        url = url.split('?')[0]
+        match = _IMAGE_ID_RE.search(url)
+        key = match.group(1) if match else url
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def _signed(value):
+    """sqlite integers are signed 64-bit"""
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def _bands(value):
+    """Bucket ids (band number in the high bits) for each band of a SimHash"""
+    band_mask = (1 << BAND_BITS) - 1
+    return [(band << BAND_BITS) | (value >> (band * BAND_BITS) & band_mask) for band in range(TEXT_BANDS)]
+
+
+def fingerprint(amenities):
+    """(SimHash int or None, photo ids) for a parsed listing"""
+    text_hash = amenities.get('listing_simhash')
+    return (int(text_hash, 16) if text_hash else None), image_keys(amenities.get('listing_images'))
+
+
+# ============================================================
+# LOOKUP + RECORDING
+# ============================================================
+
+def find_reposts(url, amenities, conn=None):
+    """Earlier postings that look like the same unit, strongest match first"""
+    conn = conn or connect()
+    text_hash, images = fingerprint(amenities)
+    candidates = set()
+    if text_hash is not None:
+        for bucket in _bands(text_hash):
+            rows = conn.execute('SELECT listing FROM text_bands WHERE bucket = ? ORDER BY listing DESC LIMIT ?',
+                                (bucket, MAX_BUCKET_CANDIDATES))
+            candidates.update(row[0] for row in rows)
+    for key in images:
+        rows = conn.execute('SELECT listing FROM image_keys WHERE key = ? ORDER BY listing DESC LIMIT ?',
+                            (key, MAX_BUCKET_CANDIDATES))
+        candidates.update(row[0] for row in rows)
+    if not candidates:
+        return []
+
+    matches = []
+    placeholders = ','.join('?' * len(candidates))
+    for row in conn.execute(f'SELECT * FROM fingerprints WHERE id IN ({placeholders})', list(candidates)):
+        if row['url'] == url:
+            continue
+        distance = None
+        if text_hash is not None and row['simhash'] is not None:
+            distance = bin((row['simhash'] & _MASK) ^ text_hash).count('1')
+        their_images = json.loads(row['images'] or '[]')
+        shared = len(set(images) & set(their_images))
+        needed = MIN_SHARED_IMAGES if min(len(images), len(their_images)) > 1 else 1
+        if (distance is not None and distance <= MAX_HAMMING) or (shared and shared >= needed):
+            matches.append({
+                'listing_url': row['url'],
+                'listing_title': row['title'],
+                'listing_price': row['price'],
+                'property_id': row['property_id'],
+                'text_distance': distance,
+                'shared_images': shared,
+                'seen_at': row['seen_at'],
+            })
+    matches.sort(key=lambda m: (m['text_distance'] if m['text_distance'] is not None else SIMHASH_BITS,
+                                -m['shared_images']))
+    return matches
+
+
+def record(url, amenities, property_id=None, conn=None):
+    """Find a listing's earlier postings, then store (or refresh) its own fingerprint; returns the matches"""
+    conn = conn or connect()
+    matches = find_reposts(url, amenities, conn)
+    text_hash, images = fingerprint(amenities)
+    row = conn.execute('SELECT id, property_id FROM fingerprints WHERE url = ?', (url,)).fetchone()
+    if row is not None:
+        listing = row['id']
+        property_id = property_id if property_id is not None else row['property_id']
+        conn.execute('DELETE FROM text_bands WHERE listing = ?', (listing,))
+        conn.execute('DELETE FROM image_keys WHERE listing = ?', (listing,))
+        conn.execute('DELETE FROM fingerprints WHERE id = ?', (listing,))
+    cursor = conn.execute(
+        'INSERT INTO fingerprints (url, simhash, images, title, price, property_id, seen_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (url, _signed(text_hash) if text_hash is not None else None, json.dumps(images),
+         amenities.get('listing_title'), amenities.get('listing_price'), property_id, datetime.now().isoformat()),
+    )
+    listing = cursor.lastrowid
+    if text_hash is not None:
+        conn.executemany('INSERT OR IGNORE INTO text_bands (bucket, listing) VALUES (?, ?)',
+                         [(bucket, listing) for bucket in _bands(text_hash)])
+    conn.executemany('INSERT OR IGNORE INTO image_keys (key, listing) VALUES (?, ?)',
+                     [(key, listing) for key in images])
+    conn.commit()
+    return matches
+
+
+def attach(url, property_id, conn=None):
+    """Mark a recorded listing as belonging to a saved property"""
+    conn = conn or connect()
+    conn.execute('UPDATE fingerprints SET property_id = ? WHERE url = ?', (property_id, url))
+    conn.commit()
+
+
+def detach(property_id, conn=None):
+    """Forget a deleted saved property (its listings stay fingerprinted)"""
+    conn = conn or connect()
+    conn.execute('UPDATE fingerprints SET property_id = NULL WHERE property_id = ?', (property_id,))
+    conn.commit()
+
+
+def fingerprint_count(conn=None):
+    conn = conn or connect()
+    return conn.execute('SELECT COUNT(*) FROM fingerprints').fetchone()[0]
@@ -0,0 +1,247 @@
+"""
+Micro-benchmarks with performance budgets for the pure functions on the search path.
+
+Each benchmark runs a realistic corpus (SF address variants, tax roll
+property_location strings, listing URLs and HTML, canned DataSF responses)
+through one hot function. It reports the best time per call over several
+repeats. Results are compared with the baselines recorded in
+scripts/bench_baselines.json. A benchmark slower than its baseline by more than
+its tolerance fails, and the script exits 1 with a table of the differences.
+
+Baselines are machine specific; record them on the machine you compare on.
+
+Usage:
+    python scripts/bench_hot.py                 # compare against baselines
+    python scripts/bench_hot.py --update        # record new baselines
+    python scripts/bench_hot.py --only normalize_address,match_amenities
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Keep local indexes and saved data out of the measurements
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='bench-'))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+BASELINES_FILE = os.path.join(ROOT, 'scripts', 'bench_baselines.json')
+DEFAULT_TOLERANCE = 0.30
+REPEATS = 7
+
+STREETS = ['MISSION', 'VALENCIA', 'JACKSON', 'SUTTER', '24TH', 'DOLORES', 'GEARY', 'FILLMORE',
+           'DIVISADERO', 'CLEMENT', 'IRVING', 'NORIEGA', 'GUERRERO', 'OAK', 'HAIGHT']
+STREET_SUFFIXES = ['Street', 'St', 'St.', 'ST', 'Avenue', 'Ave', 'AV', 'Boulevard', 'Blvd', 'Way',
+                   'Terrace', 'Ter', 'Place', 'Pl', 'Court', '']
+
+
+def address_corpus(n=2000):
+    rng = random.Random(1)
+    corpus = []
+    for _ in range(n):
+        address = f"{rng.randint(1, 4999)} {rng.choice(STREETS).title()} {rng.choice(STREET_SUFFIXES)}".strip()
+        if rng.random() < 0.3:
+            address += rng.choice([',', '.', ';', ', San Francisco, CA 94110'])
+        if rng.random() < 0.2:
+            address = address.lower()
+        corpus.append(address)
+    return corpus
+
+
+def property_location_corpus(n=2000):
+    rng = random.Random(2)
+    corpus = []
+    for _ in range(n):
+        street = rng.choice(STREETS).ljust(20)
+        unit = rng.choice(['0000', '0001', '0012', '0304', '    ', 'A'])
+        corpus.append(f"0000 {rng.randint(1, 4999):04d} {street}{rng.choice(['ST', 'AV', 'WY', 'TR'])}{unit}")
+    corpus.extend(['', None, 'NO LOCATION'])
+    return corpus
+
+
+def listing_url_corpus(n=1000):
+    rng = random.Random(3)
+    corpus = []
+    for i in range(n):
+        slug = rng.choice([
+            f"{rng.randint(1, 4999)}-{rng.choice(STREETS).lower()}-{rng.choice(['st', 'street', 'ave'])}-sf",
+            'sunny-2br-in-the-mission-w-parking',
+            'bright-studio-near-golden-gate-park',
+        ])
+        corpus.append(f"https://sfbay.craigslist.org/sfc/apa/d/san-francisco-{slug}/{7700000000 + i}.html")
+    return corpus
+
+
+ATTRIBUTES = ['cats are OK - purrr', 'dogs are OK - wooof', 'w/d in unit', 'laundry in bldg',
+              'attached garage', 'street parking', 'off-street parking', 'furnished', 'no smoking',
+              'wheelchair accessible', 'air conditioning', 'EV charging', 'apartment', '2BR / 1Ba',
+              '850ft2', 'available oct 1', 'no laundry on site', 'unfurnished', 'carport']
+
+
+def attribute_corpus(n=500):
+    rng = random.Random(4)
+    return [rng.sample(ATTRIBUTES, rng.randint(4, 12)) for _ in range(n)]
+
+
+def listing_html():
+    attrs = ''.join(f'<span>{text}</span>' for text in ATTRIBUTES)
+    thumbs = ''.join(f'<a class="thumb" href="https://images.craigslist.org/{i}_600x450.jpg"></a>' for i in range(8))
+    body = '<p>' + 'Lovely flat with lots of light. ' * 200 + '</p>'
+    return f"""<html><head><title>listing</title></head><body>
+        <span id="titletextonly">Sunny 2BR in the Mission</span><span class="price">$3,450</span>
+        <span class="housing">/ 2br - 850ft2 -</span>
+        <div class="mapAndAttrs"><div id="map" data-latitude="37.7599" data-longitude="-122.4148"></div>
+        <div class="attrgroup">{attrs}</div></div>
+        <span class="property_date" data-date="2024-10-01">available oct 1</span>
+        <div id="thumbs">{thumbs}</div><section id="postingbody">{body}</section></body></html>"""
+
+
+class _Response:
+    def __init__(self, data):
+        self._data = data
+        self.status_code = 200
+        self.url = 'bench'
+        self.text = json.dumps(data)
+        self.content = self.text.encode()
+
+    def json(self):
+        return self._data
+
+
+def canned_datasf():
+    """Response rows per dataset, sized like a mid-size apartment building"""
+    rent_board = [{'bedroom_count': str(i % 3), 'bathroom_count': '1', 'square_footage': str(500 + 50 * (i % 6)),
+                   'submission_year': str(2022 + i % 3), 'monthly_rent': f"${2200 + i * 10}",
+                   'occupancy_type': 'Occupied by non-owner', 'year_property_built': '1925', 'unit_count': '24',
+                   'base_rent_includes_water_sewer': 'Y', 'base_rent_includes_refuse_recycling': 'Y'}
+                  for i in range(60)]
+    return {
+        'acdm-wktn': [{'blklot': '0640002', 'address': '1200 SUTTER ST', 'year_property_built': '1925',
+                       'owner': 'SUTTER HOLDINGS LLC', 'closed_roll_assessed_land_value': '2400000',
+                       'closed_roll_assessed_fixtures_value': '0', 'use_definition': 'Multi-Family Residential',
+                       'number_of_units': '24', 'zoning_code': 'RC-4', 'lot_area': '6875'}],
+        'wv5m-vpq2': [{'closed_roll_year': str(2024 - i), 'parcel_number': '0640002',
+                       'property_location': '0000 1200 SUTTER              ST0000', 'number_of_units': '24',
+                       'number_of_bedrooms': '30', 'number_of_bathrooms': '24', 'property_area': '21000',
+                       'assessed_land_value': str(2400000 - i * 40000), 'assessed_improvement_value': '1800000',
+                       'assessed_fixtures_value': '0', 'year_property_built': '1925'} for i in range(5)],
+        'fdfd-xptc': [{'mapblklot': '0640002', 'restype': 'MULTI', 'yrbuilt': '1925', 'bldgsqft': '21000'}],
+        'gdc7-dmcn': rent_board,
+        '5cei-gny5': [{'file_date': f"20{10 + i}-03-01T00:00:00", 'non_payment': 'true', 'owner_move_in': 'false',
+                       'neighborhood': 'Nob Hill'} for i in range(12)],
+        '7d5q-jf8x': [{'date_filed': f"20{12 + i}-05-01", 'category': 'Heat', 'status': 'Closed'} for i in range(8)],
+        'wmam-7g8d': [{'filing_date': '2019-02-01', 'buyout_amount': '40000', 'neighborhood': 'Nob Hill'}],
+        'i98e-djp9': [{'description': f"Permit {i}", 'filed_date': '2020-01-01', 'status': 'complete'}
+                      for i in range(15)],
+    }
+
+
+def property_details_bench():
+    """get_property_details with DataSF answered from memory: measures the fetch parsing and merge"""
+    import upstream
+    import app
+    rows = canned_datasf()
+
+    def fake_get(url, params=None, **kwargs):
+        params = params or {}
+        if '$group' in params:
+            return _Response([{'bedroom_count': '1', 'bathroom_count': '1', 'square_footage': '500', 'records': '7'}])
+        if params.get('$select', '').startswith('count'):
+            return _Response([{'total': '12'}])
+        return _Response(rows.get(upstream.source_for(url), []))
+
+    upstream.get = fake_get
+    return lambda: app.get_property_details(address='1200 Sutter St')
+
+
+def benchmarks():
+    """name -> (function taking one corpus item, corpus)"""
+    import app
+    import listing_parser
+
+    html = listing_html()
+    return {
+        'normalize_address': (app.normalize_address, address_corpus()),
+        'extract_unit_number': (app.extract_unit_number, property_location_corpus()),
+        'extract_address_from_url': (app.extract_address_from_url, listing_url_corpus()),
+        'match_amenities': (lambda texts: listing_parser.match_amenities(texts, listing_parser.empty_amenities()),
+                            attribute_corpus()),
+        'parse_craigslist_html': (listing_parser.parse_craigslist_html, [html] * 5),
+        'get_property_details': (lambda run: run(), [property_details_bench()] * 20),
+    }
+
+
+def measure(fn, corpus, repeats=REPEATS):
+    """Best seconds per call over `repeats` passes through the corpus"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for item in corpus:
+            fn(item)
+        best = min(best, (time.perf_counter() - start) / len(corpus))
+    return best
+
+
+def load_baselines():
+    try:
+        with open(BASELINES_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def format_us(seconds):
+    return f"{seconds * 1e6:10.2f}us"
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Hot-path micro-benchmarks with performance budgets')
+    parser.add_argument('--update', action='store_true', help='record the results as the new baselines')
+    parser.add_argument('--only', default='', help='comma-separated benchmark names')
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    args = parser.parse_args(argv)
+
+    suite = benchmarks()
+    names = [n.strip() for n in args.only.split(',') if n.strip()] or list(suite)
+    unknown = [n for n in names if n not in suite]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)} (choose from {', '.join(suite)})")
+
+    baselines = load_baselines()
+    failures = []
+    print(f"{'benchmark':28} {'baseline':>12} {'now':>12} {'change':>8} {'budget':>8}")
+    for name in names:
+        fn, corpus = suite[name]
+        fn(corpus[0])  # warm caches and lazy imports
+        seconds = measure(fn, corpus, args.repeats)
+        baseline = baselines.get(name)
+        if args.update or baseline is None:
+            baselines[name] = {'seconds': seconds, 'tolerance': (baseline or {}).get('tolerance', DEFAULT_TOLERANCE)}
+            print(f"{name:28} {'-':>12} {format_us(seconds)} {'':>8} {'recorded':>8}")
+            continue
+        change = seconds / baseline['seconds'] - 1
+        budget = baseline.get('tolerance', DEFAULT_TOLERANCE)
+        status = 'FAIL' if change > budget else 'ok'
+        print(f"{name:28} {format_us(baseline['seconds'])} {format_us(seconds)} {change:+8.1%} "
+              f"{'+' + format(budget, '.0%'):>8} {status}")
+        if status == 'FAIL':
+            failures.append((name, baseline['seconds'], seconds, change, budget))
+
+    if args.update or any(name not in load_baselines() for name in names):
+        with open(BASELINES_FILE, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if failures:
+        print(f"\n{len(failures)} benchmark(s) over budget:")
+        for name, before, after, change, budget in failures:
+            print(f"  {name}: {before * 1e6:.2f}us -> {after * 1e6:.2f}us ({change:+.1%}, budget +{budget:.0%})")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,172 @@
+"""
+Microbenchmark: dataset rows as dicts vs. the compact records in records.py.
+
+Builds synthetic rent board / tax roll rows shaped like DataSF responses and
+reports, for each representation, the memory retained per cached record
+(tracemalloc) and the peak allocation and time for the per-search work (dedupe
+the units, read the merge fields, parse the numeric columns), and for the
+Rent Board step as get_rent_board_housing_inventory runs it: raw rows deduped
+and passed through, with one record for the merge, vs. a record per row
+turned back into response dicts.
+
+Usage:
+    python scripts/bench_records.py [--rows 5000] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import RentBoardUnit, TaxRollRecord
+
+
+def rent_board_row(i):
+    return {
+        'block_address': '1200 Block of SUTTER ST',
+        'submission_year': str(2022 + i % 3),
+        'bedroom_count': str(i % 4),
+        'bathroom_count': str(1 + i % 2),
+        'square_footage': str(400 + (i % 50) * 10),
+        'monthly_rent': str(2000 + i % 700),
+        'occupancy_type': 'Occupied by non-owner',
+        'year_property_built': '1925',
+        'unit_count': '24',
+        'analysis_neighborhood': 'Nob Hill',
+        'supervisor_district': '3',
+        'base_rent_includes_water_sewer': 'Y',
+        'base_rent_includes_natural_gas': 'N',
+        'base_rent_includes_electricity': 'N',
+        'base_rent_includes_refuse_recycling': 'Y',
+        'base_rent_includes_other_utilities': 'N',
+    }
+
+
+def taxroll_row(i):
+    return {
+        'parcel_number': f"0{i:03d}012",
+        'property_location': f"0000 1234 SUTTER ST{i:04d}",
+        'closed_roll_year': str(2010 + i % 14),
+        'property_class_code': 'A',
+        'property_class_code_definition': 'Apartment',
+        'use_code': 'MRES',
+        'use_definition': 'Multi-Family Residential',
+        'supervisor_district': '3',
+        'zoning_code': 'RC4',
+        'year_property_built': '1925',
+        'number_of_units': '24',
+        'number_of_rooms': '60',
+        'number_of_bathrooms': '24',
+        'number_of_bedrooms': '30',
+        'property_area': '18000',
+        'assessed_fixtures_value': '0',
+        'assessed_land_value': '1500000',
+        'assessed_improvement_value': '2500000',
+    }
+
+
+def dict_search(rows):
+    unique = {}
+    for row in rows:
+        unique.setdefault(f"{row.get('bedroom_count')}_{row.get('bathroom_count')}_{row.get('square_footage')}", row)
+    newest = max(int(row.get('submission_year', 0)) for row in rows)
+    built = sum(int(row.get('year_property_built', 0)) for row in unique.values())
+    return len(unique), newest, built
+
+
+def record_search(records):
+    unique = {}
+    for unit in records:
+        unique.setdefault(unit.unit_key, unit)
+    newest = max(unit.submission_year for unit in records)
+    built = sum(unit.year_property_built for unit in unique.values())
+    return len(unique), newest, built
+
+
+def inventory_as_rows(rows):
+    """The search path: dedupe the rows by key, read only the newest typed"""
+    unique = {}
+    for row in rows:
+        unique.setdefault(RentBoardUnit.row_key(row), row)
+    units = list(unique.values())
+    return units, RentBoardUnit.from_row(units[0]).bedroom_count
+
+
+def inventory_as_records(rows):
+    """A record per row, serialized back to dicts for the response"""
+    unique = {}
+    for row in rows:
+        unit = RentBoardUnit.from_row(row)
+        unique.setdefault(unit.unit_key, unit)
+    units = list(unique.values())
+    return [unit.to_dict() for unit in units], units[0].bedroom_count
+
+
+def retained(build):
+    """(bytes retained, result) for the objects `build()` returns"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def peak_allocated(fn, arg, warm=True):
+    """
+    Peak bytes allocated while one call runs. Warm by default: the first call
+    also allocates the interpreter's one-time caches for the code it runs
+    (specialized attribute and property lookups), which no later search pays
+    """
+    if warm:
+        fn(arg)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - base
+
+
+def timed(fn, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - start) / repeat
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Compare dict rows with compact records')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+    n = args.rows
+
+    for name, make_row, record_cls in (('rent_board', rent_board_row, RentBoardUnit),
+                                       ('taxroll', taxroll_row, TaxRollRecord)):
+        raw = [make_row(i) for i in range(n)]
+        dict_bytes, _ = retained(lambda: [dict(row) for row in raw])
+        record_bytes, _ = retained(lambda: [record_cls.from_row(row) for row in raw])
+        print(f"{name}: {dict_bytes / n:.0f} B/row as dict, {record_bytes / n:.0f} B/row as record "
+              f"({1 - record_bytes / dict_bytes:.0%} less)")
+
+    rows = [rent_board_row(i) for i in range(n)]
+    units = [RentBoardUnit.from_row(row) for row in rows]
+    cold = {fn: peak_allocated(fn, arg, warm=False) for fn, arg in ((dict_search, rows), (record_search, units))}
+    print(f"search peak allocation: dict {peak_allocated(dict_search, rows)} B, "
+          f"record {peak_allocated(record_search, units)} B "
+          f"(first call: dict {cold[dict_search]} B, record {cold[record_search]} B)")
+    # A search reads at most 100 inventory rows
+    page = rows[:100]
+    print(f"inventory peak allocation (100 rows): rows {peak_allocated(inventory_as_rows, page)} B, "
+          f"records {peak_allocated(inventory_as_records, page)} B")
+    print(f"search time: dict {timed(dict_search, rows, args.repeat) * 1000:.2f} ms, "
+          f"record {timed(record_search, units, args.repeat) * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
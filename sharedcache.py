@@ -0,0 +1,370 @@
+"""
+Shared cache and cross-node single-flight for upstream responses and listing parses.
+
+Each worker keeps its own small in-process cache (upstream.py, app.py). With
+CACHE_BACKEND set, a miss there falls through to a backend that every
+instance shares. Only one node fetches a given key at a time: the first
+takes a short-lived lock key (SET NX PX), and the others poll the backend
+for its result instead of calling upstream themselves. If the lock holder
+fails or the result isn't cacheable, the lock is released or expires, and
+waiters fetch for themselves.
+
+Backends:
+    memory  in-process fake with the same semantics (tests, single instance)
+    redis   any server speaking the Redis protocol (RESP), CACHE_REDIS_URL
+
+Backend errors never fail a request: the call falls back to fetching
+directly, and the backend is skipped for CACHE_BACKEND_RETRY seconds.
+
+Hits, misses and lock waits are counted per node (CACHE_NODE_ID, default the
+hostname). The counts are flushed to a shared hash, so stats() reports the
+hit ratio of every node and of the whole cluster.
+"""
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from urllib.parse import urlparse, unquote
+
+import logs
+
+log = logs.get_logger('sharedcache')
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', '')  # '', 'memory' or 'redis'
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_NODE_ID = os.environ.get('CACHE_NODE_ID', socket.gethostname())
+CACHE_PREFIX = os.environ.get('CACHE_PREFIX', 'sfra:')
+# How long a fetch may hold the single-flight lock, and how often waiters poll
+LOCK_TTL = 30
+LOCK_POLL_INTERVAL = 0.05
+REDIS_TIMEOUT = float(os.environ.get('CACHE_REDIS_TIMEOUT', '0.5'))
+CACHE_BACKEND_RETRY = 30
+METRICS_FLUSH_SECONDS = 5
+METRICS_KEY = 'cache:metrics'
+COUNTERS = ('local_hits', 'shared_hits', 'misses', 'lock_waits', 'errors')
+
+
+class BackendError(Exception):
+    """The shared backend couldn't be reached or returned an error"""
+
+
+# ============================================================
+# BACKENDS
+# ============================================================
+
+class MemoryBackend:
+    """In-process stand-in for the networked backend (share one instance between fake nodes)"""
+
+    def __init__(self):
+        self._data = {}
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry and entry[0] is not None and entry[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry else None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def add(self, key, value, ttl):
+        """Set only if the key doesn't exist; True if it was set"""
+        with self._lock:
+            if self._live(key):
+                return False
+            self._data[key] = (time.monotonic() + ttl, value)
+            return True
+
+    def delete_if(self, key, value):
+        """Delete the key only if it still holds `value`"""
+        with self._lock:
+            entry = self._live(key)
+            if entry and entry[1] == value:
+                del self._data[key]
+                return True
+            return False
+
+    def hincrby(self, name, counts):
+        with self._lock:
+            fields = self._hashes.setdefault(name, {})
+            for field, amount in counts.items():
+                fields[field] = fields.get(field, 0) + amount
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+
+class RedisError(BackendError):
+    """Error reply from the server"""
+
+
+# Delete a lock only if we still own it
+_DELETE_IF_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+class RedisBackend:
+    """Minimal RESP client: one connection per thread, reconnecting after errors"""
+
+    def __init__(self, url, timeout=REDIS_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        if self.password:
+            self._command('AUTH', self.password)
+        if self.db:
+            self._command('SELECT', self.db)
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _encode(args):
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(out)
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise BackendError('connection closed')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            raise RedisError(rest.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise BackendError('connection closed')
+            return data[:-2]
+        if kind == b'*':
+            count = int(rest)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise BackendError(f"unexpected reply {line[:20]!r}")
+
+    def _command(self, *args):
+        self._local.sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def execute(self, *args):
+        """Run one command, reconnecting once if the pooled connection went stale"""
+        for attempt in (1, 2):
+            try:
+                if getattr(self._local, 'sock', None) is None:
+                    self._connect()
+                return self._command(*args)
+            except RedisError:
+                raise
+            except (OSError, BackendError) as e:
+                self._close()
+                if attempt == 2:
+                    raise BackendError(str(e)) from e
+
+    def get(self, key):
+        return self.execute('GET', key)
+
+    def set(self, key, value, ttl):
+        self.execute('SET', key, value, 'PX', int(ttl * 1000))
+
+    def add(self, key, value, ttl):
+        return self.execute('SET', key, value, 'PX', int(ttl * 1000), 'NX') == 'OK'
+
+    def delete_if(self, key, value):
+        return self.execute('EVAL', _DELETE_IF_SCRIPT, 1, key, value) == 1
+
+    def hincrby(self, name, counts):
+        for field, amount in counts.items():
+            self.execute('HINCRBY', name, field, amount)
+
+    def hgetall(self, name):
+        flat = self.execute('HGETALL', name) or []
+        return {flat[i].decode('utf-8'): int(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+
+# ============================================================
+# CACHE + SINGLE-FLIGHT
+# ============================================================
+
+_backend = None
+_backend_down_until = 0.0
+_counts = dict.fromkeys(COUNTERS, 0)
+_unflushed = dict.fromkeys(COUNTERS, 0)
+_counts_lock = threading.Lock()
+_last_flush = time.monotonic()
+_tokens = itertools.count()
+
+
+def configure(backend=None):
+    """Use `backend` (or the one CACHE_BACKEND names); None disables the shared layer"""
+    global _backend, _backend_down_until
+    if backend is None and CACHE_BACKEND == 'memory':
+        backend = MemoryBackend()
+    elif backend is None and CACHE_BACKEND == 'redis':
+        backend = RedisBackend(CACHE_REDIS_URL)
+    _backend = backend
+    _backend_down_until = 0.0
+    return _backend
+
+
+def enabled():
+    return _backend is not None
+
+
+def _available():
+    return _backend is not None and time.monotonic() >= _backend_down_until
+
+
+def _backend_failed(e):
+    global _backend_down_until
+    _backend_down_until = time.monotonic() + CACHE_BACKEND_RETRY
+    count('errors')
+    log.warning("Shared cache unavailable, bypassing for %ss: %s", CACHE_BACKEND_RETRY, e)
+
+
+def count(counter, amount=1):
+    """Bump a per-node counter (flushed to the shared metrics hash periodically)"""
+    global _last_flush
+    with _counts_lock:
+        _counts[counter] += amount
+        _unflushed[counter] += amount
+        if time.monotonic() - _last_flush < METRICS_FLUSH_SECONDS:
+            return
+        pending = {f"{CACHE_NODE_ID}:{k}": v for k, v in _unflushed.items() if v}
+        for k in _unflushed:
+            _unflushed[k] = 0
+        _last_flush = time.monotonic()
+    if pending and _available():
+        try:
+            _backend.hincrby(CACHE_PREFIX + METRICS_KEY, pending)
+        except BackendError as e:
+            _backend_failed(e)
+
+
+def cached(key, ttl, fetch, encode, decode, store_if=None):
+    """
+    Value for `key` from the shared backend, or fetch() it, with at most one
+    node fetching a key at a time. `encode`/`decode` convert to and from
+    bytes; results failing `store_if` aren't stored. Returns (value, hit).
+    """
+    if not _available():
+        return fetch(), False
+    data_key = CACHE_PREFIX + key
+    lock_key = data_key + ':lock'
+    token = f"{CACHE_NODE_ID}:{os.getpid()}:{next(_tokens)}:{uuid.uuid4().hex[:8]}"
+    deadline = time.monotonic() + LOCK_TTL
+    waited = False
+    try:
+        while True:
+            data = _backend.get(data_key)
+            if data is not None:
+                count('shared_hits')
+                return decode(data), True
+            if _backend.add(lock_key, token, LOCK_TTL):
+                break
+            # Another node is fetching this key; wait for its result
+            if not waited:
+                count('lock_waits')
+                waited = True
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(LOCK_POLL_INTERVAL)
+    except BackendError as e:
+        _backend_failed(e)
+        return fetch(), False
+
+    count('misses')
+    try:
+        value = fetch()
+        if store_if is None or store_if(value):
+            try:
+                _backend.set(data_key, encode(value), ttl)
+            except BackendError as e:
+                _backend_failed(e)
+        return value, False
+    finally:
+        try:
+            _backend.delete_if(lock_key, token)
+        except BackendError:
+            pass
+
+
+def json_cached(key, ttl, fetch, store_if=None):
+    """cached() for JSON-serializable values"""
+    return cached(key, ttl, fetch, lambda v: json.dumps(v).encode('utf-8'),
+                  lambda b: json.loads(b), store_if)
+
+
+def _ratio(hits, total):
+    return round(hits / total, 4) if total else None
+
+
+def stats():
+    """This node's counters, plus every node's and the cluster's hit ratios"""
+    with _counts_lock:
+        local = dict(_counts)
+    result = {'backend': type(_backend).__name__ if _backend else None, 'node': CACHE_NODE_ID,
+              'available': _available(), 'local': local}
+    if not _available():
+        return result
+    try:
+        fields = _backend.hgetall(CACHE_PREFIX + METRICS_KEY)
+    except BackendError as e:
+        _backend_failed(e)
+        return result
+    nodes = {}
+    for field, value in fields.items():
+        node, _, counter = field.rpartition(':')
+        nodes.setdefault(node, dict.fromkeys(COUNTERS, 0))[counter] = value
+    totals = dict.fromkeys(COUNTERS, 0)
+    for node, counts in nodes.items():
+        hits = counts['local_hits'] + counts['shared_hits']
+        counts['hit_ratio'] = _ratio(hits, hits + counts['misses'])
+        for counter in COUNTERS:
+            totals[counter] += counts[counter]
+    hits = totals['local_hits'] + totals['shared_hits']
+    totals['hit_ratio'] = _ratio(hits, hits + totals['misses'])
+    # Hits served from another node's fetch, among lookups that missed locally
+    totals['shared_hit_ratio'] = _ratio(totals['shared_hits'], totals['shared_hits'] + totals['misses'])
+    result['nodes'] = nodes
+    result['cluster'] = totals
+    return result
+
+
+configure()
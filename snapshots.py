@@ -0,0 +1,154 @@
+"""
+Content-addressed storage for saved property documents.
+
+A saved property is split into the stable parcel data searches return for
+its blklot (SNAPSHOT_FIELDS and the SNAPSHOT_PREFIXES families: owner,
+zoning, assessor, land use and Rent Board data, ...) and everything else.
+Only the stable part is stored, gzipped, under the SHA-256 of its canonical
+JSON in DATA_DIR/snapshots; the saved entry keeps the rest plus the digest.
+Saving the same building again, for another unit or by another user, reuses
+the existing snapshot. The list is an allow-list, so fields that belong to
+one save (id, notes, the user-typed address, whatever else a client sends)
+or change between searches (record lists and counts, listing-filled values,
+portfolio rollups) stay on the entry and can't split snapshots. Documents
+without a blklot aren't split.
+
+The record lists stay on each entry: they're capped (10 evictions, 10
+complaints, 5 buyouts, 5 permits) so they cost a few KB per save at most,
+and each save shows the records as of its own search, which a shared
+per-parcel copy would overwrite.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import logs
+from indexes import DATA_DIR
+
+log = logs.get_logger('snapshots')
+
+SNAPSHOT_DIR = os.path.join(DATA_DIR, 'snapshots')
+# Decompressed snapshots kept in memory
+SNAPSHOT_CACHE_SIZE = int(os.environ.get('SNAPSHOT_CACHE_SIZE', '256'))
+
+# Stable parcel fields stored in the shared snapshot; everything else stays on the entry
+SNAPSHOT_FIELDS = (
+    'blklot', 'owner', 'property_type', 'year_built', 'assessed_value', 'lot_size', 'zoning',
+    'rent_controlled', 'num_units', 'number_of_rooms', 'last_sale_date', 'last_sale_price', 'building_sqft',
+    'unit_number', 'classification',
+)
+# Assessor, land use and Rent Board field families, named by the app's output tables
+SNAPSHOT_PREFIXES = ('assessor_', 'landuse_', 'rent_board_')
+SNAPSHOT_KEY = 'snapshot'
+# Set on a hydrated entry whose snapshot couldn't be read
+MISSING_KEY = 'snapshot_missing'
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _stable(field):
+    return field in SNAPSHOT_FIELDS or field.startswith(SNAPSHOT_PREFIXES)
+
+
+def split(document):
+    """Split a saved document into (entry fields, stable parcel snapshot or None without a blklot)"""
+    fields = {k: v for k, v in document.items() if k not in (SNAPSHOT_KEY, MISSING_KEY)}
+    if not fields.get('blklot'):
+        return fields, None
+    entry = {k: v for k, v in fields.items() if not _stable(k)}
+    snapshot = {k: v for k, v in fields.items() if _stable(k)}
+    return entry, snapshot
+
+
+def digest_of(snapshot):
+    canonical = json.dumps(snapshot, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest(), canonical
+
+
+def path_for(digest):
+    return os.path.join(SNAPSHOT_DIR, digest[:2], f"{digest}.json.gz")
+
+
+def store(snapshot):
+    """Write a snapshot if it isn't stored yet; returns its digest"""
+    digest, canonical = digest_of(snapshot)
+    path = path_for(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            f.write(canonical)
+        os.replace(tmp_path, path)
+    return digest
+
+
+def load(digest):
+    """The snapshot stored under `digest` (a fresh dict), or None if it's missing"""
+    with _cache_lock:
+        canonical = _cache.get(digest)
+        if canonical is not None:
+            _cache.move_to_end(digest)
+    if canonical is None:
+        try:
+            with gzip.open(path_for(digest), 'rt', encoding='utf-8') as f:
+                canonical = f.read()
+        except (OSError, EOFError) as e:
+            log.warning("Snapshot read error: %s", e, extra={'digest': digest})
+            return None
+        with _cache_lock:
+            _cache[digest] = canonical
+            while len(_cache) > SNAPSHOT_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return json.loads(canonical)
+
+
+def dehydrate(document):
+    """Store a document's stable parcel part and return the slim entry that references it"""
+    entry, snapshot = split(document)
+    if snapshot is not None:
+        entry[SNAPSHOT_KEY] = store(snapshot)
+    return entry
+
+
+def hydrate(entry):
+    """
+    Full document for a slim entry (entries saved before snapshots pass
+    through). If the snapshot can't be read, the entry comes back with only
+    its own fields and MISSING_KEY set.
+    """
+    digest = entry.get(SNAPSHOT_KEY)
+    if not digest:
+        return entry
+    document = load(digest)
+    if document is None:
+        log.error("Saved property snapshot missing", extra={'digest': digest, 'property_id': entry.get('id')})
+        document = {MISSING_KEY: True}
+    document.update({k: v for k, v in entry.items() if k != SNAPSHOT_KEY})
+    return document
+
+
+def discard(digest):
+    """Delete a snapshot no saved entry references any more"""
+    try:
+        os.remove(path_for(digest))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log.warning("Snapshot delete error: %s", e, extra={'digest': digest})
+    with _cache_lock:
+        _cache.pop(digest, None)
+
+
+def stats():
+    count = size = 0
+    if os.path.isdir(SNAPSHOT_DIR):
+        for prefix in os.listdir(SNAPSHOT_DIR):
+            for entry in os.scandir(os.path.join(SNAPSHOT_DIR, prefix)):
+                if entry.name.endswith('.json.gz'):
+                    count += 1
+                    size += entry.stat().st_size
+    return {'snapshots': count, 'bytes': size, 'cached': len(_cache)}
@@ -0,0 +1,291 @@
+"""
+Assessed-value history for every parcel, from the full historical secured
+tax roll (wv5m-vpq2).
+
+The roll is built offline into a columnar file that workers memory-map
+read-only: sorted parcel numbers, a row range per parcel, and one array per
+column (roll year, land, fixtures, improvement values), with each parcel's
+rows contiguous and in year order. The likely last sale is derived at build
+time. Under Prop 13, assessed land value grows by at most 2% a year unless
+the property changes hands, so a year-over-year land jump above
+PROP13_SALE_JUMP marks a reassessment on sale. An improvement-only jump is
+reported as new construction instead.
+
+File layout (little-endian):
+    header      b'SFTH' | version u32 | parcels u32 | rows u32
+    keys        parcels x 10 bytes, ASCII parcel numbers, NUL-padded, sorted
+    row_offs    (parcels + 1) x u32 into the row columns
+    sale_years  parcels x u16 (0 = no sale seen on the roll)
+    years       rows x u16
+    land        rows x f64
+    fixtures    rows x f64
+    improvement rows x f64
+
+Usage:
+    python taxhistory.py build
+    python taxhistory.py show BLKLOT
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+import logs
+from indexes import INDEX_DIR, get_mapped, iter_dataset_rows
+
+log = logs.get_logger('taxhistory')
+
+TAX_HISTORY_PATH = os.path.join(INDEX_DIR, 'taxroll_history.bin')
+# Land value growth above this between roll years means a reassessment
+PROP13_SALE_JUMP = 0.10
+
+MAGIC = b'SFTH'
+VERSION = 1
+HEADER = struct.Struct('<4sIII')
+KEY_BYTES = 10
+VALUE_COLUMNS = ('assessed_land_value', 'assessed_fixtures_value', 'assessed_improvement_value')
+
+
+def _amount(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _change(new, old):
+    return (new - old) / old if old > 0 else None
+
+
+def reassessments(years, land, improvement):
+    """[(roll_year, 'sale'|'construction', change)] from year-ordered columns"""
+    events = []
+    for i in range(1, len(years)):
+        land_change = _change(land[i], land[i - 1])
+        improvement_change = _change(improvement[i], improvement[i - 1])
+        if land_change is not None and land_change > PROP13_SALE_JUMP:
+            events.append((years[i], 'sale', land_change))
+        elif improvement_change is not None and improvement_change > PROP13_SALE_JUMP:
+            events.append((years[i], 'construction', improvement_change))
+    return events
+
+
+def likely_sale_year(roll_year):
+    """A sale reassessed on the roll for `roll_year` (lien date Jan 1) closed the year before"""
+    return roll_year - 1 if roll_year else None
+
+
+def summarize(blklot, years, land, fixtures, improvement, sale_roll_year=None):
+    """The /api/parcels/<blklot>/history response for one parcel's columns"""
+    series = []
+    for i, year in enumerate(years):
+        total = land[i] + fixtures[i] + improvement[i]
+        previous = series[-1]['total'] if series else 0
+        series.append({
+            'roll_year': year,
+            'land': land[i],
+            'fixtures': fixtures[i],
+            'improvement': improvement[i],
+            'total': total,
+            'change_pct': round(_change(total, previous) * 100, 2) if previous else None,
+        })
+    growth = None
+    if len(series) >= 2 and series[0]['total'] > 0:
+        span = series[-1]['roll_year'] - series[0]['roll_year']
+        if span > 0:
+            growth = {
+                'first_roll_year': series[0]['roll_year'],
+                'last_roll_year': series[-1]['roll_year'],
+                'total_pct': round(_change(series[-1]['total'], series[0]['total']) * 100, 2),
+                'annual_pct': round(((series[-1]['total'] / series[0]['total']) ** (1 / span) - 1) * 100, 2),
+            }
+    events = reassessments(years, land, improvement)
+    if sale_roll_year is None:
+        sales = [year for year, kind, _ in events if kind == 'sale']
+        sale_roll_year = sales[-1] if sales else None
+    return {
+        'blklot': blklot,
+        'history': series,
+        'growth': growth,
+        'reassessments': [{'roll_year': year, 'kind': kind, 'change_pct': round(change * 100, 2)}
+                          for year, kind, change in events],
+        'likely_last_sale_year': likely_sale_year(sale_roll_year),
+    }
+
+
+def summarize_rows(blklot, rows):
+    """summarize() for raw roll rows of one parcel (any order); None if there are none"""
+    by_year = {}
+    for row in rows:
+        try:
+            by_year[int(row.get('closed_roll_year'))] = [_amount(row.get(c)) for c in VALUE_COLUMNS]
+        except (TypeError, ValueError):
+            continue
+    if not by_year:
+        return None
+    years = sorted(by_year)
+    land, fixtures, improvement = ([by_year[year][i] for year in years] for i in range(3))
+    return summarize(blklot, years, land, fixtures, improvement)
+
+
+# ============================================================
+# COLUMNAR STORE
+# ============================================================
+
+def write_tax_history(path, rows):
+    """
+    Write roll rows, ordered by parcel_number then closed_roll_year, to the
+    columnar store and atomically swap it in. Returns the number of parcels.
+    Lookups binary-search the keys, so rows out of that order (a parcel after
+    a greater one, as stored bytes, or a roll year going back) raise
+    ValueError and the existing store is kept.
+    """
+    keys, row_offs, sale_years = [], array('I', [0]), array('H')
+    years, land, fixtures, improvement = array('H'), array('d'), array('d'), array('d')
+
+    def close_parcel():
+        start = row_offs[-1]
+        events = reassessments(years[start:], land[start:], improvement[start:])
+        sales = [year for year, kind, _ in events if kind == 'sale']
+        sale_years.append(sales[-1] if sales else 0)
+        row_offs.append(len(years))
+
+    current = None
+    for row in rows:
+        parcel = row.get('parcel_number')
+        try:
+            year = int(row.get('closed_roll_year'))
+        except (TypeError, ValueError):
+            continue
+        if not parcel:
+            continue
+        if parcel != current:
+            key = parcel.encode('ascii')[:KEY_BYTES].ljust(KEY_BYTES, b'\0')
+            if keys and key <= keys[-1]:
+                raise ValueError(f"tax roll rows out of parcel_number order: {parcel!r} after "
+                                 f"{current!r}")
+            if current is not None:
+                close_parcel()
+            keys.append(key)
+            current = parcel
+        elif years[-1] > year:
+            raise ValueError(f"tax roll rows for {parcel!r} out of closed_roll_year order")
+        values = [_amount(row.get(column)) for column in VALUE_COLUMNS]
+        if len(years) > row_offs[-1] and years[-1] == year:
+            # Duplicate roll row for the same year: keep the last one
+            land[-1], fixtures[-1], improvement[-1] = values
+            continue
+        years.append(year)
+        land.append(values[0])
+        fixtures.append(values[1])
+        improvement.append(values[2])
+    if current is not None:
+        close_parcel()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys), len(years)))
+        for key in keys:
+            f.write(key)
+        for column in (row_offs, sale_years, years, land, fixtures, improvement):
+            column.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(keys)
+
+
+class TaxHistory:
+    """The memory-mapped columnar roll"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, rows = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} tax history file")
+        view = memoryview(self._mm)
+        offset = HEADER.size + self.count * KEY_BYTES
+
+        def take(count, fmt, size):
+            nonlocal offset
+            part = view[offset:offset + count * size].cast(fmt)
+            offset += count * size
+            return part
+
+        self._row_offs = take(self.count + 1, 'I', 4)
+        self._sale_years = take(self.count, 'H', 2)
+        self._years = take(rows, 'H', 2)
+        self._land = take(rows, 'd', 8)
+        self._fixtures = take(rows, 'd', 8)
+        self._improvement = take(rows, 'd', 8)
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, i):
+        start = HEADER.size + i * KEY_BYTES
+        return self._mm[start:start + KEY_BYTES]
+
+    def _find(self, blklot):
+        key = blklot.encode('ascii')[:KEY_BYTES].ljust(KEY_BYTES, b'\0')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.count and self._key(lo) == key else None
+
+    def history(self, blklot):
+        """Summary for one parcel, or None if it isn't on the roll"""
+        i = self._find(blklot)
+        if i is None:
+            return None
+        start, end = self._row_offs[i], self._row_offs[i + 1]
+        return summarize(blklot, self._years[start:end].tolist(), self._land[start:end].tolist(),
+                         self._fixtures[start:end].tolist(), self._improvement[start:end].tolist(),
+                         self._sale_years[i] or None)
+
+    def sale_year(self, blklot):
+        i = self._find(blklot)
+        if i is None:
+            return None
+        return likely_sale_year(self._sale_years[i])
+
+
+def get_store():
+    """The mapped tax history, or None if it hasn't been built; remaps after a rebuild"""
+    return get_mapped(TAX_HISTORY_PATH, TaxHistory)
+
+
+def build_tax_history():
+    """Every row of wv5m-vpq2, streamed in parcel/year order"""
+    select = ','.join(('parcel_number', 'closed_roll_year') + VALUE_COLUMNS)
+    rows = iter_dataset_rows('wv5m-vpq2', select=select, order='parcel_number, closed_roll_year')
+    return write_tax_history(TAX_HISTORY_PATH, rows)
+
+
+def main(argv):
+    if len(argv) >= 1 and argv[0] == 'build':
+        start = time.time()
+        count = build_tax_history()
+        print(f"Built tax roll history: {count} parcels in {time.time() - start:.1f}s -> {TAX_HISTORY_PATH}")
+        return 0
+    if len(argv) == 2 and argv[0] == 'show':
+        store = get_store()
+        print(json.dumps(store.history(argv[1]) if store else None, indent=2))
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
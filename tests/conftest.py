@@ -0,0 +1,22 @@
+"""
+Test setup: point DATA_DIR (read by the modules at import time) at a scratch
+directory and put the repo root on sys.path.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='rentcheck-test-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    """A fresh, empty INDEX_DIR with no indexes mapped"""
+    import indexes
+    monkeypatch.setattr(indexes, 'INDEX_DIR', str(tmp_path))
+    monkeypatch.setattr(indexes, '_open_indexes', {})
+    monkeypatch.setattr(indexes, '_last_checked', {})
+    return tmp_path
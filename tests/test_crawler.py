@@ -0,0 +1,93 @@
+"""Crawls a local fixture server standing in for Craigslist search and listing pages."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import crawler
+import listings
+import reposts
+
+SEARCH_PAGE = """<html><body><ul>
+<li><a href="/sfc/apa/d/san-francisco-sunny-one-bedroom/7700000001.html">Sunny 1br</a></li>
+<li><a href="/sfc/apa/d/san-francisco-two-bed-flat/7700000002.html#photos">2br flat</a></li>
+<li><a href="/sfc/apa/d/san-francisco-gone/7700000003.html">Gone</a></li>
+<li><a href="/about/help">help</a></li>
+</ul></body></html>"""
+
+LISTING_PAGE = """<html><body>
+<span id="titletextonly">{title}</span><span class="price">{price}</span>
+<span class="housing">/ {bedrooms}br - {sqft}ft2 -</span>
+<div class="attrgroup"><span>w/d in unit</span><span>cats are OK - purrr</span></div>
+<section id="postingbody">{title}. Bright corner unit with bay windows, hardwood floors, updated kitchen
+and a shared garden, close to transit and the park. Available now, one year lease.</section>
+</body></html>"""
+
+LISTINGS = {
+    '/sfc/apa/d/san-francisco-sunny-one-bedroom/7700000001.html':
+        LISTING_PAGE.format(title='Sunny one bedroom', price='$2,850', bedrooms=1, sqft=600),
+    '/sfc/apa/d/san-francisco-two-bed-flat/7700000002.html':
+        LISTING_PAGE.format(title='Two bed flat', price='$3,900', bedrooms=2, sqft=950),
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path == '/search/sfc/apa':
+            # Second result page is empty, which ends the crawl
+            body, status = ('<html></html>' if 's=' in query else SEARCH_PAGE), 200
+        elif path in LISTINGS:
+            body, status = LISTINGS[path], 200
+        else:
+            body, status = 'This posting has been deleted by its author.', 404
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fixture_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_crawl_fixture_site(fixture_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(listings, 'LISTINGS_DB', str(tmp_path / 'listings.db'))
+    monkeypatch.setattr(reposts, 'REPOSTS_DB', str(tmp_path / 'reposts.db'))
+    progress = []
+
+    summary = crawler.crawl(f"{fixture_server}/search/sfc/apa", max_pages=3, workers=2, interval=0,
+                            resolve_parcels=False, parse_mode='inline',
+                            progress=lambda done, total: progress.append((done, total)))
+
+    assert summary['pages'] == 2
+    assert summary['listings_found'] == 3
+    assert (summary['stored'], summary['failed'], summary['resolved']) == (2, 1, 0)
+    assert progress[-1] == (3, 3)
+
+    stored = {r['title']: r for r in listings.query_listings({})}
+    assert sorted(stored) == ['Sunny one bedroom', 'Two bed flat']
+    assert (stored['Sunny one bedroom']['price'], stored['Sunny one bedroom']['bedrooms']) == (2850, 1.0)
+    assert stored['Two bed flat']['sqft'] == 950
+    assert stored['Two bed flat']['url'] == f"{fixture_server}/sfc/apa/d/san-francisco-two-bed-flat/7700000002.html"
+    assert reposts.fingerprint_count() == 2
+
+
+def test_extract_listing_links_keeps_page_order():
+    links = crawler.extract_listing_links(SEARCH_PAGE, 'https://sfbay.craigslist.org/search/sfc/apa')
+    assert links == [
+        'https://sfbay.craigslist.org/sfc/apa/d/san-francisco-sunny-one-bedroom/7700000001.html',
+        'https://sfbay.craigslist.org/sfc/apa/d/san-francisco-two-bed-flat/7700000002.html',
+        'https://sfbay.craigslist.org/sfc/apa/d/san-francisco-gone/7700000003.html',
+    ]
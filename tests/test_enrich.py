@@ -0,0 +1,62 @@
+import json
+
+import app
+import enrich
+
+
+def read_output(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_error_rows_are_retried_on_resume(tmp_path, monkeypatch):
+    input_path = tmp_path / 'parcels.jsonl'
+    input_path.write_text('{"parcel": "0280/001"}\n{"parcel": "0280/002"}\n{"parcel": "0280/001"}\n')
+    output_path = str(tmp_path / 'out.jsonl')
+    calls = []
+
+    def flaky(address=None, parcel=None):
+        calls.append(parcel)
+        if parcel == '0280/002' and calls.count(parcel) == 1:
+            return {'error': 'Property not found', 'details': 'upstream timeout'}
+        return {'address': f"parcel {parcel}", 'owner': 'SUTTER HOLDINGS LLC'}
+    monkeypatch.setattr(app, 'get_property_details', flaky)
+
+    first = enrich.enrich(str(input_path), output_path, workers=2, fields=None)
+    assert (first['enriched'], first['deduplicated'], first['failed']) == (2, 1, 1)
+    assert sorted(r['row'] for r in read_output(output_path)) == [0, 2]
+    assert enrich.Checkpoint(output_path + '.checkpoint.db').parcel('0280002') is None
+
+    second = enrich.enrich(str(input_path), output_path, workers=2, fields=None)
+    assert (second['resumed'], second['enriched'], second['failed']) == (2, 1, 0)
+    rows = {r['row']: r for r in read_output(output_path)}
+    assert sorted(rows) == [0, 1, 2]
+    assert rows[1]['status'] == 'ok' and rows[1]['property']['address'] == 'parcel 0280/002'
+    # 0280/001 came from the checkpoint, 0280/002 was fetched twice
+    assert sorted(calls) == ['0280/001', '0280/002', '0280/002']
+
+
+def test_failed_address_lookup_is_not_checkpointed_as_unresolved(tmp_path, monkeypatch):
+    input_path = tmp_path / 'addresses.jsonl'
+    input_path.write_text('{"address": "100 Sutter St"}\n{"address": "1 Nowhere Ln"}\n')
+    output_path = str(tmp_path / 'out.jsonl')
+    outage = [True]
+
+    def parcel_info(address=None, strict=False):
+        assert strict
+        if outage[0] and address == '100 Sutter St':
+            raise RuntimeError('Parcel lookup failed: HTTP 503')
+        return {'blklot': '0280001'} if address == '100 Sutter St' else None
+    monkeypatch.setattr(app, 'get_parcel_info', parcel_info)
+    monkeypatch.setattr(app, 'get_property_details', lambda address=None, parcel=None: {'address': address})
+
+    first = enrich.enrich(str(input_path), output_path, workers=2, fields=None)
+    assert (first['enriched'], first['unresolved'], first['failed']) == (0, 1, 1)
+    checkpoint = enrich.Checkpoint(output_path + '.checkpoint.db')
+    assert checkpoint.address('100 SUTTER ST') is None
+    assert checkpoint.address('1 NOWHERE LN') == ''
+
+    outage[0] = False
+    second = enrich.enrich(str(input_path), output_path, workers=2, fields=None)
+    assert (second['resumed'], second['enriched'], second['failed']) == (1, 1, 0)
+    assert {r['row']: r['status'] for r in read_output(output_path)} == {0: 'ok', 1: 'unresolved'}
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+
+import pytest
+
+import export
+import snapshots
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(snapshots, '_cache', snapshots.OrderedDict())
+
+
+def saved(n):
+    return snapshots.dehydrate({
+        'id': n, 'address': f"{n} SUTTER ST", 'blklot': f"0280{n:03d}", 'owner': 'SUTTER HOLDINGS LLC',
+        'notes': 'has "quotes", commas\nand a newline', 'eviction_count': n,
+        'permits': [{'status': 'issued'}],
+    })
+
+
+def test_ndjson_is_one_hydrated_document_per_chunk():
+    chunks = list(export.ndjson_chunks([saved(1), saved(2)], export.parse_fields('', 'ndjson')))
+    assert len(chunks) == 2 and all(chunk.endswith('\n') for chunk in chunks)
+    documents = [json.loads(chunk) for chunk in chunks]
+    # Snapshot fields come back with the entry's own
+    assert [(d['id'], d['owner'], d['eviction_count']) for d in documents] == \
+        [(1, 'SUTTER HOLDINGS LLC', 1), (2, 'SUTTER HOLDINGS LLC', 2)]
+    assert snapshots.SNAPSHOT_KEY not in documents[0]
+
+
+def test_ndjson_keeps_only_requested_fields():
+    chunks = export.ndjson_chunks([saved(1)], export.parse_fields('id,owner,missing', 'ndjson'))
+    assert [json.loads(chunk) for chunk in chunks] == [{'id': 1, 'owner': 'SUTTER HOLDINGS LLC', 'missing': None}]
+
+
+def test_csv_streams_a_chunk_per_property():
+    fields = export.parse_fields('id,owner,notes,permits', 'csv')
+    chunks = list(export.csv_chunks((saved(n) for n in (1, 2)), fields))
+    # The header goes out with the first row
+    assert len(chunks) == 2 and chunks[0].startswith('id,owner,notes,permits\r\n')
+    rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+    assert [row['id'] for row in rows] == ['1', '2']
+    assert rows[0]['notes'] == 'has "quotes", commas\nand a newline'
+    # Nested values are JSON-encoded
+    assert json.loads(rows[0]['permits']) == [{'status': 'issued'}]
+
+
+def test_csv_without_properties_is_just_the_header():
+    assert list(export.csv_chunks([], ['id', 'owner'])) == ['id,owner\r\n']
+
+
+def test_default_fields():
+    assert export.parse_fields('', 'csv') == export.DEFAULT_FIELDS
+    assert export.parse_fields('all', 'csv') is None
+    assert export.parse_fields(' id , owner ,', 'parquet') == ['id', 'owner']
+
+
+def test_parquet_streams_row_groups(monkeypatch):
+    pq = pytest.importorskip('pyarrow.parquet')
+    monkeypatch.setattr(export, 'PARQUET_BATCH_SIZE', 2)
+    chunks = list(export.parquet_chunks([saved(n) for n in range(1, 6)], ['id', 'owner', 'eviction_count']))
+    # Three row groups, each sent as written; the footer closes the last chunk
+    assert len(chunks) == 3
+    table = pq.read_table(io.BytesIO(b''.join(chunks)))
+    assert table.column('id').to_pylist() == [1.0, 2.0, 3.0, 4.0, 5.0]
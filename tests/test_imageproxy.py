@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+import app
+import imageproxy
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+def image_url(n):
+    return f"https://images.craigslist.org/00{n:03d}_abcdefghijk_0CI0t2_600x450.jpg"
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(imageproxy, 'IMAGE_CACHE_DIR', str(tmp_path / 'images'))
+    monkeypatch.setattr(imageproxy, '_cache_bytes', None)
+    monkeypatch.setattr(imageproxy, '_pinned_bytes', 0)
+    monkeypatch.setattr(imageproxy, '_stats', dict.fromkeys(imageproxy._stats, 0))
+    # 1000-byte "JPEGs", distinct per URL
+    monkeypatch.setattr(imageproxy.upstream, 'get', lambda url, **kwargs: FakeResponse(
+        b'\xff\xd8\xff' + url.encode('ascii').ljust(997, b'.')))
+    return tmp_path
+
+
+def test_only_listing_image_hosts_are_fetched():
+    assert imageproxy.allowed(image_url(1))
+    assert not imageproxy.allowed('http://169.254.169.254/latest/meta-data/')
+    with pytest.raises(imageproxy.ImageError):
+        imageproxy.original('https://example.com/a.jpg')
+
+
+def test_original_is_fetched_once():
+    digest, data = imageproxy.original(image_url(1))
+    assert imageproxy.original(image_url(1)) == (digest, data)
+    assert (imageproxy._stats['fetches'], imageproxy._stats['hits']) == (1, 1)
+
+
+def test_pin_is_held_until_every_owner_releases_it():
+    digest = imageproxy.pin([image_url(1)], 1700000000001)[0]
+    imageproxy.pin([image_url(1)], 1700000000002)
+    imageproxy.unpin([image_url(1)], 1700000000001)
+    assert digest in imageproxy._pinned()
+    imageproxy.unpin([image_url(1)], 1700000000002)
+    assert digest not in imageproxy._pinned()
+
+
+def test_pinned_bytes_are_outside_the_bound(monkeypatch):
+    monkeypatch.setattr(imageproxy, 'IMAGE_CACHE_MAX_BYTES', 3500)
+    pinned = imageproxy.pin([image_url(n) for n in range(5)], 1)
+    assert len(pinned) == 5
+    scans = []
+    real_scan = imageproxy._cache_files
+    monkeypatch.setattr(imageproxy, '_cache_files', lambda: scans.append(1) or real_scan())
+
+    # 5000 pinned bytes are already past the bound; unpinned writes still fit
+    for n in range(10, 13):
+        imageproxy.original(image_url(n))
+    assert imageproxy._stats['evicted'] == 0
+    assert len(scans) <= 1
+
+    # The fourth unpinned image goes over: the oldest unpinned one is evicted, pinned ones stay
+    imageproxy.original(image_url(13))
+    assert imageproxy._stats['evicted'] >= 1
+    assert set(pinned) <= {name for _, _, _, name in real_scan()}
+    stats = imageproxy.stats()
+    assert stats['bytes'] <= 3500 * imageproxy.IMAGE_CACHE_LOW_WATER
+    assert stats['pinned_bytes'] == 5000
+    assert not os.path.exists(imageproxy._path('blobs', imageproxy.hashlib.sha256(
+        b'\xff\xd8\xff' + image_url(10).encode('ascii').ljust(997, b'.')).hexdigest()))
+
+
+def test_pin_endpoints():
+    client = app.app.test_client()
+    assert client.post('/api/images/pin', json={'urls': [image_url(1)]}).status_code == 400
+    assert client.post('/api/images/pin', json={'property_id': 1, 'urls': [image_url(n) for n in range(60)]}) \
+        .status_code == 400
+
+    digest = imageproxy.pin([image_url(1)], 1700000000001)[0]
+    response = client.post('/api/images/unpin', json={'property_id': 1700000000001,
+                                                      'urls': [image_url(1), 'https://example.com/x.jpg']})
+    assert (response.status_code, response.get_json()) == (200, {'unpinned': 1})
+    assert digest not in imageproxy._pinned()
+
+
+def test_pinned_bytes_have_their_own_cap(monkeypatch):
+    monkeypatch.setattr(imageproxy, '_pinned_bytes', None)
+    monkeypatch.setattr(imageproxy, 'IMAGE_PIN_MAX_BYTES', 2500)
+    assert len(imageproxy.pin([image_url(n) for n in range(3)], 1)) == 2
+    assert imageproxy._stats['pins_refused'] == 1
+    # An image already pinned can gain owners past the cap
+    assert len(imageproxy.pin([image_url(0)], 2)) == 1
+    # Releasing frees room under the cap
+    imageproxy.unpin([image_url(1)], 1)
+    assert len(imageproxy.pin([image_url(2)], 1)) == 1
+
+
+def test_listing_photos_have_their_own_admission_bucket(monkeypatch):
+    monkeypatch.setattr(app.admission, '_buckets', {})
+    monkeypatch.setattr(app.admission, 'ADMISSION_ENABLED', True)
+    monkeypatch.setattr(app.imageproxy, 'thumbnail', lambda url, width: ('etag', b'jpeg', 'image/jpeg'))
+    client = app.app.test_client()
+    statuses = [client.get('/api/images', query_string={'url': image_url(n), 'w': 300}).status_code
+                for n in range(30)]
+    assert statuses == [200] * 30
+    # Photos didn't spend the client's API tokens, nor hold its in-flight slots
+    assert list(app.admission._buckets) == ['127.0.0.1 images']
+    assert app.admission.stats()['in_flight'] == 0
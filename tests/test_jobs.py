@@ -0,0 +1,172 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture(autouse=True)
+def jobs_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOBS_DB', str(tmp_path / 'jobs.db'))
+    monkeypatch.setattr(jobs, 'POLL_INTERVAL', 0.05)
+
+
+def handler(monkeypatch, fn, kind='test'):
+    monkeypatch.setitem(jobs.HANDLERS, kind, fn)
+    return kind
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        jobs.enqueue('no-such-kind')
+
+
+def test_claim_runs_jobs_in_order(monkeypatch):
+    def echo(params, progress):
+        progress(1, 2, 'halfway')
+        return {'echo': params['n']}
+    kind = handler(monkeypatch, echo)
+    first, second = jobs.enqueue(kind, {'n': 1}), jobs.enqueue(kind, {'n': 2})
+
+    job = jobs.claim()
+    assert (job['id'], job['status'], job['attempts']) == (first, 'running', 1)
+    jobs.run_job(job)
+    done = jobs.get_job(first)
+    assert (done['status'], done['result']) == ('succeeded', {'echo': 1})
+    assert (done['progress_done'], done['progress_total'], done['message']) == (1, 2, 'halfway')
+    assert jobs.claim()['id'] == second
+    assert jobs.claim() is None
+
+
+def test_transient_failure_backs_off_then_fails(monkeypatch):
+    kind = handler(monkeypatch, lambda params, progress: 1 / 0)
+    job_id = jobs.enqueue(kind, max_attempts=2)
+
+    jobs.run_job(jobs.claim())
+    job = jobs.get_job(job_id)
+    assert (job['status'], job['attempts']) == ('queued', 1)
+    assert job['run_after'] >= time.time() + jobs.BACKOFF_BASE * 0.8 - 1
+    assert 'division by zero' in job['error']
+    # Not runnable until the backoff passes
+    assert jobs.claim() is None
+
+    jobs.connect().execute('UPDATE jobs SET run_after = 0 WHERE id = ?', (job_id,))
+    jobs.run_job(jobs.claim())
+    job = jobs.get_job(job_id)
+    assert (job['status'], job['attempts']) == ('failed', 2)
+
+
+def test_bad_parameters_are_not_retried(monkeypatch):
+    kind = handler(monkeypatch, lambda params, progress: params['missing'])
+    job_id = jobs.enqueue(kind)
+    jobs.run_job(jobs.claim())
+    job = jobs.get_job(job_id)
+    assert (job['status'], job['attempts']) == ('failed', 1)
+
+
+def test_backoff_grows_and_is_capped():
+    assert jobs.BACKOFF_BASE * 0.8 <= jobs.backoff(1) <= jobs.BACKOFF_BASE * 1.2
+    assert jobs.BACKOFF_BASE * 4 * 0.8 <= jobs.backoff(3) <= jobs.BACKOFF_BASE * 4 * 1.2
+    assert jobs.backoff(30) <= jobs.BACKOFF_MAX * 1.2
+
+
+def test_cancel_queued_and_running(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow(params, progress):
+        started.set()
+        release.wait(5)
+        progress(1, 1)
+        return 'finished'
+    kind = handler(monkeypatch, slow)
+
+    queued = jobs.enqueue(kind)
+    assert jobs.cancel_job(queued)['status'] == 'cancelled'
+    assert jobs.claim() is None
+
+    running = jobs.enqueue(kind)
+    job = jobs.claim()
+    thread = threading.Thread(target=jobs.run_job, args=(job,))
+    thread.start()
+    started.wait(5)
+    assert jobs.cancel_job(running)['cancel_requested'] is True
+    release.set()
+    thread.join(5)
+    assert jobs.get_job(running)['status'] == 'cancelled'
+
+
+def test_stale_running_job_is_requeued(monkeypatch):
+    kind = handler(monkeypatch, lambda params, progress: None)
+    job_id = jobs.enqueue(kind)
+    jobs.claim()
+    assert jobs.requeue_stale() == 0
+    jobs.connect().execute('UPDATE jobs SET heartbeat_at = ? WHERE id = ?',
+                           (time.time() - jobs.STALE_AFTER - 1, job_id))
+    assert jobs.requeue_stale() == 1
+    assert jobs.claim()['attempts'] == 2
+
+
+def test_worker_pool_drains_queue(monkeypatch):
+    kind = handler(monkeypatch, lambda params, progress: params['n'] * 2)
+    ids = [jobs.enqueue(kind, {'n': n}) for n in range(5)]
+    stop = threading.Event()
+    worker = threading.Thread(target=jobs.work, args=(2, stop))
+    worker.start()
+    deadline = time.time() + 10
+    while jobs.stats()['succeeded'] < len(ids) and time.time() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    worker.join(5)
+    assert [jobs.get_job(i)['result'] for i in ids] == [0, 2, 4, 6, 8]
+    assert jobs.stats()['queued'] == 0
+
+
+class FakeProcess:
+    def __init__(self, code=None):
+        self.pid = 4242
+        self.code = code
+        self.exited = threading.Event()
+        if code is not None:
+            self.exited.set()
+
+    def wait(self, timeout=None):
+        self.exited.wait(timeout)
+        return self.code
+
+    def poll(self):
+        return self.code
+
+    def terminate(self):
+        self.code = -15
+        self.exited.set()
+
+
+def test_gunicorn_restarts_the_job_worker_when_it_exits(monkeypatch):
+    import importlib.util
+    import logging
+    import os
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', path)
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+    assert conf.JOB_WORKERS == int(os.environ.get('JOB_WORKERS', '0'))
+
+    crashed, replacement = FakeProcess(code=1), FakeProcess()
+    started = []
+    monkeypatch.setattr(conf, 'JOB_WORKERS', 2)
+    monkeypatch.setattr(conf.subprocess, 'Popen', lambda *args, **kwargs: started.append(1) or
+                        [crashed, replacement][len(started) - 1])
+    server = type('Server', (), {'log': logging.getLogger('gunicorn-test')})()
+
+    conf.when_ready(server)
+    deadline = time.time() + 5
+    while len(started) < 2 and time.time() < deadline:
+        time.sleep(0.05)
+    assert len(started) == 2
+
+    # Shutting down stops the replacement and isn't followed by another restart
+    conf.on_exit(server)
+    assert replacement.code == -15
+    time.sleep(0.1)
+    assert len(started) == 2
@@ -0,0 +1,55 @@
+import os
+
+import indexes
+import linkage
+
+
+def rows(*pairs):
+    return [{'address': address, 'file_date': date} for address, date in pairs]
+
+
+def build(index_dir, monkeypatch, evictions):
+    indexes.write_index(indexes.index_path('address_blklot'), [('100 SUTTER ST', ['0280001'])])
+    datasets = {'5cei-gny5': evictions}
+    monkeypatch.setattr(indexes, 'iter_dataset_rows', lambda dataset, **kwargs: iter(datasets.get(dataset, [])))
+    monkeypatch.setattr(linkage, 'REPORT_PATH', os.path.join(str(index_dir), 'report.json'))
+    return linkage.build()
+
+
+def test_block_records_are_not_counted_against_the_parcel(index_dir, monkeypatch):
+    report = build(index_dir, monkeypatch, rows(
+        ('100 Sutter St', '2021-05-01'),
+        ('100 Sutter St #4', '2019-02-01'),
+        ('150 Sutter St', '2022-01-01'),        # doesn't resolve: filed under the block
+        ('100 BLOCK OF SUTTER ST', '2020-07-01'),
+    ))
+    stats = report['datasets']['evictions']
+    assert (stats['parcel_exact'], stats['unlinked'], stats['block']) == (2, 1, 1)
+
+    linked = linkage.lookup(blklot='0280001', normalized_address='100 SUTTER ST')
+    assert linked['counts']['evictions'] == 2
+    assert [r['file_date'] for r in linked['evictions']] == ['2021-05-01', '2019-02-01']
+    assert linked['block_counts']['evictions'] == 2
+    assert [r['file_date'] for r in linked['block']['evictions']] == ['2022-01-01', '2020-07-01']
+
+
+def test_neighbour_on_the_block_gets_only_block_records(index_dir, monkeypatch):
+    build(index_dir, monkeypatch, rows(('100 Sutter St', '2021-05-01'), ('100 BLOCK OF SUTTER ST', '2020-07-01')))
+    linked = linkage.lookup(blklot='0280002', normalized_address='120 SUTTER ST')
+    assert linked['counts'] == {'evictions': 0, 'complaints': 0, 'buyouts': 0}
+    assert linked['evictions'] == []
+    assert linked['block_counts']['evictions'] == 1
+    # With no links of its own, the history falls back to the block's records, labeled as such
+    assert [(r['file_date'], r['match']) for r in linkage.history(linked, 'evictions', 10)] == \
+        [('2020-07-01', 'block')]
+    assert linkage.history(linked, 'complaints', 10) == []
+
+
+def test_parcel_history_keeps_its_own_records(index_dir, monkeypatch):
+    build(index_dir, monkeypatch, rows(('100 Sutter St', '2021-05-01'), ('100 BLOCK OF SUTTER ST', '2020-07-01')))
+    linked = linkage.lookup(blklot='0280001', normalized_address='100 SUTTER ST')
+    assert [r.get('match') for r in linkage.history(linked, 'evictions', 10)] == [None]
+
+
+def test_lookup_without_table(index_dir):
+    assert linkage.lookup(blklot='0280001') is None
@@ -0,0 +1,37 @@
+import linkcheck
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+
+
+def test_only_craigslist_hosts_allowed():
+    assert linkcheck.allowed('https://sfbay.craigslist.org/sfc/apa/d/x/123.html')
+    assert linkcheck.allowed('https://craigslist.org/')
+    assert not linkcheck.allowed('http://169.254.169.254/latest/meta-data/')
+    assert not linkcheck.allowed('http://localhost:5000/api/jobs')
+    assert not linkcheck.allowed('https://evilcraigslist.org/')
+    assert not linkcheck.allowed('https://craigslist.org.evil.com/')
+    assert not linkcheck.allowed('ftp://sfbay.craigslist.org/')
+
+
+def test_disallowed_url_is_never_fetched(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('fetched a disallowed URL')
+    monkeypatch.setattr(linkcheck.upstream, 'get', fail)
+    result = linkcheck.check_link('http://10.0.0.1/admin')
+    assert result['status'] == 'unknown'
+    assert result['http_status'] is None
+    assert 'http://10.0.0.1/admin' not in linkcheck._cache
+
+
+def test_status_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(linkcheck.upstream, 'get', lambda url, **kwargs: FakeResponse(200, 'listing'))
+    monkeypatch.setattr(linkcheck, 'CACHE_MAX_ENTRIES', 3)
+    monkeypatch.setattr(linkcheck, '_cache', linkcheck.OrderedDict())
+    urls = [f"https://sfbay.craigslist.org/apa/{i}.html" for i in range(5)]
+    for url in urls:
+        assert linkcheck.check_link(url)['status'] == 'live'
+    assert list(linkcheck._cache) == urls[2:]
@@ -0,0 +1,43 @@
+import multiprocessing
+import time
+
+import listing_parser
+
+LISTING = """<html><body><span id="titletextonly">Sunny one bedroom</span>
+<span class="price">$2,850</span><span class="housing">/ 1br - 600ft2 -</span></body></html>"""
+
+
+def test_inline_parse():
+    amenities = listing_parser.parse_listing_html(LISTING, mode='inline')
+    assert amenities['listing_title'] == 'Sunny one bedroom'
+    assert (amenities['listing_price'], amenities['listing_bedrooms'], amenities['listing_sqft']) == \
+        ('$2,850', '1', '600')
+
+
+def test_timeout_recycles_pool(monkeypatch):
+    monkeypatch.setattr(listing_parser, 'PARSE_WORKERS', 1)
+    monkeypatch.setattr(listing_parser, '_pool', None)
+    # Nothing finishes this fast (the worker process is still starting)
+    monkeypatch.setattr(listing_parser, 'PARSE_TIMEOUT', 0.001)
+    first = listing_parser._get_pool()
+    try:
+        listing_parser.parse_listing_html(LISTING, mode='process')
+        raise AssertionError('expected a timeout')
+    except TimeoutError:
+        pass
+    assert listing_parser._pool is None
+    # The stuck worker was killed, not left running
+    deadline = time.time() + 5
+    while multiprocessing.active_children() and time.time() < deadline:
+        time.sleep(0.05)
+    assert multiprocessing.active_children() == []
+
+    monkeypatch.setattr(listing_parser, 'PARSE_TIMEOUT', 30)
+    try:
+        amenities = listing_parser.parse_listing_html(LISTING, mode='process')
+        assert listing_parser._pool is not first
+        assert amenities['listing_title'] == 'Sunny one bedroom'
+    finally:
+        listing_parser._pool.shutdown()
+    # Every slot was given back
+    assert listing_parser._slots._value == listing_parser.PARSE_QUEUE_LIMIT
@@ -0,0 +1,33 @@
+import listings
+
+
+def store(conn, url, rent_controlled, price=3000):
+    listings.upsert_listing(url, {'listing_price': f"${price}"}, rent_controlled=rent_controlled, conn=conn)
+
+
+def urls(results):
+    return sorted(r['url'] for r in results)
+
+
+def test_rent_controlled_filter_matches_exact_values(tmp_path):
+    conn = listings.connect(str(tmp_path / 'listings.db'))
+    store(conn, 'likely-yes', 'Likely Yes (Built before 1979)')
+    store(conn, 'verified', 'Yes (Verified by Rent Board)')
+    store(conn, 'likely-no', 'Likely No (Built after 1979)')
+    store(conn, 'unknown', 'Unknown')
+    store(conn, 'not-available', 'Not available')
+    store(conn, 'unresolved', None)
+
+    assert urls(listings.query_listings({'rent_controlled': 'yes'}, conn=conn)) == ['likely-yes', 'verified']
+    assert urls(listings.query_listings({'rent_controlled': 'no'}, conn=conn)) == ['likely-no']
+    assert urls(listings.query_listings({'rent_controlled': 'false'}, conn=conn)) == ['likely-no']
+    assert len(listings.query_listings({}, conn=conn)) == 6
+
+
+def test_price_and_bedroom_filters(tmp_path):
+    conn = listings.connect(str(tmp_path / 'listings.db'))
+    listings.upsert_listing('a', {'listing_price': '$2,400', 'listing_bedrooms': '1'}, conn=conn)
+    listings.upsert_listing('b', {'listing_price': '$3,900', 'listing_bedrooms': '2'}, conn=conn)
+    listings.upsert_listing('c', {'listing_price': '$5,100', 'listing_bedrooms': '3'}, conn=conn)
+    results = listings.query_listings({'max_price': '4000', 'min_bedrooms': '2'}, conn=conn)
+    assert [(r['url'], r['price'], r['bedrooms']) for r in results] == [('b', 3900, 2.0)]
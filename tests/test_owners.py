@@ -0,0 +1,43 @@
+import indexes
+import linkage
+import owners
+
+
+def test_owner_names_normalize_to_one_id():
+    assert owners.normalize_owner('Sutter Holdings, L.L.C.') == 'SUTTER HOLDINGS LLC'
+    assert owners.owner_id('SUTTER HOLDINGS LLC') == owners.owner_id('Sutter Holdings, L.L.C.') == \
+        'sutter-holdings-llc'
+    assert owners.owner_id('The Smith Family Trust') == 'smith-family-tr'
+    assert owners.owner_id('  ') is None
+
+
+def test_build_rolls_up_parcel_links(index_dir, monkeypatch, caplog):
+    parcels = [
+        {'blklot': '0280001', 'owner': 'Sutter Holdings, L.L.C.', 'address': '1250 SUTTER ST', 'number_of_units': '12'},
+        {'blklot': '0280002', 'owner': 'SUTTER HOLDINGS LLC', 'address': '1260 SUTTER ST', 'number_of_units': '4'},
+        {'blklot': '0290001', 'owner': 'Someone Else', 'address': '10 POLK ST', 'number_of_units': '2'},
+    ]
+    monkeypatch.setattr(owners, 'iter_parcel_rows', lambda: iter(parcels))
+
+    # Without the linkage table: a warning, no counts
+    assert owners.build() == {'owners': 2, 'parcels': 3}
+    assert any('record_links index not found' in r.getMessage() for r in caplog.records)
+
+    indexes.write_index(indexes.index_path(linkage.INDEX_NAME), [
+        ('P:0280001', {'counts': {'evictions': 2}, 'evictions': [{'file_date': '2024-03-01'}]}),
+        ('P:0280002', {'counts': {'evictions': 1}, 'evictions': [{'file_date': '2025-06-01'}]}),
+        # Block-level records aren't any one owner's
+        ('B:1200 SUTTER ST', {'counts': {'evictions': 9}, 'evictions': [{'file_date': '2026-01-01'}]}),
+        ('B:0 POLK ST', {'counts': {'complaints': 4}}),
+    ])
+    owners.build()
+    portfolio = owners.lookup_parcel('0280002')
+    assert (portfolio['owner_id'], portfolio['parcels'], portfolio['units']) == ('sutter-holdings-llc', 2, 16)
+    assert (portfolio['evictions'], portfolio['parcels_with_evictions'], portfolio['last_evictions']) == \
+        (3, 2, '2025-06-01')
+    assert [p['blklot'] for p in owners.lookup('sutter-holdings-llc')['parcels']] == ['0280001', '0280002']
+    # Every Sutter parcel has its own eviction links, so the block's aren't added
+    assert (portfolio['block_evictions'], portfolio['complaints'], portfolio['block_complaints']) == (0, 0, 0)
+    # A parcel with no links of its own reports its block's records apart, not 0
+    other = owners.lookup_parcel('0290001')
+    assert (other['complaints'], other['block_complaints'], other['block_evictions']) == (0, 4, 0)
@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+import prefetch
+
+
+@pytest.fixture(autouse=True)
+def fresh_jobs(monkeypatch):
+    monkeypatch.setattr(prefetch, '_jobs', {})
+
+
+def blocking_work(release):
+    def work(job):
+        job.checkpoint('waiting')
+        release.wait(5)
+        job.checkpoint('done')
+    return work
+
+
+def test_cap_is_per_caller_whatever_client_id_it_sends():
+    release = threading.Event()
+    try:
+        first = prefetch.submit('10.0.0.1', 'tab-1', ('a',), blocking_work(release))
+        second = prefetch.submit('10.0.0.1', 'tab-2', ('b',), blocking_work(release))
+        assert first is not None and second is not None
+        # A fresh client_id doesn't buy another slot
+        assert prefetch.submit('10.0.0.1', 'tab-3', ('c',), blocking_work(release)) is None
+        # Another caller has its own
+        assert prefetch.submit('10.0.0.2', 'tab-1', ('c',), blocking_work(release)) is not None
+    finally:
+        release.set()
+
+
+def test_cancel_applies_to_one_client_id():
+    release = threading.Event()
+    try:
+        first = prefetch.submit('10.0.0.1', 'tab-1', ('a',), blocking_work(release))
+        second = prefetch.submit('10.0.0.1', 'tab-2', ('b',), blocking_work(release))
+        assert prefetch.cancel('10.0.0.1', 'tab-1') == 1
+        assert first.cancelled.is_set() and not second.cancelled.is_set()
+    finally:
+        release.set()
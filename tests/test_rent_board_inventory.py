@@ -0,0 +1,38 @@
+import app
+from records import RentBoardUnit
+
+ROWS = [
+    {'block_address': '1200 Block of SUTTER ST', 'bedroom_count': '1', 'bathroom_count': '1',
+     'square_footage': '600', 'monthly_rent': '2800', 'submission_year': '2024', 'year_property_built': '1925',
+     'unit_count': '12', 'base_rent_includes_water_sewer': 'Y'},
+    {'block_address': '1200 Block of SUTTER ST', 'bedroom_count': '1', 'bathroom_count': '1',
+     'square_footage': '600', 'monthly_rent': '2650', 'submission_year': '2023', 'year_property_built': '1925'},
+    {'block_address': '1200 Block of SUTTER ST', 'bedroom_count': '2', 'bathroom_count': '1',
+     'square_footage': '900', 'monthly_rent': '3900', 'submission_year': '2023', 'year_property_built': '1925'},
+]
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self._data = data
+        self.status_code = status_code
+        self.url = 'https://data.sfgov.org/resource/gdc7-dmcn.json'
+
+    def json(self):
+        return self._data
+
+
+def test_inventory_keeps_each_units_latest_row(monkeypatch):
+    monkeypatch.setattr(app, 'soql_get', lambda url, params, select=None: FakeResponse(ROWS))
+    monkeypatch.setattr(app.upstream, 'get', lambda url, params=None, **kwargs: FakeResponse([], 500))
+
+    inventory = app.get_rent_board_housing_inventory(parcel='0280/001')
+    # Newest submission per unit wins; rows pass through to the response as they arrived
+    assert inventory['units'] == [ROWS[0], ROWS[2]]
+    assert inventory['units'][0] is ROWS[0]
+    assert inventory['units_found'] == 2
+
+    # The merge reads the newest one typed
+    newest = RentBoardUnit.from_row(inventory['units'][0])
+    assert (newest.submission_year, newest.unit_key) == (2024, RentBoardUnit.row_key(ROWS[1]))
+    assert newest.utilities()['water_sewer'] is True
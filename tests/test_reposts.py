@@ -0,0 +1,124 @@
+import random
+
+import pytest
+
+import app
+import reposts
+
+WORDS = ('sunny bright spacious quiet corner unit bay windows hardwood floors updated kitchen garden '
+         'laundry parking transit park view deck storage closet dishwasher heat water included lease '
+         'available now pets considered walk score cafes shops near muni line block from').split()
+
+
+def body(seed, length=250):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def edit(text, changes, seed=0):
+    """Replace `changes` words at random positions"""
+    rng = random.Random(seed)
+    words = text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = 'changed'
+    return ' '.join(words)
+
+
+def distance(a, b):
+    return bin(int(reposts.simhash(a), 16) ^ int(reposts.simhash(b), 16)).count('1')
+
+
+@pytest.fixture
+def conn(tmp_path):
+    return reposts.connect(str(tmp_path / 'reposts.db'))
+
+
+def amenities(text=None, images=(), title='Sunny 1br'):
+    return {'listing_simhash': reposts.simhash(text) if text else None, 'listing_images': list(images),
+            'listing_title': title, 'listing_price': '$2,850'}
+
+
+def image(n):
+    return f"https://images.craigslist.org/00{n:03d}_abcdefghijk_0CI0t2_600x450.jpg"
+
+
+def test_simhash_thresholds():
+    original = body(1)
+    assert reposts.simhash('qr code link to this post ' + original) == reposts.simhash(original)
+    assert reposts.simhash('two bedroom flat') is None
+    # A reworded line in a listing-length body stays within the threshold
+    assert max(distance(original, edit(original, 1, seed)) for seed in range(1, 5)) <= reposts.MAX_HAMMING
+    # Unrelated texts land near 32 bits apart, far outside the threshold
+    assert min(distance(body(seed), body(seed + 100)) for seed in range(20)) > reposts.MAX_HAMMING * 2
+
+
+def test_band_lookup_finds_close_hashes(conn):
+    # Flip a few bits directly: anything within TEXT_BANDS - 1 bits shares a band
+    base = int(reposts.simhash(body(1)), 16)
+    near = base ^ 0b1 ^ (1 << 20) ^ (1 << 40)
+    far = base ^ sum(1 << b for b in range(0, 64, 4))
+    reposts.record('https://sfbay.craigslist.org/a/1.html', {'listing_simhash': f"{base:016x}"}, conn=conn)
+    assert reposts.find_reposts('https://sfbay.craigslist.org/a/2.html', {'listing_simhash': f"{near:016x}"},
+                                conn)[0]['text_distance'] == 3
+    assert reposts.find_reposts('https://sfbay.craigslist.org/a/3.html', {'listing_simhash': f"{far:016x}"},
+                                conn) == []
+
+
+def test_edited_repost_is_found_and_unrelated_listing_is_not(conn):
+    original = body(1)
+    reposts.record('https://sfbay.craigslist.org/a/1.html', amenities(original), conn=conn)
+    reposts.record('https://sfbay.craigslist.org/a/2.html', amenities(body(2)), conn=conn)
+    matches = reposts.record('https://sfbay.craigslist.org/a/3.html', amenities(edit(original, 1, 1)), conn=conn)
+    assert [m['listing_url'] for m in matches] == ['https://sfbay.craigslist.org/a/1.html']
+    # Its own URL never matches itself
+    assert reposts.find_reposts('https://sfbay.craigslist.org/a/1.html', amenities(original), conn) != []
+    assert all(m['listing_url'] != 'https://sfbay.craigslist.org/a/1.html'
+               for m in reposts.find_reposts('https://sfbay.craigslist.org/a/1.html', amenities(original), conn))
+
+
+def test_shared_photo_thresholds(conn):
+    reposts.record('https://sfbay.craigslist.org/a/1.html', amenities(images=[image(1), image(2), image(3)]),
+                   conn=conn)
+    one = reposts.find_reposts('https://sfbay.craigslist.org/a/2.html', amenities(images=[image(1), image(9)]), conn)
+    two = reposts.find_reposts('https://sfbay.craigslist.org/a/3.html', amenities(images=[image(1), image(2)]), conn)
+    single = reposts.find_reposts('https://sfbay.craigslist.org/a/4.html', amenities(images=[image(3)]), conn)
+    assert one == []
+    assert two[0]['shared_images'] == 2
+    # A single-photo listing needs just that photo
+    assert single[0]['shared_images'] == 1
+    # Resized variants of the same photo are the same key
+    assert reposts.image_keys([image(1), image(1).replace('600x450', '1200x900')]) == ['00001_abcdefghijk_0CI0t2']
+
+
+def test_attach_and_detach(conn):
+    reposts.record('https://sfbay.craigslist.org/a/1.html', amenities(body(1)), conn=conn)
+    reposts.attach('https://sfbay.craigslist.org/a/1.html', 42, conn=conn)
+    match = reposts.find_reposts('https://sfbay.craigslist.org/a/2.html', amenities(body(1)), conn)[0]
+    assert match['property_id'] == 42
+    reposts.detach(42, conn=conn)
+    assert reposts.find_reposts('https://sfbay.craigslist.org/a/2.html', amenities(body(1)), conn)[0]['property_id'] \
+        is None
+
+
+def test_repost_endpoint_matches_the_callers_saved_listings(tmp_path, monkeypatch):
+    monkeypatch.setattr(reposts, 'REPOSTS_DB', str(tmp_path / 'reposts.db'))
+    client = app.app.test_client()
+    first, second = 'https://sfbay.craigslist.org/a/1.html', 'https://sfbay.craigslist.org/a/2.html'
+    original = body(1)
+
+    response = client.post('/api/reposts', json={'listing_url': first, 'listing_amenities': amenities(original),
+                                                 'property_id': 1700000000001, 'saved': {}})
+    assert response.status_code == 200
+    assert response.get_json()['repost_of'] is None
+
+    repost = {'listing_url': second, 'listing_amenities': amenities(edit(original, 1, 1)), 'property_id': 1700000000002}
+    # Another user who hasn't saved the original gets no repost_of
+    assert client.post('/api/reposts', json=dict(repost, saved={})).get_json()['repost_of'] is None
+    data = client.post('/api/reposts', json=dict(repost, saved={first: 1700000000001})).get_json()
+    assert data['repost_of'] == 1700000000001
+    assert data['matches'][0]['listing_url'] == first
+    assert reposts.find_reposts('x', amenities(original))[0]['property_id'] == 1700000000001
+
+    assert client.delete('/api/reposts/1700000000001').status_code == 200
+    assert all(m['property_id'] is None for m in reposts.find_reposts('x', amenities(original)))
+    assert client.post('/api/reposts', json={'listing_url': first}).status_code == 400
@@ -0,0 +1,122 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import sharedcache
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = sharedcache.configure(sharedcache.MemoryBackend())
+    monkeypatch.setattr(sharedcache, '_counts', dict.fromkeys(sharedcache.COUNTERS, 0))
+    monkeypatch.setattr(sharedcache, '_unflushed', dict.fromkeys(sharedcache.COUNTERS, 0))
+    monkeypatch.setattr(sharedcache, 'LOCK_POLL_INTERVAL', 0.01)
+    yield backend
+    sharedcache.configure(None)
+
+
+def test_memory_backend_semantics():
+    backend = sharedcache.MemoryBackend()
+    assert backend.add('lock', 'a', 10) is True
+    assert backend.add('lock', 'b', 10) is False
+    assert backend.delete_if('lock', 'b') is False
+    assert backend.delete_if('lock', 'a') is True
+    backend.set('short', b'v', 0.01)
+    time.sleep(0.02)
+    assert backend.get('short') is None
+    assert backend.add('short', 'x', 10) is True
+    backend.hincrby('h', {'a': 2})
+    backend.hincrby('h', {'a': 1, 'b': 5})
+    assert backend.hgetall('h') == {'a': 3, 'b': 5}
+
+
+def test_disabled_layer_just_fetches():
+    sharedcache.configure(None)
+    assert sharedcache.json_cached('k', 60, lambda: {'v': 1}) == ({'v': 1}, False)
+
+
+def test_second_lookup_is_a_shared_hit(backend):
+    assert sharedcache.json_cached('listing:1', 60, lambda: {'price': 2850}) == ({'price': 2850}, False)
+    assert sharedcache.json_cached('listing:1', 60, lambda: pytest.fail('refetched')) == ({'price': 2850}, True)
+    assert sharedcache.stats()['local']['shared_hits'] == 1
+
+
+def test_concurrent_nodes_fetch_once(backend):
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {'rows': 3}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sharedcache.json_cached('soql:x', 60, fetch)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert sorted(hit for _, hit in results) == [False, True, True, True, True]
+    assert all(value == {'rows': 3} for value, _ in results)
+    assert sharedcache.stats()['local']['lock_waits'] == 4
+
+
+def test_uncacheable_result_is_not_stored_and_lock_is_released(backend):
+    value, hit = sharedcache.json_cached('k', 60, lambda: {'status': 500}, store_if=lambda v: v['status'] == 200)
+    assert (value, hit) == ({'status': 500}, False)
+    assert backend.get(sharedcache.CACHE_PREFIX + 'k') is None
+    assert backend.get(sharedcache.CACHE_PREFIX + 'k:lock') is None
+
+
+def test_failed_fetch_releases_lock(backend):
+    with pytest.raises(RuntimeError):
+        sharedcache.json_cached('k', 60, lambda: (_ for _ in ()).throw(RuntimeError('upstream down')))
+    assert sharedcache.json_cached('k', 60, lambda: 'ok') == ('ok', False)
+
+
+def test_backend_errors_fall_back_and_bypass(backend, monkeypatch):
+    def broken(*args):
+        raise sharedcache.BackendError('connection refused')
+    monkeypatch.setattr(backend, 'get', broken)
+    assert sharedcache.json_cached('k', 60, lambda: 1) == (1, False)
+    assert not sharedcache.stats()['available']
+    assert sharedcache.stats()['local']['errors'] == 1
+    # Bypassed for CACHE_BACKEND_RETRY seconds: the backend isn't touched again
+    assert sharedcache.json_cached('k', 60, lambda: 2) == (2, False)
+    assert sharedcache.stats()['local']['errors'] == 1
+
+
+def test_cluster_stats_from_flushed_counters(backend, monkeypatch):
+    monkeypatch.setattr(sharedcache, 'METRICS_FLUSH_SECONDS', 0)
+    backend.hincrby(sharedcache.CACHE_PREFIX + sharedcache.METRICS_KEY,
+                    {'other-node:local_hits': 6, 'other-node:misses': 2})
+    sharedcache.count('misses')
+    sharedcache.count('shared_hits')
+    stats = sharedcache.stats()
+    assert stats['nodes']['other-node']['hit_ratio'] == 0.75
+    assert stats['nodes'][sharedcache.CACHE_NODE_ID]['hit_ratio'] == 0.5
+    assert stats['cluster']['hit_ratio'] == 0.7
+    assert stats['cluster']['shared_hit_ratio'] == 0.25
+
+
+def test_redis_protocol_round_trip():
+    redis = sharedcache.RedisBackend('redis://localhost:6379/0')
+    client, server = socket.socketpair()
+    redis._local.sock, redis._local.reader = client, client.makefile('rb')
+    server.sendall(b'+OK\r\n$5\r\nhello\r\n$-1\r\n:3\r\n*4\r\n$1\r\na\r\n:1\r\n$1\r\nb\r\n:2\r\n-ERR wrong type\r\n')
+    assert redis.add('k', 'v', 1.5) is True
+    assert server.recv(1024) == b'*6\r\n$3\r\nSET\r\n$1\r\nk\r\n$1\r\nv\r\n$2\r\nPX\r\n$4\r\n1500\r\n$2\r\nNX\r\n'
+    assert redis.get('k') == b'hello'
+    assert redis.get('missing') is None
+    assert redis.delete_if('k', 'v') is False
+    assert redis.hgetall('h') == {'a': 1, 'b': 2}
+    with pytest.raises(sharedcache.RedisError):
+        redis.get('h')
+    client.close()
+    server.close()
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import snapshots
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(snapshots, '_cache', snapshots.OrderedDict())
+
+
+def search_result(**changes):
+    document = {
+        'address': '1250 SUTTER ST', 'blklot': '0280001', 'owner': 'SUTTER HOLDINGS LLC', 'zoning': 'RC-4',
+        'num_units': '12', 'number_of_bedrooms': 'Not available', 'eviction_history': [], 'eviction_count': 0,
+        'likely_last_sale_year': 2015,
+    }
+    document.update(changes)
+    return document
+
+
+def test_searches_of_the_same_parcel_share_a_snapshot():
+    first = snapshots.dehydrate(dict(search_result(), id=1, notes='top floor'))
+    second = snapshots.dehydrate(dict(
+        search_result(number_of_bedrooms='2', eviction_count=1, likely_last_sale_year=2016,
+                      eviction_history=[{'file_date': '2026-01-05'}]),
+        id=2, listing_url='https://sfbay.craigslist.org/sfc/apa/d/x/7700000001.html'))
+    assert first[snapshots.SNAPSHOT_KEY] == second[snapshots.SNAPSHOT_KEY]
+    assert snapshots.stats()['snapshots'] == 1
+
+    # Each save keeps its own volatile values
+    assert snapshots.hydrate(first)['eviction_count'] == 0
+    restored = snapshots.hydrate(second)
+    assert (restored['number_of_bedrooms'], restored['eviction_count'], restored['owner']) == \
+        ('2', 1, 'SUTTER HOLDINGS LLC')
+    assert snapshots.MISSING_KEY not in restored
+
+
+def test_parcel_change_makes_a_new_snapshot():
+    first = snapshots.dehydrate(search_result())
+    second = snapshots.dehydrate(search_result(owner='NEW OWNER LLC'))
+    assert first[snapshots.SNAPSHOT_KEY] != second[snapshots.SNAPSHOT_KEY]
+
+
+def test_missing_snapshot_is_flagged(caplog):
+    entry = snapshots.dehydrate(dict(search_result(), id=7, notes='call landlord'))
+    os.remove(snapshots.path_for(entry[snapshots.SNAPSHOT_KEY]))
+    snapshots._cache.clear()
+
+    restored = snapshots.hydrate(entry)
+    assert restored[snapshots.MISSING_KEY] is True
+    assert (restored['id'], restored['notes']) == (7, 'call landlord')
+    assert 'owner' not in restored
+    assert any('snapshot missing' in r.getMessage() for r in caplog.records)
+
+    # Re-saving the hydrated entry doesn't carry the flag into a snapshot
+    assert snapshots.MISSING_KEY not in snapshots.dehydrate(restored)
+
+
+def test_only_allow_listed_parcel_fields_are_snapshotted():
+    first = snapshots.dehydrate(dict(search_result(), id=1, saved_at='2026-10-01T10:00:00Z'))
+    second = snapshots.dehydrate(dict(search_result(address='1250 Sutter Street'), id=2, saved_at='2026-10-02T09:00:00Z'))
+    assert first[snapshots.SNAPSHOT_KEY] == second[snapshots.SNAPSHOT_KEY]
+    # The user-typed address and client fields stay on the entry
+    assert (second['address'], second['saved_at']) == ('1250 Sutter Street', '2026-10-02T09:00:00Z')
+    assert snapshots.hydrate(second)['address'] == '1250 Sutter Street'
+    assert set(snapshots.load(first[snapshots.SNAPSHOT_KEY])) == {'blklot', 'owner', 'zoning', 'num_units'}
+
+
+def test_document_without_blklot_is_kept_whole():
+    document = dict(search_result(blklot=None), id=3)
+    entry = snapshots.dehydrate(document)
+    assert snapshots.SNAPSHOT_KEY not in entry
+    assert snapshots.hydrate(entry) == document
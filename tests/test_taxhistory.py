@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import indexes
+import taxhistory
+
+
+def roll(parcel, year, land):
+    return {'parcel_number': parcel, 'closed_roll_year': str(year), 'assessed_land_value': str(land),
+            'assessed_fixtures_value': '0', 'assessed_improvement_value': '500000'}
+
+
+def test_written_store_is_searchable(tmp_path):
+    path = str(tmp_path / 'taxroll_history.bin')
+    rows = [roll('0280001', 2014, 100000), roll('0280001', 2015, 400000),
+            roll('0280002', 2015, 200000), roll('0290001', 2015, 300000)]
+    assert taxhistory.write_tax_history(path, rows) == 3
+    store = taxhistory.TaxHistory(path)
+    assert [store.history(p)['blklot'] for p in ('0280001', '0280002', '0290001')] == \
+        ['0280001', '0280002', '0290001']
+    assert store.history('0280003') is None
+    assert store.sale_year('0280001') is not None
+
+
+@pytest.mark.parametrize('rows', [
+    [roll('0280002', 2015, 1), roll('0280001', 2015, 1)],
+    [roll('0280001', 2015, 1), roll('0280002', 2015, 1), roll('0280001', 2016, 1)],
+    [roll('0280001', 2016, 1), roll('0280001', 2015, 1)],
+])
+def test_out_of_order_rows_fail_the_build(tmp_path, rows):
+    path = str(tmp_path / 'taxroll_history.bin')
+    taxhistory.write_tax_history(path, [roll('0010001', 2015, 1)])
+    with pytest.raises(ValueError):
+        taxhistory.write_tax_history(path, rows)
+    # The previous store stays in place
+    assert taxhistory.TaxHistory(path).history('0010001') is not None
+    assert not [name for name in os.listdir(tmp_path) if '.tmp.' in name]
+
+
+def test_store_is_shared_and_remapped_after_a_rebuild(index_dir, monkeypatch):
+    path = str(index_dir / 'taxroll_history.bin')
+    monkeypatch.setattr(taxhistory, 'TAX_HISTORY_PATH', path)
+    assert taxhistory.get_store() is None
+    taxhistory.write_tax_history(path, [roll('0280001', 2015, 1)])
+    monkeypatch.setattr(indexes, 'RELOAD_CHECK_SECONDS', 0)
+    store = taxhistory.get_store()
+    assert taxhistory.get_store() is store and len(store) == 1
+
+    taxhistory.write_tax_history(path, [roll('0280001', 2015, 1), roll('0280002', 2015, 1)])
+    assert len(taxhistory.get_store()) == 2
@@ -0,0 +1,435 @@
+"""
+Upstream HTTP client for DataSF and Craigslist requests.
+
+Every source (a DataSF dataset id, or 'craigslist') keeps a rolling window of
+recent latencies. Timeouts are derived from that window instead of a fixed
+value, and a call that runs past the source's p95 gets one hedged duplicate
+request, as long as the hedge budget allows it. Successful responses are
+kept in a small TTL cache so repeat searches skip the network, and
+concurrent requests for the same URL share one fetch (single-flight). With a
+shared cache backend configured (sharedcache.py), local misses go to the
+shared cache next, and single-flight extends across nodes.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+import requests
+
+import logs
+import profiling
+import sharedcache
+
+log = logs.get_logger('upstream')
+
+# Timeouts used until a source has enough samples to derive its own
+DEFAULT_TIMEOUT = 10
+DEFAULT_TIMEOUTS = {'craigslist': 15}
+MIN_TIMEOUT = 2
+MAX_TIMEOUT = 20
+# Timeout = p99 * multiplier, clamped to [MIN_TIMEOUT, MAX_TIMEOUT]
+TIMEOUT_MULTIPLIER = 3
+
+WINDOW_SIZE = 200
+MIN_SAMPLES = 20
+
+# Every request earns HEDGE_BUDGET hedge tokens and every hedge spends one,
+# so at most ~10% of requests are duplicated.
+HEDGE_BUDGET = float(os.environ.get('UPSTREAM_HEDGE_BUDGET', '0.1'))
+HEDGE_BURST = 10.0
+HEDGING_ENABLED = os.environ.get('UPSTREAM_HEDGING', '1') != '0'
+
+# Successful responses are cached for CACHE_TTL seconds (0 disables)
+CACHE_TTL = int(os.environ.get('UPSTREAM_CACHE_TTL', '900'))
+CACHE_MAX_ENTRIES = int(os.environ.get('UPSTREAM_CACHE_MAX_ENTRIES', '2048'))
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='upstream')
+
+
+def source_for(url):
+    """Derive the latency-tracking key for a URL: dataset id, 'craigslist' or host"""
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    if 'craigslist' in host:
+        return 'craigslist'
+    if parsed.path.startswith('/resource/'):
+        return parsed.path.rsplit('/', 1)[-1].replace('.json', '')
+    return host
+
+
+class SourceStats:
+    """Rolling latency distribution and counters for one upstream source"""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = deque(maxlen=WINDOW_SIZE)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.http_errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q):
+        with self.lock:
+            if len(self.samples) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+    def timeout(self):
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return DEFAULT_TIMEOUTS.get(self.name, DEFAULT_TIMEOUT)
+        return max(MIN_TIMEOUT, min(MAX_TIMEOUT, p99 * TIMEOUT_MULTIPLIER))
+
+    def hedge_delay(self):
+        return self.percentile(0.95)
+
+    def snapshot(self):
+        return {
+            'samples': len(self.samples),
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'timeout': self.timeout(),
+            'requests': self.requests,
+            'errors': self.errors,
+            'http_errors': self.http_errors,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+        }
+
+
+_sources = {}
+_sources_lock = threading.Lock()
+_hedge_tokens = HEDGE_BURST
+_hedge_lock = threading.Lock()
+
+
+def _stats_for(name):
+    stats = _sources.get(name)
+    if stats is None:
+        with _sources_lock:
+            stats = _sources.setdefault(name, SourceStats(name))
+    return stats
+
+
+def _earn_hedge_token():
+    global _hedge_tokens
+    with _hedge_lock:
+        _hedge_tokens = min(HEDGE_BURST, _hedge_tokens + HEDGE_BUDGET)
+
+
+def _take_hedge_token():
+    global _hedge_tokens
+    with _hedge_lock:
+        if _hedge_tokens >= 1:
+            _hedge_tokens -= 1
+            return True
+    return False
+
+
+_concurrency = None
+
+
+def set_max_concurrency(limit):
+    """Cap requests in flight to all upstreams at once (None removes the cap)"""
+    global _concurrency
+    _concurrency = threading.BoundedSemaphore(limit) if limit else None
+
+
+def _timed_get(stats, url, params, headers, timeout):
+    slot = _concurrency
+    if slot is not None:
+        slot.acquire()
+    start = time.perf_counter()
+    try:
+        response = requests.get(url, params=params, headers=headers, timeout=timeout)
+    except requests.Timeout:
+        # Count the timeout as a sample so the distribution reflects it
+        stats.record(timeout)
+        raise
+    finally:
+        if slot is not None:
+            slot.release()
+    stats.record(time.perf_counter() - start)
+    if response.status_code >= 400:
+        stats.http_errors += 1
+    return response
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_hits = 0
+_cache_misses = 0
+
+
+def _cache_key(url, params):
+    return (url, tuple(sorted((params or {}).items())))
+
+
+def _cache_get(key):
+    global _cache_hits, _cache_misses
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            _cache.move_to_end(key)
+            _cache_hits += 1
+            hit = entry[1]
+        else:
+            _cache.pop(key, None)
+            _cache_misses += 1
+            hit = None
+    if hit is not None and sharedcache.enabled():
+        sharedcache.count('local_hits')
+    return hit
+
+
+def _cache_put(key, response):
+    with _cache_lock:
+        _cache[key] = (time.monotonic() + CACHE_TTL, response)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_coalesced = 0
+
+
+def single_flight(key, fn):
+    """
+    Call fn() at most once at a time per key. Callers that arrive while a call
+    for the same key is running wait for it and share its result or error.
+    """
+    global _coalesced
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+        else:
+            _coalesced += 1
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = fn()
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        flight.done.set()
+
+
+def get(url, params=None, headers=None, source=None, cache=True):
+    """
+    GET a URL with an adaptive timeout, hedging once past the source's p95.
+    Successful responses are served from a TTL cache when `cache` is set, and
+    concurrent cached GETs of the same URL share one upstream request.
+    Returns a requests.Response and raises like requests.get on failure.
+    """
+    name = source or source_for(url)
+    started = time.perf_counter()
+    try:
+        with profiling.phase('upstream', name) as timing:
+            response, cache_hit = _get(url, params, headers, source, cache)
+            # elapsed covers DNS, connect, TLS and waiting for the response headers
+            timing.note(status=response.status_code, cache_hit=cache_hit, headers_seconds=_elapsed(response))
+    except Exception as e:
+        seconds = time.perf_counter() - started
+        logs.add_timing(name, seconds)
+        log.warning('upstream request failed', extra={'source': name, 'seconds': round(seconds, 4), 'error': str(e)})
+        raise
+    seconds = time.perf_counter() - started
+    logs.add_timing(name, seconds)
+    log.debug('upstream request', extra={'source': name, 'seconds': round(seconds, 4),
+                                         'status': response.status_code, 'cache_hit': cache_hit})
+    return response
+
+
+def _get(url, params, headers, source, cache):
+    """(response, served_from_cache)"""
+    if cache and CACHE_TTL > 0:
+        key = _cache_key(url, params)
+        response = _cache_get(key)
+        if response is not None:
+            return response, True
+        return single_flight(key, lambda: _fetch_and_cache(key, url, params, headers, source)), False
+    return _fetch(url, params, headers, source), False
+
+
+def _elapsed(response):
+    elapsed = getattr(response, 'elapsed', None)
+    return round(elapsed.total_seconds(), 4) if elapsed is not None else None
+
+
+def _fetch_and_cache(key, url, params, headers, source):
+    # Another caller may have filled the cache while we waited for the flight slot
+    with _cache_lock:
+        entry = _cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    if sharedcache.enabled():
+        response, _ = sharedcache.cached(_shared_key(key), CACHE_TTL,
+                                         lambda: _fetch_body(url, params, headers, source),
+                                         encode_response, decode_response,
+                                         store_if=lambda r: r.status_code == 200)
+    else:
+        response = _fetch_body(url, params, headers, source)
+    if response.status_code == 200:
+        _cache_put(key, response)
+    return response
+
+
+def _fetch_body(url, params, headers, source):
+    response = _fetch(url, params, headers, source)
+    # Read the body now so the response can be shared across threads
+    response.content
+    return response
+
+
+def _shared_key(key):
+    return 'up:' + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+def encode_response(response):
+    """A response as bytes for the shared cache: JSON metadata line, then the body"""
+    meta = {'status': response.status_code, 'url': response.url, 'encoding': response.encoding,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() == 'content-type'}}
+    return json.dumps(meta).encode('utf-8') + b'\n' + response.content
+
+
+def decode_response(data):
+    meta, _, body = data.partition(b'\n')
+    meta = json.loads(meta)
+    response = requests.Response()
+    response.status_code = meta['status']
+    response.url = meta['url']
+    response.encoding = meta['encoding']
+    response.headers.update(meta['headers'])
+    response._content = body
+    return response
+
+
+def _fetch(url, params, headers, source):
+    stats = _stats_for(source or source_for(url))
+    stats.requests += 1
+    _earn_hedge_token()
+    timeout = stats.timeout()
+    hedge_after = stats.hedge_delay() if HEDGING_ENABLED else None
+
+    if hedge_after is None:
+        try:
+            return _timed_get(stats, url, params, headers, timeout)
+        except Exception:
+            stats.errors += 1
+            raise
+
+    primary = _executor.submit(_timed_get, stats, url, params, headers, timeout)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done or not _take_hedge_token():
+        try:
+            return primary.result()
+        except Exception:
+            stats.errors += 1
+            raise
+
+    stats.hedges += 1
+    hedge = _executor.submit(_timed_get, stats, url, params, headers, timeout)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    stats.hedge_wins += 1
+                return future.result()
+            error = future.exception()
+    stats.errors += 1
+    raise error
+
+
+class HostLimiter:
+    """
+    Per-host politeness: at most `concurrency` requests in flight per host and
+    at least `min_interval` seconds between request starts to the same host.
+    """
+
+    def __init__(self, concurrency=2, min_interval=0.5):
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_start = {}
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.concurrency)
+            return self._semaphores[host]
+
+    def __call__(self, url):
+        return _HostSlot(self, urlparse(url).netloc.lower())
+
+
+class _HostSlot:
+    def __init__(self, limiter, host):
+        self.limiter = limiter
+        self.host = host
+
+    def __enter__(self):
+        limiter = self.limiter
+        self.semaphore = limiter._semaphore(self.host)
+        self.semaphore.acquire()
+        with limiter._lock:
+            now = time.monotonic()
+            start = max(now, limiter._next_start.get(self.host, now))
+            limiter._next_start[self.host] = start + limiter.min_interval
+        if start > now:
+            time.sleep(start - now)
+        return self
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
+        return False
+
+
+def stats():
+    """Per-source latency percentiles, timeouts, hedge, cache and single-flight counters"""
+    with _sources_lock:
+        sources = list(_sources.values())
+    return {
+        'hedge_tokens': round(_hedge_tokens, 2),
+        'cache': {'entries': len(_cache), 'hits': _cache_hits, 'misses': _cache_misses,
+                  'in_flight': len(_inflight), 'coalesced': _coalesced},
+        'sources': {s.name: s.snapshot() for s in sources},
+        'shared_cache': sharedcache.stats() if sharedcache.enabled() else None,
+    }